@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# Arquivo: benchmarks/bench_encodings.py
+# Compara as codificações de resposta (JSON, gzip, brotli, MessagePack) nas rotas
+# de lista: GET /api/services (snapshot, variantes guardadas), GET /api/services/search
+# e GET /api/orders (dinâmicas, comprimidas a cada requisição).
+# Para cada combinação mostra os bytes trafegados, a latência no servidor local
+# (primeira requisição e mediana das seguintes), o tempo de decodificação no
+# cliente e uma estimativa do tempo até o conteúdo em um link móvel (--link-kbps).
+# O banco é um SQLite temporário (o app.db do projeto não é tocado).
+#
+# Uso: python3 benchmarks/bench_encodings.py [--services 3000] [--orders 200]
+#          [--requests 30] [--link-kbps 1600]
+
+import argparse
+import gzip
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import requests
+
+from common import start_gunicorn, stop, wait_until_up
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+CATEGORIES = ['Instagram Seguidores', 'Instagram Curtidas', 'TikTok Visualizações', 'YouTube Inscritos',
+              'Facebook Reações', 'Kwai Seguidores']
+WORDS = ['Brasileiros', 'Reais', 'Premium', 'Rápidos', 'Mundiais', 'Garantidos', 'Refil 30 dias', 'Sem queda']
+
+ROUTES = [
+    ('services', '/api/services'),
+    ('search', '/api/services/search?q=seg&limit=100'),
+    ('orders', '/api/orders?limit=200'),
+]
+
+
+def encodings():
+    """(nome, Accept, Accept-Encoding) de cada variante disponível neste ambiente."""
+    variants = [('json', 'application/json', 'identity'), ('json+gzip', 'application/json', 'gzip')]
+    if brotli is not None:
+        variants.append(('json+br', 'application/json', 'br'))
+    if msgpack is not None:
+        variants.append(('msgpack', 'application/msgpack', 'identity'))
+        variants.append(('msgpack+gzip', 'application/msgpack', 'gzip'))
+        if brotli is not None:
+            variants.append(('msgpack+br', 'application/msgpack', 'br'))
+    return variants
+
+
+def prepare_database(database_url, args):
+    """Schema, usuário bench/bench com pedidos e um catálogo sintético."""
+    os.environ['DATABASE_URL'] = database_url
+    from main import app
+    from src.config import seed_default_configs
+    from src.migrations import upgrade
+    from src.models.user import Order, Service, User, db
+    from src.services.catalog import bump_catalog_version
+
+    rng = random.Random(42)
+    with app.app_context():
+        upgrade(echo=lambda *_: None)
+        seed_default_configs()
+        user = User(username='bench', email='bench@bench.local', is_admin=True)
+        user.set_password('bench')
+        db.session.add(user)
+        db.session.flush()
+        db.session.add_all([
+            Service(service_id=1000 + i, name=f'{CATEGORIES[i % len(CATEGORIES)]} {rng.choice(WORDS)} #{i}',
+                    type='Default', rate=round(rng.uniform(0.2, 30), 2), min=rng.choice([10, 50, 100]),
+                    max=rng.choice([5000, 50000, 1000000]), category=CATEGORIES[i % len(CATEGORIES)],
+                    description=rng.choice([None, 'Entrega gradual em até 24h. Início em 0-1h.']), is_active=True)
+            for i in range(args.services)
+        ])
+        db.session.add_all([
+            Order(user_id=user.id, service_id=1000 + rng.randrange(args.services), service_name='Serviço',
+                  link=f'https://instagram.com/perfil{i}', quantity=rng.randint(10, 5000),
+                  charge=round(rng.uniform(1, 50), 2), status=rng.choice(['Pending', 'In progress', 'Completed']))
+            for i in range(args.orders)
+        ])
+        bump_catalog_version()
+        db.session.commit()
+
+
+def decode(content, content_type, content_encoding):
+    if content_encoding == 'br':
+        content = brotli.decompress(content)
+    elif content_encoding == 'gzip':
+        content = gzip.decompress(content)
+    if content_type.startswith('application/msgpack'):
+        return msgpack.unpackb(content)
+    return json.loads(content)
+
+
+def measure(session, url, accept, accept_encoding, runs):
+    headers = {'Accept': accept, 'Accept-Encoding': accept_encoding}
+    samples, decode_samples, first = [], [], None
+    for run in range(runs + 1):
+        started = time.perf_counter()
+        response = session.get(url, headers=headers, stream=True, timeout=120)
+        raw = response.raw.read(decode_content=False)
+        elapsed = time.perf_counter() - started
+        response.raise_for_status()
+        decode_started = time.perf_counter()
+        decode(raw, response.headers['Content-Type'], response.headers.get('Content-Encoding'))
+        decode_samples.append(time.perf_counter() - decode_started)
+        if run == 0:
+            first = elapsed
+        else:
+            samples.append(elapsed)
+    return {
+        'bytes': len(raw),
+        'first': first,
+        'latency': statistics.median(samples),
+        'decode': statistics.median(decode_samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark das codificações de resposta da API.')
+    parser.add_argument('--services', type=int, default=3000)
+    parser.add_argument('--orders', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=30, help='Requisições medidas por combinação.')
+    parser.add_argument('--link-kbps', type=float, default=1600, help='Banda do link móvel simulado.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        prepare_database(database_url, args)
+        process, base_url = start_gunicorn({**os.environ, 'DATABASE_URL': database_url, 'SERVER_MODE': 'sync',
+                                            'RATE_LIMIT_ENABLED': '0'})
+        try:
+            wait_until_up(base_url, process)
+            session = requests.Session()
+            session.post(f'{base_url}/api/login', json={'username': 'bench', 'password': 'bench'},
+                         timeout=30).raise_for_status()
+
+            print(f"{args.services} serviços, {args.orders} pedidos, {args.requests} requisições por combinação, "
+                  f"link de {args.link_kbps:.0f} kbit/s")
+            if brotli is None or msgpack is None:
+                print("(brotli e/ou msgpack não instalados: variantes correspondentes omitidas)")
+            for name, path in ROUTES:
+                print(f"\n{name}: GET {path}")
+                print(f"{'codificação':<14}{'bytes':>10}{'1ª req ms':>11}{'p50 ms':>9}{'decod. ms':>11}{'no link ms':>12}")
+                for encoding, accept, accept_encoding in encodings():
+                    result = measure(session, base_url + path, accept, accept_encoding, args.requests)
+                    on_link = result['latency'] + result['bytes'] * 8 / (args.link_kbps * 1000) + result['decode']
+                    print(f"{encoding:<14}{result['bytes']:>10}{result['first'] * 1000:>11.1f}"
+                          f"{result['latency'] * 1000:>9.2f}{result['decode'] * 1000:>11.2f}{on_link * 1000:>12.0f}")
+        finally:
+            stop(process)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# Arquivo: benchmarks/bench_password_hashing.py
+# Mede quantos logins (verificações de senha) por segundo cada custo de hash
+# permite, por núcleo, usando o mesmo pool de src/services/passwords.py.
+#
+# Uso: python3 benchmarks/bench_password_hashing.py [--seconds 3] [--method scrypt:16384:8:1 ...]
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import generate_password_hash
+
+from src.services import passwords
+
+DEFAULT_METHODS = [
+    'scrypt:32768:8:1',     # padrão do Werkzeug
+    'scrypt:16384:8:1',
+    'pbkdf2:sha256:600000',  # padrão do Werkzeug para pbkdf2
+    'pbkdf2:sha256:260000',
+]
+
+
+def bench(method, seconds, clients):
+    password_hash = generate_password_hash('senha-de-teste', method)
+    deadline = time.perf_counter() + seconds
+
+    def client():
+        done = 0
+        while time.perf_counter() < deadline:
+            passwords.verify_password(password_hash, 'senha-de-teste')
+            done += 1
+        return done
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        total = sum(executor.map(lambda _: client(), range(clients)))
+    elapsed = time.perf_counter() - started
+    return total / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do custo de hash de senhas.')
+    parser.add_argument('--seconds', type=float, default=3.0)
+    parser.add_argument('--method', action='append', help='Método no formato do Werkzeug (repita para vários).')
+    args = parser.parse_args()
+
+    cores = passwords.PASSWORD_HASH_CONCURRENCY
+    # Mais clientes que slots do pool, como em uma avalanche de logins.
+    clients = cores * 2
+    print(f"Pool de hash: {cores} thread(s); {clients} clientes simultâneos; {args.seconds:.0f}s por método\n")
+    print(f"{'método':<26}{'logins/s':>12}{'logins/s/núcleo':>18}{'ms/login':>12}")
+    for method in args.method or DEFAULT_METHODS:
+        rate = bench(method, args.seconds, clients)
+        print(f"{method:<26}{rate:>12.1f}{rate / cores:>18.1f}{1000 * cores / rate:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# Arquivo: benchmarks/bench_pricing.py
+# Mede o motor de preços (src/services/pricing.py) com um catálogo sintético:
+#   - reprecificação completa: compilar as regras e calcular todas as faixas
+#     (cálculo) e gravar a tabela service_price (total);
+#   - leitura do preço de um pedido no snapshot (unit_rate), que é o que
+#     create_order paga por requisição.
+# O banco é um SQLite temporário (o app.db do projeto não é tocado).
+#
+# Uso: python3 benchmarks/bench_pricing.py [--services 10000] [--rules 200] [--runs 5]
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import common  # noqa: F401  (coloca a raiz do projeto no sys.path)
+
+CATEGORIES = [f'Categoria {i}' for i in range(60)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do motor de preços.')
+    parser.add_argument('--services', type=int, default=10000)
+    parser.add_argument('--rules', type=int, default=200, help='Regras por categoria e por serviço.')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        from main import app
+        from src.config import seed_default_configs
+        from src.migrations import upgrade
+        from src.models.user import PricingRule, Service, db
+        from src.services.catalog import get_catalog, invalidate_catalog
+        from src.services.pricing import reprice_all, unit_rate
+
+        rng = random.Random(7)
+        with app.app_context():
+            upgrade(echo=lambda *_: None)
+            seed_default_configs()
+            db.session.add_all([
+                Service(service_id=i, name=f'Serviço {i}', type='Default', rate=round(rng.uniform(0.1, 40), 4),
+                        min=rng.choice([10, 100]), max=rng.choice([10000, 100000, 1000000]),
+                        category=rng.choice(CATEGORIES), is_active=True)
+                for i in range(1, args.services + 1)
+            ])
+            rules = {('global', '', 100000): 12}
+            for category in CATEGORIES:
+                rules[('category', category, 0)] = rng.choice([25, 30, 40])
+                rules[('category', category, 5000)] = rng.choice([15, 20])
+            while len(rules) < args.rules:
+                rules[('service', str(rng.randint(1, args.services)), rng.choice([0, 1000, 50000]))] = rng.choice([5, 50, 80])
+            db.session.add_all([PricingRule(scope=scope, key=key, min_quantity=quantity, margin=margin)
+                                for (scope, key, quantity), margin in rules.items()])
+            db.session.commit()
+
+            results = []
+            for _ in range(args.runs):
+                results.append(reprice_all())
+                db.session.commit()
+            invalidate_catalog()
+            started = time.perf_counter()
+            catalog = get_catalog()
+            snapshot_ms = (time.perf_counter() - started) * 1000
+
+            entries = list(catalog.by_service_id.values())
+            quantities = [rng.randint(entry['min'], entry['max']) for entry in entries]
+            started = time.perf_counter()
+            for entry, quantity in zip(entries, quantities):
+                unit_rate(entry, quantity)
+            read_us = (time.perf_counter() - started) / len(entries) * 1e6
+
+        print(f"{args.services} serviços, {len(rules)} regras, {results[-1]['prices']} preços (faixas)\n")
+        print(f"reprecificação - cálculo:           {statistics.median(r['compute_ms'] for r in results):8.1f} ms (mediana)")
+        print(f"reprecificação - cálculo + gravação: {statistics.median(r['total_ms'] for r in results):8.1f} ms (mediana)")
+        print(f"snapshot do catálogo (com preços):   {snapshot_ms:8.1f} ms")
+        print(f"preço de um pedido (unit_rate):      {read_us:8.2f} µs")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# Arquivo: benchmarks/bench_reconcile.py
+# Mede a conciliação de pagamentos pendentes (src/services/payment_reconciliation.py)
+# contra o stub do Mercado Pago: N pagamentos 'pending' espalhados em alguns dias,
+# com uma mistura de aprovados, cancelados, PIX vencidos e recargas que nunca
+# chegaram ao gateway. Mostra chamadas ao gateway e tempo do dry-run e da
+# conciliação real, comparados com um get_payment por linha.
+# O banco é um SQLite temporário (o app.db do projeto não é tocado).
+#
+# Uso: python3 benchmarks/bench_reconcile.py [--payments 2000] [--days 3] [--latency-ms 80]
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import common  # noqa: F401  (coloca a raiz do projeto no sys.path)
+from stubs import MercadoPagoStub, StubConfig
+
+# Destino de cada pagamento pendente no gateway (peso).
+SCENARIOS = [('approved', 30), ('cancelled', 35), ('pending', 15), ('missing', 20)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark da conciliação de pagamentos pendentes.')
+    parser.add_argument('--payments', type=int, default=2000)
+    parser.add_argument('--days', type=int, default=3, help='Período em que os pagamentos foram criados.')
+    parser.add_argument('--latency-ms', type=float, default=80, help='Latência do stub por chamada.')
+    args = parser.parse_args()
+
+    mercado_pago = MercadoPagoStub(StubConfig(latency_ms=args.latency_ms)).start()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ['MP_API_URL'] = f'http://127.0.0.1:{mercado_pago.port}'
+        os.environ['MP_ACCESS_TOKEN'] = 'bench'
+        from main import app
+        from src.config import seed_default_configs
+        from src.migrations import upgrade
+        from src.models.user import Payment, User, db
+        from src.services.payment_reconciliation import reconcile_pending_payments
+
+        rng = random.Random(3)
+        now = datetime.utcnow()
+        with app.app_context():
+            upgrade(echo=lambda *_: None)
+            seed_default_configs()
+            users = [User(username=f'u{i}', email=f'u{i}@bench.local') for i in range(50)]
+            for user in users:
+                user.set_password('bench')
+            db.session.add_all(users)
+            db.session.flush()
+
+            # Pagamentos concentrados no horário comercial de cada dia, como no tráfego real.
+            payments = []
+            for i in range(args.payments):
+                created_at = (now - timedelta(days=rng.randrange(args.days) + 1)).replace(hour=rng.randint(11, 23),
+                                                                                          minute=rng.randrange(60))
+                payments.append(Payment(user_id=rng.choice(users).id, amount=rng.choice([10, 20, 50]),
+                                        status='pending', created_at=created_at))
+            db.session.add_all(payments)
+            db.session.commit()
+
+            outcomes = {}
+            for payment, (outcome,) in zip(payments, (rng.choices([name for name, _ in SCENARIOS],
+                                                                   [weight for _, weight in SCENARIOS])
+                                                      for _ in payments)):
+                outcomes[outcome] = outcomes.get(outcome, 0) + 1
+                if outcome == 'missing':
+                    continue
+                mp_id = 9_000_000 + payment.id
+                created = payment.created_at.replace(tzinfo=timezone.utc) + timedelta(seconds=2)
+                mercado_pago.add_payment(mp_id, outcome, created, external_reference=str(payment.id))
+                payment.payment_id = str(mp_id)
+            # Pagamentos de outras origens na mesma conta, que a busca também devolve.
+            for i in range(args.payments // 2):
+                created = datetime.now(timezone.utc) - timedelta(minutes=rng.randrange(args.days * 1440))
+                mercado_pago.add_payment(8_000_000 + i, 'approved', created)
+            db.session.commit()
+
+            print(f"{args.payments} pagamentos pendentes em {args.days} dia(s): "
+                  + ', '.join(f'{name} {count}' for name, count in sorted(outcomes.items()))
+                  + f"; stub com {args.latency_ms:.0f} ms por chamada\n")
+            for dry_run in (True, False):
+                mercado_pago.calls.clear()
+                started = time.perf_counter()
+                report = reconcile_pending_payments(dry_run=dry_run)
+                elapsed = time.perf_counter() - started
+                label = 'dry-run' if dry_run else 'conciliação'
+                print(f"{label:<12} {report['api_calls']:>5} chamadas {dict(mercado_pago.calls)} "
+                      f"{elapsed * 1000:>8.0f} ms  {report['updated']}")
+            pending = Payment.query.filter_by(status='pending').count()
+
+        baseline = args.payments * args.latency_ms / 1000
+        print(f"\num get_payment por linha: {args.payments} chamadas, ~{baseline:.1f} s só de latência do gateway")
+        print(f"pendentes restantes: {pending} (ainda dentro do prazo do PIX no gateway)")
+    mercado_pago.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# Arquivo: benchmarks/bench_serving_modes.py
+# Compara o gunicorn síncrono (SERVER_MODE=sync) com o assíncrono (SERVER_MODE=async,
+# gevent) em uma rota que chama o fornecedor: POST /api/admin/test-barato-api.
+# O fornecedor é o stub de benchmarks/stubs.py, que demora --supplier-ms para responder, e o
+# banco é um SQLite temporário (o app.db do projeto não é tocado).
+#
+# Uso: python3 benchmarks/bench_serving_modes.py [--requests 400] [--clients 200]
+#          [--supplier-ms 200] [--workers 1] [--mode sync --mode async]
+
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from common import percentile, start_gunicorn, stop, wait_until_up
+from stubs import BaratoStub, StubConfig
+
+
+def prepare_database(database_url):
+    """Cria o schema, um admin (admin/admin) e a chave do fornecedor no banco temporário."""
+    os.environ['DATABASE_URL'] = database_url
+    from main import app
+    from src.migrations import upgrade
+    from src.models.user import AdminConfig, User, db
+
+    with app.app_context():
+        upgrade(echo=lambda *_: None)
+        admin = User(username='admin', email='admin@bench.local', is_admin=True)
+        admin.set_password('admin')
+        db.session.add(admin)
+        db.session.add(AdminConfig(key='barato_api_key', value='bench'))
+        db.session.commit()
+
+
+def run_mode(mode, args, env):
+    process, base_url = start_gunicorn({**env, 'SERVER_MODE': mode}, args.workers)
+    try:
+        wait_until_up(base_url, process)
+        login = requests.post(f'{base_url}/api/login', json={'username': 'admin', 'password': 'admin'}, timeout=30)
+        login.raise_for_status()
+        cookies = login.cookies.get_dict()
+
+        local = threading.local()
+
+        def call(_):
+            session = getattr(local, 'session', None)
+            if session is None:
+                session = local.session = requests.Session()
+                session.cookies.update(cookies)
+            started = time.perf_counter()
+            response = session.post(f'{base_url}/api/admin/test-barato-api', timeout=300)
+            return time.perf_counter() - started, response.status_code == 200 and response.json().get('success')
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.clients) as executor:
+            results = list(executor.map(call, range(args.requests)))
+        elapsed = time.perf_counter() - started
+    finally:
+        stop(process)
+
+    latencies = sorted(latency for latency, _ in results)
+    return {
+        'ok': sum(1 for _, ok in results if ok),
+        'rps': len(results) / elapsed,
+        'p50': statistics.median(latencies) * 1000,
+        'p95': percentile(latencies, 95) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark dos modos síncrono e assíncrono do gunicorn.')
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--supplier-ms', type=float, default=200)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--mode', action='append', choices=['sync', 'async'])
+    args = parser.parse_args()
+
+    supplier = BaratoStub(StubConfig(latency_ms=args.supplier_ms)).start()
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        prepare_database(database_url)
+        env = {**os.environ, 'DATABASE_URL': database_url,
+               'BARATO_API_URL': f'http://127.0.0.1:{supplier.port}/api/v2'}
+
+        print(f"{args.requests} requisições, {args.clients} clientes simultâneos, "
+              f"fornecedor com {args.supplier_ms:.0f} ms, {args.workers} worker(s)\n")
+        print(f"{'modo':<8}{'ok':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}")
+        for mode in args.mode or ['sync', 'async']:
+            result = run_mode(mode, args, env)
+            print(f"{mode:<8}{result['ok']:>8}{result['rps']:>10.1f}{result['p50']:>10.0f}{result['p95']:>10.0f}")
+    supplier.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# Arquivo: benchmarks/bench_worker_startup.py
+# Mede o custo de subir workers do gunicorn com e sem --preload:
+#   - import + create_app() em um interpretador novo (o que cada worker paga sem preload);
+#   - tempo do fork até o worker estar pronto (hook post_worker_init);
+#   - memória por worker (PSS e USS, de /proc/<pid>/smaps_rollup; só Linux).
+# Usa um SQLite temporário; o app.db do projeto não é tocado.
+#
+# Uso: python3 benchmarks/bench_worker_startup.py [--workers 4] [--imports 5]
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+from common import ROOT, free_port, stop
+
+IMPORT_PROBE = (
+    "import time; t = time.perf_counter(); "
+    "from src.app import create_app; create_app(); "
+    "print(time.perf_counter() - t)"
+)
+
+# Config que estende o gunicorn.conf.py do projeto medindo fork -> worker pronto.
+TIMING_CONFIG = """
+import time
+exec(open({config!r}).read())
+_project_post_worker_init = post_worker_init
+
+def pre_fork(server, worker):
+    worker.bench_started = time.perf_counter()
+
+def post_worker_init(worker):
+    _project_post_worker_init(worker)
+    with open({timings!r}, 'a') as f:
+        f.write(f"{{time.perf_counter() - worker.bench_started}}\\n")
+"""
+
+
+def memory_kb(pid):
+    """(PSS, USS) em kB do processo."""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                values[parts[0].rstrip(':')] = int(parts[1])
+    return values.get('Pss', 0), values.get('Private_Clean', 0) + values.get('Private_Dirty', 0)
+
+
+def children(pid):
+    with open(f'/proc/{pid}/task/{pid}/children') as f:
+        return [int(child) for child in f.read().split()]
+
+
+def measure_imports(runs, env):
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', IMPORT_PROBE], cwd=ROOT, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        samples.append(float(output.strip().splitlines()[-1]))
+    return statistics.median(samples)
+
+
+def measure_gunicorn(preload, workers, env, tmp):
+    timings = os.path.join(tmp, f'timings-{preload}.txt')
+    config = os.path.join(tmp, f'gunicorn-{preload}.conf.py')
+    with open(config, 'w') as f:
+        f.write(TIMING_CONFIG.format(config=os.path.join(ROOT, 'gunicorn.conf.py'), timings=timings))
+
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        ['gunicorn', '-c', config, '--workers', str(workers), '--bind', f'127.0.0.1:{port}', 'main:app'],
+        cwd=ROOT, env={**env, 'PRELOAD_APP': '1' if preload else '0', 'SERVER_MODE': 'sync'},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError('o gunicorn terminou antes de ficar pronto')
+            ready = os.path.exists(timings) and len(open(timings).read().split()) >= workers
+            if ready:
+                break
+            time.sleep(0.01)
+        all_ready = time.perf_counter() - started
+        # Algumas requisições para os workers tocarem o banco e o app de verdade.
+        for _ in range(workers * 4):
+            requests.get(f'http://127.0.0.1:{port}/api/health', timeout=10)
+        boot_times = [float(value) for value in open(timings).read().split()]
+        memory = [memory_kb(pid) for pid in children(process.pid)]
+        master_pss, _ = memory_kb(process.pid)
+    finally:
+        stop(process)
+
+    return {
+        'all_ready': all_ready,
+        'boot': statistics.median(boot_times),
+        'pss': statistics.mean(pss for pss, _ in memory),
+        'uss': statistics.mean(uss for _, uss in memory),
+        'total_pss': master_pss + sum(pss for pss, _ in memory),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark da subida de workers do gunicorn.')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--imports', type=int, default=5, help='Repetições da medida de import.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ, 'DATABASE_URL': f"sqlite:///{os.path.join(tmp, 'bench.db')}"}
+        subprocess.run(['flask', '--app', 'main', 'init-db'], cwd=ROOT, env=env,
+                       check=True, capture_output=True)
+
+        print(f"import + create_app() em processo novo: {measure_imports(args.imports, env) * 1000:.0f} ms (mediana)\n")
+        print(f"{args.workers} workers síncronos")
+        print(f"{'preload':<10}{'todos prontos':>15}{'boot/worker':>14}{'PSS/worker':>13}"
+              f"{'USS/worker':>13}{'PSS total':>12}")
+        for preload in (False, True):
+            result = measure_gunicorn(preload, args.workers, env, tmp)
+            print(f"{'sim' if preload else 'não':<10}{result['all_ready'] * 1000:>12.0f} ms"
+                  f"{result['boot'] * 1000:>11.1f} ms{result['pss'] / 1024:>10.1f} MB"
+                  f"{result['uss'] / 1024:>10.1f} MB{result['total_pss'] / 1024:>9.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
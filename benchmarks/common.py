@@ -0,0 +1,61 @@
+# Arquivo: benchmarks/common.py
+# Utilitários compartilhados pelos benchmarks: portas livres, subir o gunicorn
+# do projeto em segundo plano e percentis.
+
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(env, workers=1, port=None, extra_args=()):
+    """Sobe `gunicorn main:app` com o gunicorn.conf.py do projeto. Retorna (processo, base_url)."""
+    port = port or free_port()
+    process = subprocess.Popen(
+        ['gunicorn', '--workers', str(workers), '--bind', f'127.0.0.1:{port}', '--timeout', '120',
+         *extra_args, 'main:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    return process, f'http://127.0.0.1:{port}'
+
+
+def wait_until_up(base_url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('o gunicorn terminou antes de aceitar conexões')
+        try:
+            if requests.get(f'{base_url}/api/health', timeout=1).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError('o gunicorn não respondeu a tempo')
+
+
+def stop(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def percentile(sorted_values, q):
+    """Percentil q (0-100) por vizinho mais próximo de uma lista já ordenada."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# Arquivo: benchmarks/load_test.py
+# Teste de carga do backend, todo local: sobe os stubs do BaratoSocial e do
+# Mercado Pago (benchmarks/stubs.py), um banco SQLite temporário, o gunicorn
+# do projeto e o `flask order-worker`, e dispara uma mistura de
+#   POST /api/login, GET /api/services, GET /api/services/search, POST /api/orders
+#   e POST /api/payments/create-payment
+# com N clientes simultâneos. Mostra p50/p95/p99 e req/s por rota e compara
+# com a linha de base guardada em benchmarks/baselines.json.
+#
+# Uso:
+#   python3 benchmarks/load_test.py                       # roda e compara com a linha de base
+#   python3 benchmarks/load_test.py --save-baseline       # grava o resultado como nova linha de base
+#   python3 benchmarks/load_test.py --scenario checkout --mode async --clients 100 --duration 30
+#   python3 benchmarks/load_test.py --latency-ms 300 --error-rate 0.05 --http-error-rate 0.02
+# Sai com código 1 se alguma rota piorar além de --tolerance (p95 ou req/s).
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from common import ROOT, percentile, start_gunicorn, stop, wait_until_up
+from stubs import BaratoStub, MercadoPagoStub, StubConfig
+
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+# Peso de cada operação em cada cenário.
+SCENARIOS = {
+    'default': {'login': 1, 'services': 6, 'order': 3, 'payment': 1},
+    'browse': {'services': 1, 'search': 3},
+    'checkout': {'order': 3, 'payment': 1},
+}
+
+BENCH_PASSWORD = 'bench-password'
+
+SEARCH_TERMS = ['seg', 'seguidores', 'curtidas', 'insta', 'tiktok visualiza', 'servico 1', 'youtube', '']
+
+
+def prepare_database(args, barato, mercado_pago):
+    """Schema, usuários com saldo, admin, configurações e catálogo sincronizado do stub."""
+    from main import app
+    from src.config import seed_default_configs
+    from src.migrations import upgrade
+    from src.models.user import AdminConfig, User, db
+    from src.services.barato_social import BaratoSocialAPI
+    from src.services.catalog import bump_catalog_version
+    from src.services.catalog_sync import sync_catalog
+
+    with app.app_context():
+        upgrade(echo=lambda *_: None)
+        seed_default_configs()
+        for key, value in {'barato_api_key': 'bench', 'mp_access_token': 'TEST-bench',
+                           'mp_webhook_secret': 'bench'}.items():
+            AdminConfig.query.filter_by(key=key).update({AdminConfig.value: value})
+
+        # Um único hash para todos: semear não deve custar N hashes de senha.
+        template = User(username='_', email='_')
+        template.set_password(BENCH_PASSWORD)
+        db.session.execute(User.__table__.insert(), [
+            {'username': f'bench{i}', 'email': f'bench{i}@bench.local', 'password_hash': template.password_hash,
+             'balance': 1_000_000.0, 'balance_cents': 100_000_000, 'is_admin': False}
+            for i in range(args.users)
+        ])
+        sync_catalog(BaratoSocialAPI('bench').services())
+        bump_catalog_version()
+        db.session.commit()
+    return [service['service'] for service in barato.services]
+
+
+class Client:
+    """Um usuário virtual: sessão própria (cookie), ETag do catálogo e as operações da mistura."""
+
+    def __init__(self, base_url, username, service_ids):
+        self.base_url = base_url
+        self.username = username
+        self.service_ids = service_ids
+        self.session = requests.Session()
+        self.services_etag = None
+
+    def login(self):
+        response = self.session.post(f'{self.base_url}/api/login',
+                                     json={'username': self.username, 'password': BENCH_PASSWORD}, timeout=60)
+        return response.status_code == 200
+
+    def services(self):
+        headers = {'If-None-Match': self.services_etag} if self.services_etag else {}
+        response = self.session.get(f'{self.base_url}/api/services', headers=headers, timeout=60)
+        if response.status_code == 200:
+            self.services_etag = response.headers.get('ETag')
+        return response.status_code in (200, 304)
+
+    def search(self):
+        params = {'q': random.choice(SEARCH_TERMS), 'page': random.randint(1, 3)}
+        if random.random() < 0.5:
+            params['max_price'] = random.choice([5, 10, 20])
+        response = self.session.get(f'{self.base_url}/api/services/search', params=params, timeout=60)
+        return response.status_code == 200
+
+    def order(self):
+        response = self.session.post(f'{self.base_url}/api/orders', json={
+            'service_id': random.choice(self.service_ids),
+            'link': f'https://instagram.com/{self.username}',
+            'quantity': random.randint(10, 1000),
+        }, timeout=60)
+        return response.status_code in (200, 201, 202)
+
+    def payment(self):
+        response = self.session.post(f'{self.base_url}/api/payments/create-payment',
+                                     json={'amount': random.choice([10, 25, 50, 100])}, timeout=60)
+        return response.status_code == 200
+
+
+def run_load(base_url, args, service_ids):
+    weights = SCENARIOS[args.scenario]
+    operations, op_weights = list(weights), list(weights.values())
+    samples = {op: [] for op in operations}
+    errors = {op: 0 for op in operations}
+    lock = threading.Lock()
+    warmup_ends = time.perf_counter() + args.warmup
+    deadline = warmup_ends + args.duration
+
+    def virtual_user(index):
+        client = Client(base_url, f'bench{index % args.users}', service_ids)
+        client.login()
+        rng = random.Random(index)
+        while True:
+            op = rng.choices(operations, op_weights)[0]
+            started = time.perf_counter()
+            if started >= deadline:
+                return
+            try:
+                ok = getattr(client, op)()
+            except requests.RequestException:
+                ok = False
+            finished = time.perf_counter()
+            if started < warmup_ends:
+                continue
+            with lock:
+                samples[op].append(finished - started)
+                if not ok:
+                    errors[op] += 1
+
+    with ThreadPoolExecutor(max_workers=args.clients) as executor:
+        list(executor.map(virtual_user, range(args.clients)))
+
+    report = {}
+    for op in operations:
+        latencies = sorted(samples[op])
+        report[op] = {
+            'requests': len(latencies),
+            'errors': errors[op],
+            'rps': len(latencies) / args.duration,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+        }
+    all_latencies = sorted(latency for op in operations for latency in samples[op])
+    report['total'] = {
+        'requests': len(all_latencies),
+        'errors': sum(errors.values()),
+        'rps': len(all_latencies) / args.duration,
+        'p50_ms': percentile(all_latencies, 50) * 1000,
+        'p95_ms': percentile(all_latencies, 95) * 1000,
+        'p99_ms': percentile(all_latencies, 99) * 1000,
+    }
+    return report
+
+
+def print_report(report, baseline=None):
+    print(f"{'rota':<10}{'reqs':>8}{'erros':>7}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          + (f"{'Δ p95':>9}{'Δ req/s':>9}" if baseline else ''))
+    for op, row in report.items():
+        line = (f"{op:<10}{row['requests']:>8}{row['errors']:>7}{row['rps']:>9.1f}"
+                f"{row['p50_ms']:>9.0f}{row['p95_ms']:>9.0f}{row['p99_ms']:>9.0f}")
+        base = (baseline or {}).get(op)
+        if base:
+            line += f"{_delta(row['p95_ms'], base['p95_ms']):>9}{_delta(row['rps'], base['rps']):>9}"
+        print(line)
+
+
+def _delta(current, base):
+    if not base:
+        return '-'
+    return f"{(current - base) / base * 100:+.0f}%"
+
+
+def regressions(report, baseline, tolerance):
+    found = []
+    for op, row in report.items():
+        base = baseline.get(op)
+        if not base:
+            continue
+        if base['p95_ms'] and row['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            found.append(f"{op}: p95 {row['p95_ms']:.0f} ms (linha de base {base['p95_ms']:.0f} ms)")
+        if base['rps'] and row['rps'] < base['rps'] * (1 - tolerance):
+            found.append(f"{op}: {row['rps']:.1f} req/s (linha de base {base['rps']:.1f} req/s)")
+    return found
+
+
+def load_baselines():
+    if not os.path.exists(BASELINES_PATH):
+        return {}
+    with open(BASELINES_PATH) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Teste de carga local do backend.')
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='default')
+    parser.add_argument('--mode', choices=['sync', 'async'], default='sync', help='SERVER_MODE do gunicorn.')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--clients', type=int, default=20)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--warmup', type=float, default=3)
+    parser.add_argument('--latency-ms', type=float, default=150, help='Latência dos stubs.')
+    parser.add_argument('--jitter-ms', type=float, default=50)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fração de respostas {"error": ...}.')
+    parser.add_argument('--http-error-rate', type=float, default=0.0, help='Fração de respostas HTTP 503.')
+    parser.add_argument('--no-order-worker', action='store_true', help='Não sobe o `flask order-worker`.')
+    parser.add_argument('--rate-limit', action='store_true',
+                        help='Mantém o limitador de requisições ligado (por padrão é desligado: '
+                             'todos os clientes saem do mesmo IP).')
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Piora aceita antes de acusar regressão.')
+    args = parser.parse_args()
+
+    # Os stubs começam sem falhas para a preparação do banco; as taxas entram na medição.
+    stub_config = StubConfig(args.latency_ms, args.jitter_ms)
+    barato = BaratoStub(stub_config).start()
+    mercado_pago = MercadoPagoStub(stub_config).start()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            'DATABASE_URL': f"sqlite:///{os.path.join(tmp, 'load.db')}",
+            'BARATO_API_URL': f'http://127.0.0.1:{barato.port}/api/v2',
+            'MP_API_URL': f'http://127.0.0.1:{mercado_pago.port}',
+            'SERVER_MODE': args.mode,
+            'RATE_LIMIT_ENABLED': '1' if args.rate_limit else '0',
+        }
+        os.environ.update({key: env[key] for key in ('DATABASE_URL', 'BARATO_API_URL', 'MP_API_URL')})
+        service_ids = prepare_database(args, barato, mercado_pago)
+        stub_config.error_rate = args.error_rate
+        stub_config.http_error_rate = args.http_error_rate
+
+        server, base_url = start_gunicorn(env, args.workers)
+        order_worker = None
+        try:
+            wait_until_up(base_url, server)
+            if not args.no_order_worker:
+                order_worker = subprocess.Popen(['flask', '--app', 'main', 'order-worker'], cwd=ROOT, env=env,
+                                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            print(f"cenário '{args.scenario}', modo {args.mode}, {args.workers} worker(s), {args.clients} clientes, "
+                  f"{args.duration:.0f}s; stubs {args.latency_ms:.0f}±{args.jitter_ms:.0f} ms, "
+                  f"erros {args.error_rate:.0%} + HTTP 503 {args.http_error_rate:.0%}\n")
+            report = run_load(base_url, args, service_ids)
+        finally:
+            if order_worker is not None:
+                stop(order_worker)
+            stop(server)
+            barato.stop()
+            mercado_pago.stop()
+
+    key = f'{args.scenario}/{args.mode}'
+    params = {name: getattr(args, name) for name in
+              ('workers', 'clients', 'users', 'duration', 'latency_ms', 'jitter_ms', 'error_rate', 'http_error_rate')}
+    baselines = load_baselines()
+    baseline = baselines.get(key, {}).get('results')
+    if baseline and baselines[key].get('params') != params:
+        print(f"Aviso: parâmetros diferentes dos da linha de base '{key}': {baselines[key].get('params')}\n")
+    print_report(report, baseline)
+    print(f"\nchamadas aos stubs: BaratoSocial {barato.calls}, Mercado Pago {mercado_pago.calls}")
+
+    if args.save_baseline:
+        baselines[key] = {
+            'params': params,
+            'machine': {'python': platform.python_version(), 'cpus': os.cpu_count(), 'system': platform.system()},
+            'results': {op: {metric: round(value, 2) for metric, value in row.items()} for op, row in report.items()},
+        }
+        with open(BASELINES_PATH, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Linha de base '{key}' gravada em {os.path.relpath(BASELINES_PATH, ROOT)}.")
+        return
+
+    if baseline:
+        found = regressions(report, baseline, args.tolerance)
+        if found:
+            print(f"\nREGRESSÃO (tolerância {args.tolerance:.0%}):")
+            for item in found:
+                print(f"  {item}")
+            sys.exit(1)
+        print(f"\nSem regressões em relação à linha de base '{key}' (tolerância {args.tolerance:.0%}).")
+    else:
+        print(f"\nSem linha de base para '{key}'; grave uma com --save-baseline.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# Arquivo: benchmarks/stubs.py
+# Servidores locais que imitam o BaratoSocial (API v2) e o Mercado Pago
+# (/v1/payments e /v1/payments/search), para medir o backend sem rede e sem gastar saldo real.
+# Latência e erros são configuráveis:
+#   latency_ms / jitter_ms  atraso de cada resposta (uniforme em latency ± jitter)
+#   error_rate              fração de respostas 200 com {"error": ...} (como a API real faz)
+#   http_error_rate         fração de respostas HTTP 503
+#
+# Aponte o backend para eles com BARATO_API_URL e MP_API_URL.
+# Uso isolado: python3 benchmarks/stubs.py [--barato-port 9001] [--mp-port 9002] [--latency-ms 150]
+
+import argparse
+import itertools
+import json
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+CATEGORIES = ['Instagram Seguidores', 'Instagram Curtidas', 'TikTok Visualizações', 'YouTube Inscritos']
+
+
+@dataclass
+class StubConfig:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    http_error_rate: float = 0.0
+
+    def delay(self):
+        if self.latency_ms or self.jitter_ms:
+            time.sleep(max(0.0, random.uniform(self.latency_ms - self.jitter_ms,
+                                               self.latency_ms + self.jitter_ms)) / 1000)
+
+    def outcome(self):
+        """'http_error', 'error' ou 'ok' conforme as taxas configuradas."""
+        roll = random.random()
+        if roll < self.http_error_rate:
+            return 'http_error'
+        if roll < self.http_error_rate + self.error_rate:
+            return 'error'
+        return 'ok'
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def _respond(self, handler, *args):
+        config = self.server.stub.config
+        config.delay()
+        outcome = config.outcome()
+        if outcome == 'http_error':
+            self._send_json(503, {'error': 'Service Unavailable'})
+        elif outcome == 'error':
+            self._send_json(200, {'error': 'Erro simulado pelo stub'})
+        else:
+            self._send_json(*handler(*args))
+
+    def log_message(self, *args):
+        pass
+
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        # Cliente que desistiu no meio da resposta (timeout, fim do teste): não é erro do stub.
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+class _Stub:
+    """Base: servidor HTTP com threads em uma porta local, rodando em segundo plano."""
+
+    handler_class = _StubHandler
+
+    def __init__(self, config=None, port=0):
+        self.config = config or StubConfig()
+        self.calls = {}
+        self._lock = threading.Lock()
+        self.server = _StubServer(('127.0.0.1', port), self.handler_class)
+        self.server.stub = self
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def count(self, name):
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# --- BaratoSocial (POST form: key, action=services|add|status|balance) ---
+
+class _BaratoHandler(_StubHandler):
+    def do_POST(self):
+        form = {key: values[0] for key, values in parse_qs(self._read_body().decode()).items()}
+        stub = self.server.stub
+        action = form.get('action', '')
+        stub.count(action)
+        if not form.get('key'):
+            return self._send_json(200, {'error': 'Invalid API key'})
+        handler = getattr(stub, f'action_{action}', None)
+        if handler is None:
+            return self._send_json(200, {'error': 'Incorrect request'})
+        self._respond(handler, form)
+
+
+class BaratoStub(_Stub):
+    handler_class = _BaratoHandler
+
+    def __init__(self, config=None, port=0, services=200):
+        super().__init__(config, port)
+        self.services = [
+            {'service': service_id, 'name': f'Serviço {service_id}', 'type': 'Default',
+             'category': CATEGORIES[service_id % len(CATEGORIES)],
+             'rate': f'{0.5 + (service_id % 40) * 0.25:.2f}', 'min': '10', 'max': '100000',
+             'refill': bool(service_id % 2), 'cancel': False}
+            for service_id in range(1, services + 1)
+        ]
+        self._order_ids = itertools.count(100000)
+        self.orders = {}
+
+    def action_services(self, form):
+        return 200, self.services
+
+    def action_balance(self, form):
+        return 200, {'balance': '1000.00', 'currency': 'BRL'}
+
+    def action_add(self, form):
+        order_id = next(self._order_ids)
+        self.orders[order_id] = int(form.get('quantity') or 0)
+        return 200, {'order': order_id}
+
+    def _status(self, order_id):
+        quantity = self.orders.get(order_id)
+        if quantity is None:
+            return {'error': 'Incorrect order ID'}
+        return {'charge': '0.50', 'start_count': '100', 'status': random.choice(['In progress', 'Completed']),
+                'remains': str(quantity // 2), 'currency': 'BRL'}
+
+    def action_status(self, form):
+        if 'orders' in form:
+            ids = [int(value) for value in form['orders'].split(',') if value.strip().isdigit()]
+            return 200, {str(order_id): self._status(order_id) for order_id in ids}
+        return 200, self._status(int(form.get('order') or 0))
+
+
+# --- Mercado Pago (POST/GET /v1/payments, GET /v1/payments/search, GET /v1/payment_methods) ---
+
+class _MercadoPagoHandler(_StubHandler):
+    def _authorized(self):
+        if not self.headers.get('Authorization', '').startswith('Bearer '):
+            self._send_json(401, {'message': 'invalid access token', 'error': 'unauthorized', 'status': 401})
+            return False
+        return True
+
+    def do_POST(self):
+        body = self._read_body()
+        if not self._authorized():
+            return
+        stub = self.server.stub
+        if self.path.split('?')[0] == '/v1/payments':
+            stub.count('create_payment')
+            return self._respond(stub.create_payment, json.loads(body or b'{}'),
+                                 self.headers.get('X-Idempotency-Key'))
+        self._send_json(404, {'message': 'resource not found', 'error': 'not_found', 'status': 404})
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        stub = self.server.stub
+        path = self.path.split('?')[0]
+        if path == '/v1/payment_methods':
+            stub.count('payment_methods')
+            return self._respond(lambda: (200, [{'id': 'pix', 'payment_type_id': 'bank_transfer'}]))
+        if path == '/v1/payments/search':
+            stub.count('search_payments')
+            query = {key: values[0] for key, values in parse_qs(urlsplit(self.path).query).items()}
+            return self._respond(stub.search_payments, query)
+        if path.startswith('/v1/payments/'):
+            stub.count('get_payment')
+            return self._respond(stub.get_payment, path.rsplit('/', 1)[1])
+        self._send_json(404, {'message': 'resource not found', 'error': 'not_found', 'status': 404})
+
+
+BRT = timezone(timedelta(hours=-3))
+
+
+def _mp_date(value):
+    """Data no formato do Mercado Pago: "2026-10-18T10:30:00.000-03:00"."""
+    return value.astimezone(BRT).isoformat(timespec='milliseconds')
+
+
+def _parse_date(value):
+    return datetime.fromisoformat(value.replace('Z', '+00:00')) if value else None
+
+
+class MercadoPagoStub(_Stub):
+    handler_class = _MercadoPagoHandler
+
+    def __init__(self, config=None, port=0):
+        super().__init__(config, port)
+        self._payment_ids = itertools.count(5000000)
+        self.payments = {}
+        self.idempotency_keys = {}  # X-Idempotency-Key -> id do pagamento já criado
+        self._dates = {}  # id -> date_created já convertido (a busca compara datas)
+
+    def create_payment(self, data, idempotency_key=None):
+        # Como o gateway real: mesma chave devolve o pagamento já criado.
+        if idempotency_key in self.idempotency_keys:
+            return 201, self.payments[self.idempotency_keys[idempotency_key]]
+        payment_id = next(self._payment_ids)
+        now = datetime.now(BRT)
+        payment = {
+            'id': payment_id, 'status': 'pending', 'status_detail': 'pending_waiting_transfer',
+            'date_created': _mp_date(now), 'date_of_expiration': _mp_date(now + timedelta(minutes=30)),
+            'transaction_amount': data.get('transaction_amount'),
+            'external_reference': data.get('external_reference'),
+            'payment_method_id': data.get('payment_method_id', 'pix'),
+            'point_of_interaction': {'transaction_data': {
+                'qr_code': f'00020126STUB{payment_id}', 'qr_code_base64': 'iVBORw0KGgo=',
+                'ticket_url': f'https://stub.local/pix/{payment_id}',
+            }},
+        }
+        self.payments[str(payment_id)] = payment
+        if idempotency_key:
+            self.idempotency_keys[idempotency_key] = str(payment_id)
+        return 201, payment
+
+    def add_payment(self, payment_id, status, date_created, external_reference=None, expires_in=timedelta(minutes=30)):
+        """Cadastra um pagamento com data e status quaisquer (cenários de conciliação)."""
+        self.payments[str(payment_id)] = {
+            'id': payment_id, 'status': status, 'external_reference': external_reference,
+            'date_created': _mp_date(date_created), 'date_of_expiration': _mp_date(date_created + expires_in),
+        }
+
+    def search_payments(self, query):
+        begin, end = _parse_date(query.get('begin_date')), _parse_date(query.get('end_date'))
+        reference = query.get('external_reference')
+        found = sorted((payment for payment in self.payments.values()
+                        if (not begin or self._created_at(payment) >= begin)
+                        and (not end or self._created_at(payment) <= end)
+                        and (reference is None or payment.get('external_reference') == reference)),
+                       key=self._created_at)
+        offset, limit = int(query.get('offset', 0)), min(int(query.get('limit', 30)), 1000)
+        return 200, {'paging': {'total': len(found), 'offset': offset, 'limit': limit},
+                     'results': found[offset:offset + limit]}
+
+    def _created_at(self, payment):
+        created_at = self._dates.get(payment['id'])
+        if created_at is None:
+            created_at = self._dates[payment['id']] = _parse_date(payment['date_created'])
+        return created_at
+
+    def get_payment(self, payment_id):
+        payment = self.payments.get(payment_id)
+        if payment is None:
+            return 404, {'message': 'Payment not found', 'error': 'not_found', 'status': 404}
+        return 200, payment
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stubs locais do BaratoSocial e do Mercado Pago.')
+    parser.add_argument('--barato-port', type=int, default=9001)
+    parser.add_argument('--mp-port', type=int, default=9002)
+    parser.add_argument('--latency-ms', type=float, default=150)
+    parser.add_argument('--jitter-ms', type=float, default=50)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--http-error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    config = StubConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.http_error_rate)
+    barato = BaratoStub(config, args.barato_port).start()
+    mercado_pago = MercadoPagoStub(config, args.mp_port).start()
+    print(f"BARATO_API_URL=http://127.0.0.1:{barato.port}/api/v2")
+    print(f"MP_API_URL=http://127.0.0.1:{mercado_pago.port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
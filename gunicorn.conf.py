@@ -0,0 +1,75 @@
+# Arquivo: gunicorn.conf.py
+# Carregado automaticamente pelo gunicorn quando iniciado nesta pasta
+# (o startCommand do render.yaml continua `gunicorn --bind 0.0.0.0:$PORT main:app`).
+#
+# SERVER_MODE=sync (padrão): workers síncronos; cada chamada ao fornecedor ou
+#   ao Mercado Pago ocupa o worker até a resposta chegar.
+# SERVER_MODE=async: workers gevent; as mesmas rotas Flask, mas a espera de
+#   rede é cooperativa e um processo atende centenas de chamadas em andamento
+#   (até ASYNC_WORKER_CONNECTIONS). O número de workers continua vindo de
+#   WEB_CONCURRENCY / --workers.
+#
+# PRELOAD_APP=1 (padrão no modo sync): o app é importado uma vez no processo
+#   mestre e os workers nascem já prontos, compartilhando a memória do código
+#   (copy-on-write). create_app() não abre conexões; post_fork descarta o
+#   pool herdado por garantia. No modo async o preload fica desligado: o gevent
+#   precisa fazer o monkey-patch antes de o app importar socket/ssl.
+
+import os
+import tempfile
+
+SERVER_MODE = os.environ.get('SERVER_MODE', 'sync').lower()
+preload_app = os.environ.get('PRELOAD_APP', '1') == '1'
+
+if SERVER_MODE == 'async':
+    try:
+        import gevent  # noqa: F401
+    except ImportError:
+        print("SERVER_MODE=async requer o pacote 'gevent'; usando workers síncronos.")
+    else:
+        worker_class = 'gevent'
+        worker_connections = int(os.environ.get('ASYNC_WORKER_CONNECTIONS', '500'))
+        preload_app = False
+
+# Snapshots das métricas de cada worker, somados pelo GET /metrics (ver src/metrics.py).
+METRICS_DIR = os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), f'painel-metrics-{os.getpid()}'))
+
+
+def _clear_metrics_dir():
+    # Só os snapshots (*.json); o diretório pode ter sido escolhido via METRICS_DIR.
+    if os.path.isdir(METRICS_DIR):
+        for filename in os.listdir(METRICS_DIR):
+            if filename.endswith(('.json', '.json.tmp')):
+                os.remove(os.path.join(METRICS_DIR, filename))
+
+
+def on_starting(server):
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    _clear_metrics_dir()
+
+
+def on_exit(server):
+    _clear_metrics_dir()
+
+
+def child_exit(server, worker):
+    from src.metrics import mark_process_dead
+    mark_process_dead(worker.pid, METRICS_DIR)
+
+
+def post_fork(server, worker):
+    if server.cfg.preload_app:
+        from src.app import after_fork
+        after_fork(server.app.wsgi())
+
+
+def post_worker_init(worker):
+    if worker.__class__.__name__ != 'GeventWorker':
+        return
+    # Sem isto, cada consulta ao PostgreSQL (psycopg2) bloquearia o loop do worker.
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        print("Aviso: 'psycogreen' não instalado; consultas ao PostgreSQL bloquearão o worker gevent.")
+        return
+    patch_psycopg()
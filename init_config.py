@@ -2,12 +2,15 @@
 import sys
 import os
 
-# Adicionar o diretório src ao path
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+# Adicionar o diretório raiz ao path
+sys.path.insert(0, os.path.dirname(__file__))
 
-from src.main import app
+from src.app import create_app
+from src.config import bump_config_version
 from src.models.user import db, AdminConfig
 
+app = create_app()
+
 def init_default_config():
     """Inicializar configurações padrão"""
     with app.app_context():
@@ -36,6 +39,7 @@ def init_default_config():
                 else:
                     print(f"Configuração {key} já existe")
         
+        bump_config_version()
         db.session.commit()
         print("Configurações inicializadas com sucesso!")
 
@@ -5,41 +5,22 @@ import sys
 # Adicionar o diretório raiz ao path
 sys.path.insert(0, os.path.dirname(__file__))
 
-from flask import Flask
-from src.models.user import db, AdminConfig
+from src.app import create_app
+from src.config import seed_default_configs
+from src.migrations import reset, upgrade
 
-# Criar app Flask
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'src', 'database', 'app.db')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# Inicializar banco
-db.init_app(app)
+# Mesmo app de produção: usa DATABASE_URL se existir, senão src/database/app.db
+app = create_app()
 
 with app.app_context():
-    # Deletar todas as tabelas
-    db.drop_all()
+    # Só apaga os dados quando pedido explicitamente: python3 init_db.py --reset
+    if '--reset' in sys.argv:
+        reset()
+        print("Tabelas removidas (--reset).")
     
-    # Criar todas as tabelas
-    db.create_all()
+    # Criar/atualizar as tabelas pelas migrações versionadas
+    upgrade()
     
     # Criar configurações padrão
-    default_configs = {
-        'profit_margin': '20',
-        'barato_api_key': '',
-        'mp_access_token': '',
-        'mp_public_key': '',
-        'mp_client_id': '',
-        'mp_client_secret': ''
-    }
-    
-    for key, default_value in default_configs.items():
-        existing_config = AdminConfig.query.filter_by(key=key).first()
-        if not existing_config:
-            config = AdminConfig(key=key, value=default_value)
-            db.session.add(config)
-    
-    db.session.commit()
+    seed_default_configs()
     print("Banco de dados inicializado com sucesso!")
-
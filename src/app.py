@@ -0,0 +1,101 @@
+# Arquivo: src/app.py
+# Fábrica única da aplicação, usada por main.py (gunicorn / flask CLI),
+# src/main.py (servidor local) e pelos scripts init_db.py / init_config.py.
+#
+# create_app() não abre conexões nem faz DDL: o engine do SQLAlchemy só conecta
+# na primeira requisição. Por isso é seguro usar `gunicorn --preload` (o app é
+# carregado uma vez no processo mestre e compartilhado entre os workers); após
+# o fork, after_fork() descarta o pool herdado. Schema e configurações padrão
+# são criados por comandos explícitos: `flask init-db` / `flask db-upgrade`.
+
+import os
+
+from flask import Flask, abort, send_from_directory
+from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from src.models.user import db
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _database_uri():
+    # Usa PostgreSQL no Render (DATABASE_URL), SQLite no computador local.
+    database_url = os.environ.get('DATABASE_URL')
+    if database_url:
+        # Corrige um pequeno problema de compatibilidade entre bibliotecas.
+        return database_url.replace("postgres://", "postgresql://", 1)
+    database_dir = os.path.join(SRC_DIR, 'database')
+    os.makedirs(database_dir, exist_ok=True)
+    return f"sqlite:///{os.path.join(database_dir, 'app.db')}"
+
+
+def create_app(config=None):
+    app = Flask(__name__, static_folder=os.path.join(SRC_DIR, 'static'))
+    app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
+    app.config['SQLALCHEMY_DATABASE_URI'] = _database_uri()
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    if config:
+        app.config.update(config)
+
+    # Atrás do proxy do Render o IP do cliente vem no X-Forwarded-For (usado nos limites por IP).
+    proxy_hops = int(os.environ.get('PROXY_FIX_HOPS', '0'))
+    if proxy_hops:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxy_hops, x_proto=proxy_hops)
+
+    CORS(app, supports_credentials=True)
+    db.init_app(app)
+
+    from src import encoding, metrics, profiler
+    metrics.init_app(app)
+    profiler.init_app(app)
+    encoding.init_app(app)
+
+    from src.routes.admin import admin_bp
+    from src.routes.orders import orders_bp
+    from src.routes.payments import payments_bp
+    from src.routes.services import services_bp
+    from src.routes.user import user_bp
+
+    app.register_blueprint(user_bp, url_prefix='/api')
+    app.register_blueprint(services_bp, url_prefix='/api')
+    app.register_blueprint(orders_bp, url_prefix='/api')
+    app.register_blueprint(admin_bp, url_prefix='/api/admin')
+    app.register_blueprint(payments_bp, url_prefix='/api/payments')
+
+    # Rota de verificação de saúde para o Render saber que o app está vivo.
+    @app.route('/api/health')
+    def health_check():
+        return {"status": "ok"}, 200
+
+    # O frontend fica no Netlify; servimos os estáticos de src/static só por conveniência.
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        if path.startswith('api/'):
+            abort(404)
+        static_folder_path = app.static_folder
+        if path and os.path.exists(os.path.join(static_folder_path, path)):
+            return send_from_directory(static_folder_path, path)
+        if os.path.exists(os.path.join(static_folder_path, 'index.html')):
+            return send_from_directory(static_folder_path, 'index.html')
+        return "Servidor do Painel INFLUENCIANDO está no ar."
+
+    from src.cli import register_commands
+    register_commands(app)
+
+    return app
+
+
+def after_fork(app):
+    """
+    Chamado em cada worker do gunicorn após o fork (ver gunicorn.conf.py).
+    Conexões herdadas do processo mestre não podem ser usadas pelo filho:
+    dispose(close=False) esquece o pool sem fechar os sockets do mestre.
+    """
+    from src import metrics, profiler
+    metrics.reset()
+    profiler.reset()
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
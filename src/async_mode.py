@@ -0,0 +1,29 @@
+# Arquivo: src/async_mode.py
+# Detecção do modo assíncrono (gunicorn com worker gevent, ver gunicorn.conf.py).
+# No modo assíncrono o gevent troca socket/threading por versões cooperativas:
+# as rotas Flask continuam iguais, mas cada chamada HTTP ao fornecedor ou ao
+# Mercado Pago libera o worker para outras requisições enquanto espera.
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+def is_async():
+    """True se o processo roda sob gevent com a rede já "monkey-patched"."""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('socket')
+
+
+def native_thread_pool(max_workers, thread_name_prefix=''):
+    """
+    Pool de threads reais do sistema operacional.
+    Sob gevent, as threads de `threading` viram greenlets: trabalho de CPU
+    (ex.: hash de senha) travaria o loop inteiro. O pool nativo do gevent roda
+    esse trabalho fora do loop; fora do modo assíncrono é o pool comum.
+    """
+    if is_async():
+        from gevent.threadpool import ThreadPoolExecutor as NativeThreadPoolExecutor
+        return NativeThreadPoolExecutor(max_workers=max_workers)
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
@@ -0,0 +1,146 @@
+# Arquivo: src/cli.py
+# Comandos `flask ...` (registrados por create_app). O Flask já roda cada
+# comando dentro do contexto da aplicação.
+# Tudo que toca o banco na inicialização (migrações, configurações padrão)
+# fica aqui, em comandos explícitos: importar o app não faz nenhuma query.
+
+import time
+
+import click
+
+from src.models.user import db
+
+
+def register_commands(app):
+
+    # Comando para inicializar o banco de dados pela primeira vez.
+    # Você pode rodar isso via Shell do Render se precisar recriar o banco.
+    @app.cli.command("init-db")
+    def init_db_command():
+        """Aplica as migrações pendentes e cria as configurações padrão."""
+        from src.config import seed_default_configs
+        from src.migrations import upgrade
+        upgrade()
+        print("Banco de dados inicializado.")
+        created = seed_default_configs()
+        print(f"Configurações padrão criadas: {', '.join(created) if created else 'nenhuma (já existiam)'}.")
+
+    # Migrações de schema versionadas (seguro rodar a cada deploy).
+    @app.cli.command("db-upgrade")
+    @click.option('--status', 'show_status', is_flag=True, help='Só lista as migrações e sai.')
+    def db_upgrade_command(show_status):
+        """Aplica as migrações de schema pendentes."""
+        from src.migrations import status, upgrade
+        if not show_status:
+            applied = upgrade()
+            print(f"{len(applied)} migração(ões) aplicada(s).")
+        for version, name, done in status():
+            print(f"{version:04d}_{name}: {'aplicada' if done else 'pendente'}")
+
+    # Reconstrói os totais diários do dashboard a partir das tabelas de origem.
+    @app.cli.command("rebuild-rollups")
+    def rebuild_rollups_command():
+        """Recalcula a tabela daily_rollup (pedidos, faturamento e usuários por dia)."""
+        from src.services.rollups import rebuild_rollups
+        print(f"{rebuild_rollups()} linha(s) de totais diários geradas.")
+
+    # Recalcula a tabela de preços (regras de preço + profit_margin).
+    @app.cli.command("reprice")
+    def reprice_command():
+        """Recalcula service_price para todos os serviços (ex.: após mudar PROFIT_MARGIN no ambiente)."""
+        from src.services.pricing import reprice_all
+        stats = reprice_all()
+        db.session.commit()
+        print(f"{stats['prices']} preço(s) de {stats['services']} serviço(s) em {stats['total_ms']} ms "
+              f"(cálculo: {stats['compute_ms']} ms).")
+
+    # Confere o saldo de cada usuário contra o razão (ledger_entry).
+    @app.cli.command("reconcile-ledger")
+    @click.option('--stale-hold-hours', default=24, type=int, help='Idade mínima para listar reservas presas.')
+    def reconcile_ledger_command(stale_hold_hours):
+        """Lista saldos divergentes do razão e reservas de pedidos presas."""
+        from src.services.balance import reconcile
+        report = reconcile(stale_hold_hours)
+        for item in report['mismatches']:
+            print(f"DIVERGÊNCIA usuário {item['user_id']}: saldo {item['balance_cents']} "
+                  f"centavos, razão {item['ledger_cents']} centavos")
+        for item in report['stale_holds']:
+            print(f"RESERVA PRESA {item['reference']} (usuário {item['user_id']}, "
+                  f"{item['amount_cents']} centavos, desde {item['created_at']})")
+        print(f"{len(report['mismatches'])} divergência(s), {len(report['stale_holds'])} reserva(s) presa(s).")
+        if report['mismatches']:
+            raise SystemExit(1)
+
+    # Consumidor dedicado dos webhooks do Mercado Pago (use com PAYMENT_EVENTS_INLINE=0).
+    @app.cli.command("process-payment-events")
+    @click.option('--once', is_flag=True, help='Processa a fila uma vez e sai.')
+    def process_payment_events_command(once):
+        """Credita pagamentos confirmados pelos webhooks do Mercado Pago."""
+        from src.services.payment_events import drain, POLL_INTERVAL
+        while True:
+            processed = drain()
+            if processed:
+                print(f"{processed} evento(s) de pagamento processado(s).")
+            if once:
+                break
+            db.session.remove()
+            time.sleep(POLL_INTERVAL)
+
+    # Resolve pagamentos presos em 'pending' com buscas em lote no Mercado Pago.
+    @app.cli.command("reconcile-payments")
+    @click.option('--dry-run', is_flag=True, help='Só mostra o que seria feito, sem gravar.')
+    @click.option('--min-age-minutes', default=None, type=int, help='Idade mínima dos pagamentos pendentes.')
+    @click.option('--interval', default=0, type=int, help='Repete a cada N segundos (0 = roda uma vez).')
+    def reconcile_payments_command(dry_run, min_age_minutes, interval):
+        """Aprova, cancela ou expira pagamentos pendentes conforme o Mercado Pago."""
+        from src.services.payment_reconciliation import PAYMENT_RECONCILE_MIN_AGE, reconcile_pending_payments
+        while True:
+            report = reconcile_pending_payments(dry_run, min_age_minutes or PAYMENT_RECONCILE_MIN_AGE)
+            if dry_run:
+                for change in report['changes']:
+                    print(f"pagamento {change['payment_id']} (usuário {change['user_id']}, R$ {change['amount']:.2f}, "
+                          f"MP {change['mp_payment_id'] or '-'}): pending -> {change['status']}")
+            updated = ', '.join(f'{status}: {count}' for status, count in sorted(report['updated'].items()))
+            print(f"{report['checked']} pagamento(s) pendente(s) conferido(s) com {report['api_calls']} chamada(s) "
+                  f"ao Mercado Pago{' (dry-run, nada gravado)' if dry_run else ''}. "
+                  f"{'Seriam atualizados' if dry_run else 'Atualizados'}: {updated or 'nenhum'}; "
+                  f"sem mudança: {report['unchanged']}; não conferidos (erro no gateway): {report['skipped']}.")
+            if not interval:
+                break
+            db.session.remove()
+            time.sleep(interval)
+
+    # Worker que envia ao BaratoSocial os pedidos criados como 'Queued'.
+    @app.cli.command("order-worker")
+    @click.option('--once', is_flag=True, help='Drena a fila uma vez e sai.')
+    @click.option('--concurrency', default=None, type=int, help='Pedidos enviados em paralelo.')
+    @click.option('--batch-size', default=None, type=int, help='Pedidos reservados por lote.')
+    def order_worker_command(once, concurrency, batch_size):
+        """Envia os pedidos da fila ao fornecedor e estorna os que falharem."""
+        from src.services import order_pipeline
+        concurrency = concurrency or order_pipeline.ORDER_WORKER_CONCURRENCY
+        batch_size = batch_size or order_pipeline.ORDER_WORKER_BATCH_SIZE
+        while True:
+            order_pipeline.recover_stale_claims()
+            processed = order_pipeline.process_queued_orders(batch_size, concurrency)
+            if processed:
+                print(f"{processed} pedido(s) enviado(s) ao fornecedor.")
+            elif once:
+                break
+            else:
+                db.session.remove()
+                time.sleep(1)
+
+    # Atualiza o status dos pedidos abertos consultando o fornecedor em lotes de 100.
+    @app.cli.command("refresh-order-status")
+    @click.option('--interval', default=0, type=int, help='Repete a cada N segundos (0 = roda uma vez).')
+    def refresh_order_status_command(interval):
+        """Atualiza status e start_count dos pedidos não finalizados."""
+        from src.services.order_status import refresh_open_orders
+        while True:
+            summary = refresh_open_orders()
+            print(f"Status atualizado: {summary}")
+            if not interval:
+                break
+            db.session.remove()
+            time.sleep(interval)
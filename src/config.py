@@ -1,22 +1,144 @@
 # Arquivo: src/config.py
 
 import os
-from .models.user import AdminConfig
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import Integer, Text, cast
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .models.user import AdminConfig, db
+
+# Tempo (em segundos) que cada worker confia no cache antes de checar a versão no banco.
+CONFIG_CACHE_TTL = float(os.environ.get('CONFIG_CACHE_TTL', '5'))
+
+# Chaves internas começam com "_" e não são configurações editáveis pelo admin.
+CONFIG_VERSION_KEY = '_config_version'
+
+# Configurações criadas (vazias) pelo `flask init-db` se ainda não existirem.
+DEFAULT_CONFIGS = {
+    'profit_margin': '20',  # 20% de margem de lucro padrão
+    'barato_api_key': '',
+    'mp_access_token': '',
+    'mp_public_key': '',
+    'mp_client_id': '',
+    'mp_client_secret': '',
+    'mp_webhook_secret': '',
+}
+
+_cache_lock = threading.Lock()
+_cache = {
+    'values': None,      # dict key -> value com todas as linhas de AdminConfig
+    'version': None,     # valor de CONFIG_VERSION_KEY quando o cache foi carregado
+    'checked_at': 0.0,   # time.monotonic() da última checagem de versão
+}
+
+
+def is_internal_key(key):
+    """Chaves internas (contadores de versão etc.) não aparecem para o admin."""
+    return key.startswith('_')
+
+
+def read_version(key=CONFIG_VERSION_KEY):
+    row = db.session.query(AdminConfig.value).filter_by(key=key).first()
+    return row[0] if row else None
+
+
+def _load_all_configs():
+    """Carrega todas as configurações em uma única query."""
+    rows = db.session.query(AdminConfig.key, AdminConfig.value).all()
+    values = dict(rows)
+    return values, values.get(CONFIG_VERSION_KEY)
+
+
+def _get_cached_configs():
+    now = time.monotonic()
+    with _cache_lock:
+        values = _cache['values']
+        version = _cache['version']
+        if values is not None and now - _cache['checked_at'] < CONFIG_CACHE_TTL:
+            return values
+
+    # TTL expirado: uma query barata só para o contador de versão.
+    if values is not None and read_version() == version:
+        with _cache_lock:
+            _cache['checked_at'] = now
+        return values
+
+    values, version = _load_all_configs()
+    with _cache_lock:
+        _cache['values'] = values
+        _cache['version'] = version
+        _cache['checked_at'] = now
+    return values
+
+
+def invalidate_config_cache():
+    """Descarta o cache deste worker; a próxima leitura recarrega do banco."""
+    with _cache_lock:
+        _cache['values'] = None
+        _cache['version'] = None
+        _cache['checked_at'] = 0.0
+
+
+def bump_version(key=CONFIG_VERSION_KEY):
+    """
+    Incrementa um contador de versão guardado em AdminConfig.
+    Deve ser chamado dentro da mesma transação da escrita que ele sinaliza;
+    o commit fica a cargo de quem chamou.
+    """
+    table = AdminConfig.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        # UPSERT: dois workers criando a mesma chave ao mesmo tempo não colidem na chave única.
+        insert = pg_insert if dialect == 'postgresql' else sqlite_insert
+        stmt = insert(table).values(key=key, value='1', updated_at=datetime.utcnow())
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['key'],
+            set_={'value': cast(cast(table.c.value, Integer) + 1, Text), 'updated_at': stmt.excluded.updated_at}
+        ))
+        return
+
+    # Outros bancos: UPDATE e, se não havia linha, INSERT.
+    updated = AdminConfig.query.filter_by(key=key).update(
+        {AdminConfig.value: cast(cast(AdminConfig.value, Integer) + 1, Text)},
+        synchronize_session=False
+    )
+    if not updated:
+        db.session.add(AdminConfig(key=key, value='1'))
+
+
+def seed_default_configs(defaults=DEFAULT_CONFIGS):
+    """Cria as configurações que ainda não existem (uma query). Retorna as chaves criadas."""
+    existing = {key for (key,) in db.session.query(AdminConfig.key).filter(AdminConfig.key.in_(list(defaults)))}
+    created = [key for key in defaults if key not in existing]
+    for key in created:
+        db.session.add(AdminConfig(key=key, value=defaults[key]))
+    if created:
+        bump_config_version()
+    db.session.commit()
+    invalidate_config_cache()
+    return created
+
+
+def bump_config_version():
+    """Sinaliza a todos os workers que as configurações mudaram (commit a cargo de quem chamou)."""
+    bump_version(CONFIG_VERSION_KEY)
+
 
 def get_config(key):
     """
     Busca uma configuração de forma inteligente.
     1. Primeiro, tenta pegar da variável de ambiente (mais confiável no Render).
-    2. Se não encontrar, busca no banco de dados.
+    2. Se não encontrar, busca no cache do worker (recarregado do banco quando
+       o TTL expira e o contador de versão mudou).
     """
     # Prioridade 1: Variáveis de Ambiente
     value = os.environ.get(key.upper()) # Ex: 'barato_api_key' -> 'BARATO_API_KEY'
     if value:
         return value
 
-    # Prioridade 2: Banco de Dados (como fallback)
-    config_entry = AdminConfig.query.filter_by(key=key).first()
-    if config_entry:
-        return config_entry.value
-        
-    return None
+    # Prioridade 2: Banco de Dados (como fallback, via cache)
+    return _get_cached_configs().get(key)
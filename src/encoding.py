@@ -0,0 +1,131 @@
+# Arquivo: src/encoding.py
+# Negociação de formato e de compressão das respostas da API.
+#
+# - Formato: JSON por padrão; MessagePack (application/msgpack) quando o
+#   cliente pede no Accept e o pacote `msgpack` está instalado. Rotas de lista
+#   usam `api_response(data)` no lugar de `jsonify(data)` para oferecer os dois.
+# - Compressão: brotli (se o pacote `brotli` estiver instalado) ou gzip,
+#   conforme o Accept-Encoding, para corpos a partir de COMPRESS_MIN_SIZE bytes.
+#   Respostas dinâmicas são comprimidas no after_request com níveis rápidos;
+#   corpos de snapshot (catálogo) passam por `snapshot_response`, que guarda as
+#   variantes já comprimidas (níveis SNAPSHOT_*) junto do snapshot, uma vez por
+#   versão do catálogo.
+
+import gzip
+import os
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # opcional: sem ele, só gzip
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:  # opcional: sem ele, só JSON
+    msgpack = None
+
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', '1024'))
+# Níveis das respostas dinâmicas (comprimidas a cada requisição).
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', '5'))
+# Níveis das variantes guardadas no snapshot (comprimidas uma vez por versão).
+# Brotli 11 ainda comprime ~20% mais que 9, mas leva segundos em um catálogo de
+# centenas de KB, e quem paga é a primeira requisição depois de cada mudança.
+SNAPSHOT_GZIP_LEVEL = int(os.environ.get('SNAPSHOT_GZIP_LEVEL', '9'))
+SNAPSHOT_BROTLI_QUALITY = int(os.environ.get('SNAPSHOT_BROTLI_QUALITY', '9'))
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+MSGPACK_ALIASES = (MSGPACK, 'application/x-msgpack')
+COMPRESSIBLE = (JSON, MSGPACK)
+
+_ETAG_SUFFIX = {(MSGPACK, None): 'mp', (JSON, 'gzip'): 'gz', (JSON, 'br'): 'br',
+                (MSGPACK, 'gzip'): 'mp-gz', (MSGPACK, 'br'): 'mp-br'}
+
+
+def codings():
+    """Codificações suportadas, da preferida para a menos preferida."""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate_format():
+    if msgpack is None:
+        return JSON
+    accept = request.accept_mimetypes
+    best = accept.best_match((JSON,) + MSGPACK_ALIASES, default=JSON)
+    # "*/*" casa com tudo; MessagePack só quando pedido explicitamente.
+    if best in MSGPACK_ALIASES and accept.quality(best) > accept[JSON]:
+        return MSGPACK
+    return JSON
+
+
+def negotiate_coding():
+    accepted = request.accept_encodings
+    best = accepted.best_match(codings())
+    return best if best and accepted.quality(best) > 0 else None
+
+
+def pack(data):
+    """MessagePack com as mesmas conversões do JSON do app (datas, Decimal, ...)."""
+    return msgpack.packb(data, default=current_app.json.default)
+
+
+def compress(body, coding, snapshot=False):
+    if coding == 'br':
+        return brotli.compress(body, quality=SNAPSHOT_BROTLI_QUALITY if snapshot else BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=SNAPSHOT_GZIP_LEVEL if snapshot else GZIP_LEVEL, mtime=0)
+
+
+def api_response(data, status=200):
+    """`jsonify` com suporte a MessagePack (a compressão fica com o after_request)."""
+    if negotiate_format() == MSGPACK:
+        return current_app.response_class(pack(data), status=status, mimetype=MSGPACK)
+    response = current_app.json.response(data)
+    response.status_code = status
+    return response
+
+
+def snapshot_response(cache, key, data, body, etag):
+    """
+    Resposta de um corpo pré-serializado de snapshot (`body` é o JSON de `data`).
+    As variantes (MessagePack, gzip, brotli) ficam em `cache`, um dict que vive
+    junto do snapshot, então cada uma é calculada uma vez por worker e versão.
+    Cada variante tem seu próprio ETag.
+    """
+    mimetype, coding = negotiate_format(), negotiate_coding()
+    variant = cache.get((key, mimetype, coding))
+    if variant is None:
+        raw = body if mimetype == JSON else pack(data)
+        used = coding if coding and len(raw) >= COMPRESS_MIN_SIZE else None
+        encoded = compress(raw, used, snapshot=True) if used else raw
+        suffix = _ETAG_SUFFIX.get((mimetype, used))
+        variant = cache[(key, mimetype, coding)] = (encoded, used, f'{etag}-{suffix}' if suffix else etag)
+
+    encoded, used, variant_etag = variant
+    response = current_app.response_class(encoded, mimetype=mimetype)
+    if used:
+        response.headers['Content-Encoding'] = used
+    response.vary.update(('Accept', 'Accept-Encoding'))
+    response.set_etag(variant_etag)
+    return response
+
+
+def init_app(app):
+    @app.after_request
+    def _compress_response(response):
+        if (response.direct_passthrough or response.is_streamed or response.status_code < 200
+                or response.status_code in (204, 304) or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE):
+            return response
+        response.vary.add('Accept-Encoding')
+        body = response.get_data()
+        coding = negotiate_coding() if len(body) >= COMPRESS_MIN_SIZE else None
+        if coding:
+            response.set_data(compress(body, coding))
+            response.headers['Content-Encoding'] = coding
+            etag, weak = response.get_etag()
+            if etag:
+                response.set_etag(f'{etag}-{"gz" if coding == "gzip" else coding}', weak)
+        return response
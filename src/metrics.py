@@ -0,0 +1,434 @@
+# Arquivo: src/metrics.py
+# Métricas no formato de texto do Prometheus, expostas em GET /metrics.
+#
+# - Por rota: latência (histograma) e contagem por endpoint, método e status;
+#   consultas ao banco e tempo de banco por requisição; requisições em andamento.
+# - Por fornecedor externo (BaratoSocial, Mercado Pago): latência e erros por ação.
+# - Pools: conexões do banco em uso e reaproveitamento das sessões HTTP.
+#
+# Custo no caminho quente: cada thread do sistema operacional soma em seu
+# próprio "shard" (dicts comuns, sem lock); só a leitura junta os shards.
+# Sob gevent todos os greenlets de um worker dividem a mesma thread, e não há
+# troca de greenlet no meio de uma soma.
+#
+# Vários workers do gunicorn: cada worker grava seu snapshot em METRICS_DIR
+# (uma thread em segundo plano, a cada METRICS_FLUSH_INTERVAL segundos) e o /metrics soma os
+# arquivos de todos. O gunicorn.conf.py define e limpa o diretório; sem ele
+# (servidor de desenvolvimento, CLI) as métricas são só do processo atual.
+# O /metrics é fechado por padrão: aceita `Authorization: Bearer <METRICS_TOKEN>`
+# (o Prometheus) ou a sessão de um admin. METRICS_PUBLIC=1 o deixa aberto
+# (ex.: porta acessível só pela rede interna).
+
+import hmac
+import json
+import os
+import re
+import threading
+import time
+
+from flask import Response, g, has_request_context, request, session
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+METRICS_DIR = os.environ.get('METRICS_DIR')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', '1'))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+METRICS_PUBLIC = os.environ.get('METRICS_PUBLIC', '0') == '1'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+HELP = {
+    'http_requests_total': ('counter', 'Requisições atendidas por endpoint, método e status.'),
+    'http_request_duration_seconds': ('histogram', 'Latência das requisições por endpoint, método e status.'),
+    'http_requests_in_flight': ('gauge', 'Requisições em andamento.'),
+    'http_request_db_queries': ('histogram', 'Consultas ao banco por requisição.'),
+    'http_request_db_seconds': ('histogram', 'Tempo gasto no banco por requisição.'),
+    'db_queries_total': ('counter', 'Consultas ao banco por endpoint (ou "background").'),
+    'db_query_seconds_total': ('counter', 'Tempo total no banco por endpoint (ou "background").'),
+    'upstream_request_duration_seconds': ('histogram', 'Latência das chamadas a serviços externos por ação.'),
+    'upstream_errors_total': ('counter', 'Erros das chamadas a serviços externos por ação e tipo.'),
+    'payment_events_retried_total': ('counter', 'Consultas ao Mercado Pago de eventos de pagamento que falharam '
+                                                'e foram reagendadas.'),
+    'payment_events_failed_total': ('counter', 'Eventos de pagamento descartados após esgotar as tentativas.'),
+    'rate_limited_total': ('counter', 'Requisições recusadas pelo limitador, por regra.'),
+    'idempotency_requests_total': ('counter', 'Requisições com Idempotency-Key por rota e resultado '
+                                              '(new, replay, in_progress, interrupted, mismatch).'),
+    'db_pool_checked_out': ('gauge', 'Conexões do pool do banco em uso.'),
+    'db_pool_size': ('gauge', 'Tamanho configurado do pool do banco.'),
+    'http_client_pool_requests': ('gauge', 'Requisições feitas pelas sessões HTTP compartilhadas.'),
+    'http_client_pool_new_connections': ('gauge', 'Conexões novas (TCP + TLS) abertas pelas sessões HTTP.'),
+}
+
+# Gauges somem quando o worker morre; contadores e histogramas são preservados.
+GAUGES = {name for name, (kind, _) in HELP.items() if kind == 'gauge'}
+
+
+class _Shard:
+    __slots__ = ('counters', 'histograms')
+
+    def __init__(self):
+        self.counters = {}    # (nome, labels) -> valor
+        self.histograms = {}  # (nome, labels) -> [contagens por bucket..., soma, total]
+
+
+_shards = {}  # id nativo da thread -> _Shard; a chave None guarda o que veio de threads mortas
+_prune_lock = threading.Lock()
+_gauge_callbacks = []
+_flush_state = {'last': 0.0, 'pid': None}
+_flush_lock = threading.Lock()
+
+
+def _shard():
+    shard = _shards.get(threading.get_native_id())
+    if shard is None:
+        shard = _shards.setdefault(threading.get_native_id(), _Shard())
+    return shard
+
+
+def _live_thread_ids():
+    """IDs nativos das threads vivas deste processo, ou None se não dá para saber."""
+    try:
+        # Linux: inclui as threads nativas do pool do gevent, que o threading não lista.
+        return {int(tid) for tid in os.listdir('/proc/self/task')}
+    except (OSError, ValueError):
+        pass
+    from src.async_mode import is_async
+    if is_async():
+        return None
+    return {thread.native_id for thread in threading.enumerate()}
+
+
+def _prune_shards():
+    """
+    Soma os shards de threads que já morreram (pools sobem e descem threads) no
+    shard base e os descarta, para _shards não crescer durante a vida do worker.
+    """
+    live = _live_thread_ids()
+    if live is None:
+        return
+    with _prune_lock:
+        dead = [tid for tid in list(_shards) if tid is not None and tid not in live]
+        if not dead:
+            return
+        base = _shards.get(None)
+        if base is None:
+            base = _shards[None] = _Shard()
+        for tid in dead:
+            shard = _shards.pop(tid, None)
+            if shard is None:
+                continue
+            for key, value in shard.counters.items():
+                base.counters[key] = base.counters.get(key, 0) + value
+            for key, data in shard.histograms.items():
+                total = base.histograms.get(key)
+                base.histograms[key] = list(data) if total is None else [a + b for a, b in zip(total, data)]
+
+
+def reset():
+    """Zera as métricas deste processo (chamado após o fork do gunicorn)."""
+    _shards.clear()
+    _flush_state['last'] = 0.0
+
+
+def inc(name, labels=(), value=1):
+    counters = _shard().counters
+    key = (name, labels)
+    counters[key] = counters.get(key, 0) + value
+
+
+def observe(name, labels, value, buckets=LATENCY_BUCKETS):
+    histograms = _shard().histograms
+    key = (name, labels)
+    data = histograms.get(key)
+    if data is None:
+        data = histograms[key] = [0] * (len(buckets) + 2)
+    for index, bound in enumerate(buckets):
+        if value <= bound:
+            data[index] += 1
+            break
+    data[-2] += value
+    data[-1] += 1
+
+
+def register_gauge(callback):
+    """callback() -> [(nome, labels, valor), ...], lido a cada snapshot."""
+    _gauge_callbacks.append(callback)
+
+
+# --- Serviços externos ---
+
+def observe_upstream(upstream, action, seconds, error=None):
+    """Registra uma chamada externa; `error` é o tipo da falha (connection, http, invalid, api) ou None."""
+    labels = (('upstream', upstream), ('action', action))
+    observe('upstream_request_duration_seconds', labels, seconds)
+    if error:
+        inc('upstream_errors_total', labels + (('kind', error),))
+
+
+# --- Snapshot e agregação entre workers ---
+
+def _snapshot():
+    _prune_shards()
+    counters, histograms = {}, {}
+    for shard in list(_shards.values()):
+        for key, value in list(shard.counters.items()):
+            counters[key] = counters.get(key, 0) + value
+        for key, data in list(shard.histograms.items()):
+            total = histograms.get(key)
+            histograms[key] = list(data) if total is None else [a + b for a, b in zip(total, data)]
+    gauges = {key: counters.pop(key) for key in [key for key in counters if key[0] in GAUGES]}
+    for callback in _gauge_callbacks:
+        try:
+            for name, labels, value in callback():
+                gauges[(name, labels)] = gauges.get((name, labels), 0) + value
+        except Exception as e:
+            print(f"Erro ao ler gauge de métricas: {e}")
+    return {'counters': counters, 'histograms': histograms, 'gauges': gauges}
+
+
+def _encode(snapshot):
+    return {kind: [[name, [list(pair) for pair in labels], value] for (name, labels), value in values.items()]
+            for kind, values in snapshot.items()}
+
+
+def _decode(data):
+    return {kind: {(name, tuple(tuple(pair) for pair in labels)): value for name, labels, value in values}
+            for kind, values in data.items()}
+
+
+def _merge(into, snapshot):
+    for kind in ('counters', 'gauges'):
+        for key, value in snapshot.get(kind, {}).items():
+            into[kind][key] = into[kind].get(key, 0) + value
+    for key, data in snapshot.get('histograms', {}).items():
+        total = into['histograms'].get(key)
+        into['histograms'][key] = list(data) if total is None else [a + b for a, b in zip(total, data)]
+
+
+def _write(path, snapshot):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(_encode(snapshot), f)
+    os.replace(tmp_path, path)
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return _decode(json.load(f))
+    except (OSError, ValueError):
+        return {}
+
+
+def flush(force=False):
+    """Grava o snapshot deste worker em METRICS_DIR (no máximo uma vez por intervalo, salvo `force`)."""
+    if not METRICS_DIR:
+        return
+    now = time.monotonic()
+    if not force and now - _flush_state['last'] < METRICS_FLUSH_INTERVAL:
+        return
+    if not _flush_lock.acquire(blocking=False):
+        return
+    try:
+        _flush_state['last'] = now
+        _write(os.path.join(METRICS_DIR, f'worker-{os.getpid()}.json'), _snapshot())
+    finally:
+        _flush_lock.release()
+
+
+def _flush_loop():
+    while True:
+        time.sleep(METRICS_FLUSH_INTERVAL)
+        try:
+            flush(force=True)
+        except OSError as e:
+            print(f"Erro ao gravar métricas em {METRICS_DIR}: {e}")
+
+
+def _ensure_flusher():
+    """Inicia (uma vez por worker) a thread que grava o snapshot periodicamente."""
+    pid = os.getpid()
+    if _flush_state['pid'] == pid:
+        return
+    with _flush_lock:
+        if _flush_state['pid'] != pid:
+            _flush_state['pid'] = pid
+            threading.Thread(target=_flush_loop, name='metrics-flush', daemon=True).start()
+
+
+def collect():
+    """Soma as métricas de todos os workers (ou só deste processo, sem METRICS_DIR)."""
+    if not METRICS_DIR:
+        return _snapshot()
+    flush(force=True)
+    total = {'counters': {}, 'histograms': {}, 'gauges': {}}
+    for filename in os.listdir(METRICS_DIR):
+        if filename.endswith('.json'):
+            _merge(total, _read(os.path.join(METRICS_DIR, filename)))
+    return total
+
+
+def mark_process_dead(pid, directory=None):
+    """
+    Chamado pelo processo mestre do gunicorn quando um worker termina: os
+    contadores dele vão para archived.json (para não "voltarem" a zero) e os
+    gauges são descartados.
+    """
+    directory = directory or METRICS_DIR
+    path = os.path.join(directory, f'worker-{pid}.json')
+    if not os.path.exists(path):
+        return
+    archived_path = os.path.join(directory, 'archived.json')
+    archived = {'counters': {}, 'histograms': {}, 'gauges': {}}
+    _merge(archived, _read(archived_path))
+    dead = _read(path)
+    dead.pop('gauges', None)
+    _merge(archived, dead)
+    _write(archived_path, archived)
+    os.remove(path)
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(snapshot):
+    """Formato de exposição de texto do Prometheus (versão 0.0.4)."""
+    by_name = {}
+    for kind in ('counters', 'gauges', 'histograms'):
+        for (name, labels), value in snapshot[kind].items():
+            by_name.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for name in sorted(by_name):
+        metric_type, help_text = HELP.get(name, ('untyped', name))
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        buckets = QUERY_COUNT_BUCKETS if name == 'http_request_db_queries' else LATENCY_BUCKETS
+        for labels, value in sorted(by_name[name]):
+            if metric_type != 'histogram':
+                lines.append(f'{name}{_format_labels(labels)} {_format_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets, value):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_bucket{_format_labels(labels, [("le", "+Inf")])} {value[-1]}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_number(value[-2])}')
+            lines.append(f'{name}_count{_format_labels(labels)} {value[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+# --- Integração com Flask e SQLAlchemy ---
+
+def _endpoint_label():
+    return request.endpoint or 'unmatched'
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('metrics_started')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    if has_request_context():
+        g.metrics_db_queries = g.get('metrics_db_queries', 0) + 1
+        g.metrics_db_seconds = g.get('metrics_db_seconds', 0.0) + elapsed
+        labels = (('endpoint', _endpoint_label()),)
+    else:
+        labels = (('endpoint', 'background'),)
+    inc('db_queries_total', labels)
+    inc('db_query_seconds_total', labels, elapsed)
+
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(context):
+    started = context.connection.info.get('metrics_started') if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def _pool_gauges(app):
+    def callback():
+        from src.models.user import db
+        from src.services import http_client
+        values = []
+        with app.app_context():
+            pool = db.engine.pool
+        if hasattr(pool, 'checkedout'):
+            values.append(('db_pool_checked_out', (), pool.checkedout()))
+        if hasattr(pool, 'size'):
+            values.append(('db_pool_size', (), pool.size()))
+        for name in http_client.session_names():
+            stats = http_client.pool_stats(name)
+            values.append(('http_client_pool_requests', (('client', name),), stats['requests']))
+            values.append(('http_client_pool_new_connections', (('client', name),), stats['misses']))
+        return values
+    return callback
+
+
+def init_app(app):
+    register_gauge(_pool_gauges(app))
+
+    @app.before_request
+    def _metrics_start():
+        g.metrics_started = time.perf_counter()
+        inc('http_requests_in_flight')
+
+    @app.after_request
+    def _metrics_record(response):
+        started = g.get('metrics_started')
+        if started is not None and request.endpoint != 'metrics':
+            endpoint = (('endpoint', _endpoint_label()),)
+            labels = endpoint + (('method', request.method), ('status', str(response.status_code)))
+            inc('http_requests_total', labels)
+            observe('http_request_duration_seconds', labels, time.perf_counter() - started)
+            observe('http_request_db_queries', endpoint, g.get('metrics_db_queries', 0), QUERY_COUNT_BUCKETS)
+            observe('http_request_db_seconds', endpoint, g.get('metrics_db_seconds', 0.0))
+        return response
+
+    @app.teardown_request
+    def _metrics_finish(exc):
+        if g.pop('metrics_started', None) is not None:
+            inc('http_requests_in_flight', value=-1)
+        if METRICS_DIR:
+            _ensure_flusher()
+
+    @app.route('/metrics')
+    def metrics():
+        if not (METRICS_PUBLIC or _authorized()):
+            return {'error': 'Não autorizado'}, 401
+        return Response(render(collect()), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+def _authorized():
+    """Token do Prometheus (METRICS_TOKEN) ou sessão de admin."""
+    if METRICS_TOKEN and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {METRICS_TOKEN}'):
+        return True
+    if 'user_id' not in session:
+        return False
+    from src.routes.user import get_principal
+    exists, is_admin = get_principal(session['user_id'])
+    return exists and is_admin
+
+
+# Rótulo de ação para URLs do Mercado Pago: /v1/payments/123 -> /v1/payments/:id
+_ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+
+
+def path_action(method, path):
+    return f"{method.upper()} {_ID_SEGMENT.sub('/:id', path.split('?')[0])}"
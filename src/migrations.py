@@ -0,0 +1,299 @@
+# Arquivo: src/migrations.py
+# Migrações de schema versionadas, seguras para PostgreSQL (Render) e SQLite (local).
+# Cada migração roda uma única vez e fica registrada na tabela schema_migrations.
+# Uso: `flask db-upgrade` (ou `flask db-upgrade --status` para só listar).
+
+from datetime import datetime
+
+from sqlalchemy import (Boolean, Column, DateTime, Float, ForeignKey, Integer, MetaData, String, Table, Text, inspect,
+                        select, text)
+
+from src.models.user import (BalanceHold, DailyRollup, IdempotencyKey, LedgerEntry, PricingRule, RateLimitBucket,
+                             ServicePrice, db)
+
+_meta = MetaData()
+schema_migrations = Table(
+    'schema_migrations', _meta,
+    Column('version', Integer, primary_key=True),
+    Column('name', String(255), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+# Trava para impedir duas execuções simultâneas no PostgreSQL (ex.: vários deploys).
+_PG_LOCK_ID = 7310042
+
+
+def _is_postgres(engine):
+    return engine.dialect.name == 'postgresql'
+
+
+def create_index(engine, table, name, columns):
+    """
+    Cria um índice se ele ainda não existir.
+    No PostgreSQL usa CREATE INDEX CONCURRENTLY (fora de transação), que não
+    bloqueia escritas na tabela; um índice inválido de uma tentativa anterior
+    que falhou é removido e recriado.
+    """
+    quote = engine.dialect.identifier_preparer.quote
+    column_list = ', '.join(quote(column) for column in columns)
+
+    if not _is_postgres(engine):
+        with engine.begin() as conn:
+            conn.execute(text(f'CREATE INDEX IF NOT EXISTS {quote(name)} ON {quote(table)} ({column_list})'))
+        return
+
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        invalid = conn.execute(text(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND NOT i.indisvalid"
+        ), {'name': name}).first()
+        if invalid:
+            conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {quote(name)}'))
+        conn.execute(text(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {quote(name)} ON {quote(table)} ({column_list})'
+        ))
+
+
+# --- Migrações (nunca altere uma migração já publicada; crie uma nova) ---
+
+# Schema da migração 1, congelado como estava quando ela foi publicada. Não use
+# os models aqui: colunas e tabelas novas entram por migrações novas.
+_base_meta = MetaData()
+Table(
+    'user', _base_meta,
+    Column('id', Integer, primary_key=True),
+    Column('username', String(80), unique=True, nullable=False),
+    Column('email', String(120), unique=True, nullable=False),
+    Column('password_hash', String(255), nullable=False),
+    Column('balance', Float),
+    Column('is_admin', Boolean),
+    Column('created_at', DateTime),
+)
+Table(
+    'order', _base_meta,
+    Column('id', Integer, primary_key=True),
+    Column('user_id', Integer, ForeignKey('user.id'), nullable=False),
+    Column('service_id', Integer, nullable=False),
+    Column('service_name', String(255), nullable=False),
+    Column('link', String(500), nullable=False),
+    Column('quantity', Integer, nullable=False),
+    Column('charge', Float, nullable=False),
+    Column('start_count', Integer),
+    Column('status', String(50)),
+    Column('barato_order_id', Integer),
+    Column('created_at', DateTime),
+    Column('updated_at', DateTime),
+)
+Table(
+    'service', _base_meta,
+    Column('id', Integer, primary_key=True),
+    Column('service_id', Integer, unique=True, nullable=False),
+    Column('name', String(255), nullable=False),
+    Column('type', String(100), nullable=False),
+    Column('rate', Float, nullable=False),
+    Column('min', Integer, nullable=False),
+    Column('max', Integer, nullable=False),
+    Column('category', String(100)),
+    Column('description', Text),
+    Column('is_active', Boolean),
+    Column('updated_at', DateTime),
+)
+Table(
+    'admin_config', _base_meta,
+    Column('id', Integer, primary_key=True),
+    Column('key', String(100), unique=True, nullable=False),
+    Column('value', Text),
+    Column('updated_at', DateTime),
+)
+Table(
+    'payment', _base_meta,
+    Column('id', Integer, primary_key=True),
+    Column('user_id', Integer, ForeignKey('user.id'), nullable=False),
+    Column('amount', Float, nullable=False),
+    Column('payment_id', String(255)),
+    Column('status', String(50)),
+    Column('created_at', DateTime),
+    Column('updated_at', DateTime),
+)
+Table(
+    'payment_event', _base_meta,
+    Column('id', Integer, primary_key=True),
+    Column('mp_payment_id', String(255), nullable=False, index=True),
+    Column('topic', String(100)),
+    Column('payload', Text),
+    Column('status', String(50), index=True),
+    Column('created_at', DateTime),
+    Column('processed_at', DateTime),
+)
+Table(
+    'order_outbox', _base_meta,
+    Column('id', Integer, primary_key=True),
+    Column('order_id', Integer, ForeignKey('order.id'), unique=True, nullable=False),
+    Column('comments', Text),
+    Column('attempts', Integer),
+    Column('locked_until', DateTime, index=True),
+    Column('created_at', DateTime),
+)
+
+
+def _0001_base_schema(engine):
+    """Cria as tabelas que ainda não existem (bancos criados antes das migrações)."""
+    _base_meta.create_all(bind=engine)
+
+
+HOT_PATH_INDEXES = [
+    ('order', 'ix_order_user_created', ['user_id', 'created_at', 'id']),
+    ('order', 'ix_order_user_updated', ['user_id', 'updated_at', 'id']),
+    ('order', 'ix_order_status_id', ['status', 'id']),
+    ('payment', 'ix_payment_user_created', ['user_id', 'created_at']),
+    ('payment', 'ix_payment_status_created', ['status', 'created_at']),
+    ('payment', 'ix_payment_payment_id', ['payment_id']),
+    ('service', 'ix_service_active_category', ['is_active', 'category']),
+]
+
+
+def _0002_hot_path_indexes(engine):
+    """Índices das listagens, do dashboard e dos jobs de status/pagamento."""
+    for table, name, columns in HOT_PATH_INDEXES:
+        create_index(engine, table, name, columns)
+
+
+def _0003_daily_rollups(engine):
+    """Tabela de totais diários do dashboard (preencha com `flask rebuild-rollups`)."""
+    DailyRollup.__table__.create(bind=engine, checkfirst=True)
+
+
+def _0004_balance_ledger(engine):
+    """
+    Saldo em centavos (user.balance_cents) + razão e reservas.
+    Cada usuário recebe um lançamento 'opening' com o saldo atual, para que a
+    soma do razão bata com balance_cents desde o início. A versão é registrada
+    na mesma transação: uma nova execução nunca recalcula os saldos nem duplica
+    os lançamentos.
+    """
+    quote = engine.dialect.identifier_preparer.quote
+    user_table = quote('user')
+    columns = {column['name'] for column in inspect(engine).get_columns('user')}
+    LedgerEntry.__table__.create(bind=engine, checkfirst=True)
+    BalanceHold.__table__.create(bind=engine, checkfirst=True)
+    with engine.begin() as conn:
+        if 'balance_cents' not in columns:
+            conn.execute(text(f'ALTER TABLE {user_table} ADD COLUMN balance_cents BIGINT NOT NULL DEFAULT 0'))
+        conn.execute(text(
+            f'UPDATE {user_table} SET balance_cents = CAST(ROUND(COALESCE(balance, 0) * 100) AS BIGINT)'
+        ))
+        conn.execute(text(
+            f"INSERT INTO ledger_entry (user_id, amount_cents, kind, reference, created_at) "
+            f"SELECT id, balance_cents, 'opening', 'migration:0004', CURRENT_TIMESTAMP FROM {user_table}"
+        ))
+        _record(conn, 4, 'balance_ledger')
+
+
+def _0005_rate_limit_buckets(engine):
+    """Baldes de tokens do limitador de requisições compartilhado entre workers."""
+    RateLimitBucket.__table__.create(bind=engine, checkfirst=True)
+
+
+def _0006_pricing(engine):
+    """
+    Regras de preço e tabela de preços pré-calculada. Até o primeiro
+    `flask reprice` (ou sincronização), o catálogo calcula em memória os
+    preços que faltam na tabela, com as mesmas regras.
+    """
+    PricingRule.__table__.create(bind=engine, checkfirst=True)
+    ServicePrice.__table__.create(bind=engine, checkfirst=True)
+
+
+def _0007_idempotency_keys(engine):
+    """Chaves Idempotency-Key e respostas guardadas, compartilhadas entre workers."""
+    IdempotencyKey.__table__.create(bind=engine, checkfirst=True)
+
+
+def _0008_payment_event_retries(engine):
+    """Tentativas e próxima tentativa dos eventos de pagamento (falhas do gateway são repetidas)."""
+    quote = engine.dialect.identifier_preparer.quote
+    columns = {column['name'] for column in inspect(engine).get_columns('payment_event')}
+    with engine.begin() as conn:
+        if 'attempts' not in columns:
+            conn.execute(text(f'ALTER TABLE {quote("payment_event")} ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0'))
+        if 'next_attempt_at' not in columns:
+            conn.execute(text(f'ALTER TABLE {quote("payment_event")} ADD COLUMN next_attempt_at TIMESTAMP'))
+
+
+def _0009_service_deactivated_by_sync(engine):
+    """Marca dos serviços desativados pela sincronização, que ela pode reativar."""
+    quote = engine.dialect.identifier_preparer.quote
+    columns = {column['name'] for column in inspect(engine).get_columns('service')}
+    with engine.begin() as conn:
+        if 'deactivated_by_sync' not in columns:
+            conn.execute(text(
+                f'ALTER TABLE {quote("service")} ADD COLUMN deactivated_by_sync BOOLEAN NOT NULL DEFAULT FALSE'
+            ))
+
+
+MIGRATIONS = [
+    (1, 'base_schema', _0001_base_schema),
+    (2, 'hot_path_indexes', _0002_hot_path_indexes),
+    (3, 'daily_rollups', _0003_daily_rollups),
+    (4, 'balance_ledger', _0004_balance_ledger),
+    (5, 'rate_limit_buckets', _0005_rate_limit_buckets),
+    (6, 'pricing', _0006_pricing),
+    (7, 'idempotency_keys', _0007_idempotency_keys),
+    (8, 'payment_event_retries', _0008_payment_event_retries),
+    (9, 'service_deactivated_by_sync', _0009_service_deactivated_by_sync),
+]
+
+
+def _record(conn, version, name):
+    """Registra a migração como aplicada; migrações com dados chamam dentro da própria transação."""
+    conn.execute(schema_migrations.insert().values(version=version, name=name, applied_at=datetime.utcnow()))
+
+
+def applied_versions(engine=None):
+    engine = engine or db.engine
+    if not inspect(engine).has_table('schema_migrations'):
+        return set()
+    with engine.connect() as conn:
+        return {row.version for row in conn.execute(select(schema_migrations.c.version))}
+
+
+def upgrade(engine=None, echo=print):
+    """Aplica, em ordem, as migrações pendentes. Retorna as versões aplicadas."""
+    engine = engine or db.engine
+    _meta.create_all(bind=engine)
+
+    lock_conn = None
+    if _is_postgres(engine):
+        lock_conn = engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+        lock_conn.execute(text('SELECT pg_advisory_lock(:id)'), {'id': _PG_LOCK_ID})
+
+    try:
+        done = applied_versions(engine)
+        applied = []
+        for version, name, migrate in MIGRATIONS:
+            if version in done:
+                continue
+            echo(f"Aplicando migração {version:04d}_{name}...")
+            migrate(engine)
+            if version not in applied_versions(engine):
+                with engine.begin() as conn:
+                    _record(conn, version, name)
+            applied.append(version)
+        return applied
+    finally:
+        if lock_conn is not None:
+            lock_conn.execute(text('SELECT pg_advisory_unlock(:id)'), {'id': _PG_LOCK_ID})
+            lock_conn.close()
+
+
+def reset(engine=None):
+    """Apaga todas as tabelas, inclusive o registro de migrações (o próximo upgrade() recria tudo)."""
+    engine = engine or db.engine
+    db.metadata.drop_all(bind=engine)
+    _meta.drop_all(bind=engine)
+
+
+def status(engine=None):
+    """Lista (versão, nome, aplicada?) de todas as migrações conhecidas."""
+    done = applied_versions(engine)
+    return [(version, name, version in done) for version, name, _ in MIGRATIONS]
@@ -1,5 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from src.services.passwords import hash_password, needs_rehash, verify_password
 from datetime import datetime
 
 db = SQLAlchemy()
@@ -9,7 +9,8 @@ class User(db.Model):
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
-    balance = db.Column(db.Float, default=0.0)
+    balance = db.Column(db.Float, default=0.0)  # espelho de balance_cents / 100, só para exibição
+    balance_cents = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
     is_admin = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -17,10 +18,14 @@ class User(db.Model):
     orders = db.relationship('Order', backref='user', lazy=True)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        """True se o hash atual foi gerado com um custo diferente da política configurada."""
+        return needs_rehash(self.password_hash)
 
     def __repr__(self):
         return f'<User {self.username}>'
@@ -36,6 +41,13 @@ class User(db.Model):
         }
 
 class Order(db.Model):
+    # Índices também criados em bancos existentes pela migração 2 (src/migrations.py)
+    __table_args__ = (
+        db.Index('ix_order_user_created', 'user_id', 'created_at', 'id'),
+        db.Index('ix_order_user_updated', 'user_id', 'updated_at', 'id'),
+        db.Index('ix_order_status_id', 'status', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     service_id = db.Column(db.Integer, nullable=False)
@@ -65,6 +77,10 @@ class Order(db.Model):
         }
 
 class Service(db.Model):
+    __table_args__ = (
+        db.Index('ix_service_active_category', 'is_active', 'category'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     service_id = db.Column(db.Integer, unique=True, nullable=False)  # ID do BaratoSocial
     name = db.Column(db.String(255), nullable=False)
@@ -75,6 +91,9 @@ class Service(db.Model):
     category = db.Column(db.String(100), nullable=True)
     description = db.Column(db.Text, nullable=True)
     is_active = db.Column(db.Boolean, default=True)
+    # Desativado pela sincronização (sumiu do fornecedor), não por um admin: volta a
+    # ser ativado quando o fornecedor o listar de novo (migração 9)
+    deactivated_by_sync = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def get_final_price(self, profit_margin):
@@ -110,6 +129,12 @@ class AdminConfig(db.Model):
         }
 
 class Payment(db.Model):
+    __table_args__ = (
+        db.Index('ix_payment_user_created', 'user_id', 'created_at'),
+        db.Index('ix_payment_status_created', 'status', 'created_at'),
+        db.Index('ix_payment_payment_id', 'payment_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     amount = db.Column(db.Float, nullable=False)
@@ -128,3 +153,184 @@ class Payment(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
+
+class PaymentEvent(db.Model):
+    """Notificação (webhook) recebida do Mercado Pago, processada em segundo plano."""
+    id = db.Column(db.Integer, primary_key=True)
+    mp_payment_id = db.Column(db.String(255), nullable=False, index=True)  # ID do Mercado Pago
+    topic = db.Column(db.String(100), nullable=True)
+    payload = db.Column(db.Text, nullable=True)
+    status = db.Column(db.String(50), default='received', index=True)  # received, processed, failed
+    # Falhas ao consultar o Mercado Pago: o evento continua 'received' e volta
+    # a ser tentado a partir de next_attempt_at (migração 8).
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'mp_payment_id': self.mp_payment_id,
+            'topic': self.topic,
+            'status': self.status,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'processed_at': self.processed_at.isoformat() if self.processed_at else None
+        }
+
+class OrderOutbox(db.Model):
+    """Fila de pedidos aguardando envio ao BaratoSocial (processada pelo `flask order-worker`)."""
+    __tablename__ = 'order_outbox'
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), unique=True, nullable=False)
+    comments = db.Column(db.Text, nullable=True)
+    attempts = db.Column(db.Integer, default=0)
+    locked_until = db.Column(db.DateTime, nullable=True, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    order = db.relationship('Order', lazy='joined')
+
+class DailyRollup(db.Model):
+    """
+    Totais diários mantidos incrementalmente para o dashboard.
+    dimension: 'global' (chave ''), 'user' (user_id), 'service' (service_id) ou
+    'category' (nome da categoria). Cada total é dividido em fatias: key =
+    '<chave>#<fatia>', somadas na leitura.
+    """
+    __tablename__ = 'daily_rollup'
+    __table_args__ = (
+        db.UniqueConstraint('day', 'dimension', 'key', name='uq_daily_rollup_day_dimension_key'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    dimension = db.Column(db.String(20), nullable=False)
+    key = db.Column(db.String(255), nullable=False, default='')
+    orders_count = db.Column(db.Integer, nullable=False, default=0)
+    orders_amount = db.Column(db.Float, nullable=False, default=0.0)
+    payments_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    new_users = db.Column(db.Integer, nullable=False, default=0)
+
+    def to_dict(self):
+        return {
+            'day': self.day.isoformat(),
+            'dimension': self.dimension,
+            'key': self.key,
+            'orders_count': self.orders_count,
+            'orders_amount': self.orders_amount,
+            'payments_count': self.payments_count,
+            'revenue': self.revenue,
+            'new_users': self.new_users
+        }
+
+class LedgerEntry(db.Model):
+    """
+    Razão de saldo, somente inserção: toda alteração de User.balance_cents gera uma linha.
+    A soma de amount_cents de um usuário deve ser igual ao seu balance_cents.
+    user_id não é chave estrangeira de propósito: o histórico sobrevive à exclusão do usuário.
+    """
+    __tablename__ = 'ledger_entry'
+    __table_args__ = (
+        db.Index('ix_ledger_entry_user_id_id', 'user_id', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    amount_cents = db.Column(db.BigInteger, nullable=False)  # positivo = crédito, negativo = débito
+    kind = db.Column(db.String(20), nullable=False)  # opening, credit, hold, release, adjustment
+    reference = db.Column(db.String(100), nullable=True, index=True)  # ex.: 'payment:12', 'order:34'
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'amount_cents': self.amount_cents,
+            'kind': self.kind,
+            'reference': self.reference,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class BalanceHold(db.Model):
+    """Valor reservado do saldo enquanto o pedido está no fornecedor (held -> captured | released)."""
+    __tablename__ = 'balance_hold'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    amount_cents = db.Column(db.BigInteger, nullable=False)
+    reference = db.Column(db.String(100), unique=True, nullable=False)  # ex.: 'order:34'
+    status = db.Column(db.String(20), nullable=False, default='held', index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    settled_at = db.Column(db.DateTime, nullable=True)
+
+class RateLimitBucket(db.Model):
+    """
+    Balde de tokens compartilhado entre workers (RATE_LIMIT_BACKEND=database).
+    key = regra:escopo:identidade; updated_at em segundos desde a época (time.time()).
+    """
+    __tablename__ = 'rate_limit_bucket'
+
+    key = db.Column(db.String(200), primary_key=True)
+    tokens = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False, index=True)
+
+class PricingRule(db.Model):
+    """
+    Regra de margem de lucro (ver src/services/pricing.py).
+    scope: 'global' (key ''), 'category' (key = nome da categoria) ou
+    'service' (key = service_id do fornecedor). A regra vale a partir de
+    min_quantity unidades (faixas de quantidade); a mais específica vence.
+    """
+    __tablename__ = 'pricing_rule'
+    __table_args__ = (
+        db.UniqueConstraint('scope', 'key', 'min_quantity', name='uq_pricing_rule_scope_key_min_quantity'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(20), nullable=False)
+    key = db.Column(db.String(255), nullable=False, default='')
+    min_quantity = db.Column(db.Integer, nullable=False, default=0)
+    margin = db.Column(db.Float, nullable=False)  # em %, como profit_margin
+    is_active = db.Column(db.Boolean, nullable=False, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'scope': self.scope,
+            'key': self.key,
+            'min_quantity': self.min_quantity,
+            'margin': self.margin,
+            'is_active': self.is_active,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class ServicePrice(db.Model):
+    """
+    Tabela de preços pré-calculada: uma linha por serviço e faixa de quantidade,
+    gerada por reprice_all() a partir das regras e do preço do fornecedor.
+    """
+    __tablename__ = 'service_price'
+
+    service_id = db.Column(db.Integer, primary_key=True)  # ID do BaratoSocial
+    min_quantity = db.Column(db.Integer, primary_key=True, default=0)
+    margin = db.Column(db.Float, nullable=False)
+    final_rate = db.Column(db.Float, nullable=False)  # preço final por 1000
+    priced_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class IdempotencyKey(db.Model):
+    """
+    Chave Idempotency-Key de uma requisição (IDEMPOTENCY_BACKEND=database) e a
+    resposta guardada para repetições. status_code nulo = requisição em andamento.
+    key = rota:usuário:chave; expires_at em segundos desde a época (time.time()).
+    """
+    __tablename__ = 'idempotency_key'
+
+    key = db.Column(db.String(400), primary_key=True)
+    fingerprint = db.Column(db.String(64), nullable=False)  # sha256 do método, caminho e corpo
+    status_code = db.Column(db.Integer, nullable=True)
+    content_type = db.Column(db.String(100), nullable=True)
+    body = db.Column(db.LargeBinary, nullable=True)
+    expires_at = db.Column(db.Float, nullable=False, index=True)
@@ -0,0 +1,197 @@
+# Arquivo: src/profiler.py
+# Perfil das consultas SQL, a partir dos eventos do engine do SQLAlchemy.
+# Ferramenta de diagnóstico, desligada por padrão: ligue com QUERY_PROFILER=1
+# enquanto investiga (cada comando passa por um lock do worker). Contagem e tempo
+# de banco por rota ficam sempre disponíveis no /metrics (src/metrics.py).
+#
+# - Por requisição: conta e cronometra os comandos agrupando pelo "formato"
+#   (o SQL com os parâmetros; listas de IN colapsadas). Um mesmo formato
+#   repetido N_PLUS_ONE_THRESHOLD vezes ou mais em uma requisição é um
+#   provável N+1 (consulta dentro de loop) e vai para o log.
+# - Log de consultas lentas: comandos acima de SLOW_QUERY_MS viram uma linha
+#   JSON (event=slow_query) com o endpoint de origem. Os valores dos
+#   parâmetros nunca são registrados.
+# - Resumo por worker (formatos mais caros, lentas recentes, N+1 vistos) em
+#   GET /api/admin/query-profile.
+# - Com QUERY_PROFILE_HEADER=1, requisições com o cabeçalho `X-Query-Profile: 1`
+#   recebem o resumo da própria requisição no cabeçalho de resposta de mesmo nome
+#   (útil em desenvolvimento; contém SQL, por isso fica desligado por padrão).
+
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from functools import lru_cache
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+QUERY_PROFILER = os.environ.get('QUERY_PROFILER', '0') == '1'
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '200'))
+N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', '5'))
+QUERY_PROFILE_HEADER = os.environ.get('QUERY_PROFILE_HEADER', '0') == '1'
+
+# Limites do resumo em memória de cada worker.
+MAX_SHAPES = 500
+RECENT_SLOW = 50
+STATEMENT_PREVIEW = 300
+
+_lock = threading.Lock()
+_started_at = datetime.utcnow()
+_shapes = {}                      # formato -> {'count', 'total', 'max', 'endpoints'}
+_slow = deque(maxlen=RECENT_SLOW)
+_n_plus_one = {}                  # (endpoint, formato) -> {'hits', 'max_repeats', 'last_seen'}
+
+# "(?, ?, ?)" / "(%(id_1_1)s, %(id_1_2)s)" -> "(...)": IN com tamanhos diferentes têm o mesmo formato.
+_PARAM_LIST = re.compile(r'\((?:\s*(?:\?|%\([^)]+\)s|:\w+|\$\d+)\s*,)+\s*(?:\?|%\([^)]+\)s|:\w+|\$\d+)\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=2048)
+def statement_shape(statement):
+    return _PARAM_LIST.sub('(...)', _WHITESPACE.sub(' ', statement).strip())
+
+
+def _endpoint():
+    return (request.endpoint or 'unmatched') if has_request_context() else 'background'
+
+
+def _log(event_name, **fields):
+    print(json.dumps({'event': event_name, 'at': datetime.utcnow().isoformat(timespec='seconds'), **fields},
+                     ensure_ascii=False))
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if QUERY_PROFILER:
+        conn.info.setdefault('profiler_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('profiler_started')
+    if not started:
+        return
+    record(statement, time.perf_counter() - started.pop())
+
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(context):
+    started = context.connection.info.get('profiler_started') if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def record(statement, elapsed):
+    shape = statement_shape(statement)
+    endpoint = _endpoint()
+
+    if has_request_context():
+        per_request = g.get('query_profile')
+        if per_request is None:
+            per_request = g.query_profile = {}
+        entry = per_request.get(shape)
+        if entry is None:
+            per_request[shape] = [1, elapsed]
+        else:
+            entry[0] += 1
+            entry[1] += elapsed
+
+    with _lock:
+        stats = _shapes.get(shape)
+        if stats is None and len(_shapes) < MAX_SHAPES:
+            stats = _shapes[shape] = {'count': 0, 'total': 0.0, 'max': 0.0, 'endpoints': set()}
+        if stats is not None:
+            stats['count'] += 1
+            stats['total'] += elapsed
+            stats['max'] = max(stats['max'], elapsed)
+            if len(stats['endpoints']) < 20:
+                stats['endpoints'].add(endpoint)
+
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        slow = {'endpoint': endpoint, 'duration_ms': round(elapsed * 1000, 1),
+                'statement': shape[:STATEMENT_PREVIEW]}
+        _log('slow_query', **slow)
+        with _lock:
+            _slow.append({**slow, 'at': datetime.utcnow().isoformat(timespec='seconds')})
+
+
+def request_summary():
+    """(consultas, segundos, [(formato, repetições, segundos)]) da requisição atual."""
+    per_request = g.get('query_profile') or {}
+    total_queries = sum(count for count, _ in per_request.values())
+    total_time = sum(elapsed for _, elapsed in per_request.values())
+    repeated = sorted(
+        ((shape, count, elapsed) for shape, (count, elapsed) in per_request.items() if count >= N_PLUS_ONE_THRESHOLD),
+        key=lambda item: -item[1]
+    )
+    return total_queries, total_time, repeated
+
+
+def init_app(app):
+    if not QUERY_PROFILER:
+        return
+
+    @app.after_request
+    def _profile_request(response):
+        if 'query_profile' not in g:
+            return response
+        total_queries, total_time, repeated = request_summary()
+        endpoint = _endpoint()
+        for shape, count, elapsed in repeated:
+            _log('n_plus_one', endpoint=endpoint, repeats=count, duration_ms=round(elapsed * 1000, 1),
+                 statement=shape[:STATEMENT_PREVIEW])
+            with _lock:
+                key = (endpoint, shape)
+                seen = _n_plus_one.get(key)
+                if seen is None and len(_n_plus_one) < MAX_SHAPES:
+                    seen = _n_plus_one[key] = {'hits': 0, 'max_repeats': 0, 'last_seen': None}
+                if seen is not None:
+                    seen['hits'] += 1
+                    seen['max_repeats'] = max(seen['max_repeats'], count)
+                    seen['last_seen'] = datetime.utcnow().isoformat(timespec='seconds')
+
+        if QUERY_PROFILE_HEADER and request.headers.get('X-Query-Profile') == '1':
+            summary = f'queries={total_queries}; db_ms={total_time * 1000:.1f}; repeated={len(repeated)}'
+            if repeated:
+                shape, count, _ = repeated[0]
+                summary += f'; top="{count}x {shape[:120]}"'
+            response.headers['X-Query-Profile'] = summary
+        return response
+
+
+def report(limit=20):
+    """Resumo deste worker para o endpoint de admin."""
+    with _lock:
+        shapes = sorted(_shapes.items(), key=lambda item: -item[1]['total'])[:limit]
+        return {
+            'enabled': QUERY_PROFILER,
+            'pid': os.getpid(),
+            'since': _started_at.isoformat(timespec='seconds'),
+            'slow_query_ms': SLOW_QUERY_MS,
+            'n_plus_one_threshold': N_PLUS_ONE_THRESHOLD,
+            'top_statements': [
+                {'statement': shape[:STATEMENT_PREVIEW], 'count': stats['count'],
+                 'total_ms': round(stats['total'] * 1000, 1), 'avg_ms': round(stats['total'] / stats['count'] * 1000, 2),
+                 'max_ms': round(stats['max'] * 1000, 1), 'endpoints': sorted(stats['endpoints'])}
+                for shape, stats in shapes
+            ],
+            'n_plus_one': [
+                {'endpoint': endpoint, 'statement': shape[:STATEMENT_PREVIEW], **seen}
+                for (endpoint, shape), seen in sorted(_n_plus_one.items(), key=lambda item: -item[1]['hits'])[:limit]
+            ],
+            'recent_slow': list(_slow)[::-1],
+        }
+
+
+def reset():
+    global _started_at
+    with _lock:
+        _shapes.clear()
+        _slow.clear()
+        _n_plus_one.clear()
+        _started_at = datetime.utcnow()
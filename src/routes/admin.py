@@ -1,17 +1,20 @@
 # Arquivo: src/routes/admin.py (Versão Final Corrigida)
 
 from flask import Blueprint, jsonify, request
-from src.models.user import AdminConfig, User, Payment, Service, db
+from src.models.user import AdminConfig, DailyRollup, PricingRule, db
 from src.routes.user import admin_required
 from datetime import datetime, timedelta
 from sqlalchemy import func
 
 # Importa nossa nova função de configuração
-from src.config import get_config
+from src.config import get_config, bump_config_version, invalidate_config_cache, is_internal_key
+from src import profiler
 
 # Importa as classes de serviço que se comunicam com as APIs externas
-from src.services.barato_social import BaratoSocialAPI
-from src.services.mercado_pago import MercadoPagoAPI
+from src.services.catalog import bump_catalog_version, invalidate_catalog
+from src.services.catalog_sync import sync_catalog
+from src.services.pricing import SCOPES, reprice_all
+from src.services.rollups import totals_by_day
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -20,21 +23,30 @@ admin_bp = Blueprint('admin', __name__)
 @admin_required
 def get_all_config():
     configs = AdminConfig.query.all()
-    config_dict = {config.key: config.value for config in configs}
+    config_dict = {config.key: config.value for config in configs if not is_internal_key(config.key)}
     return jsonify(config_dict)
 
 @admin_bp.route('/config', methods=['POST'])
 @admin_required
 def update_config():
-    data = request.json
+    data = {key: value for key, value in request.json.items() if not is_internal_key(key)}
+    existing = {config.key: config for config in AdminConfig.query.filter(AdminConfig.key.in_(data)).all()}
     for key, value in data.items():
-        config = AdminConfig.query.filter_by(key=key).first()
+        config = existing.get(key)
         if config:
             config.value = value
         else:
             config = AdminConfig(key=key, value=value)
             db.session.add(config)
+    # Avisa os outros workers; a escrita e o contador vão no mesmo commit.
+    bump_config_version()
     db.session.commit()
+    invalidate_config_cache()
+    if 'profit_margin' in data:
+        # A margem base entra em todos os preços pré-calculados.
+        reprice_all()
+        db.session.commit()
+        invalidate_catalog()
     return jsonify({'message': 'Configurações atualizadas com sucesso'})
 
 # --- ROTAS DE TESTE DE API ---
@@ -46,6 +58,7 @@ def test_barato_api():
     if not api_key:
         return jsonify({'success': False, 'message': 'Chave API BaratoSocial não configurada'}), 400
     
+    from src.services.barato_social import BaratoSocialAPI
     try:
         api = BaratoSocialAPI(api_key)
         balance_info = api.balance()
@@ -64,6 +77,7 @@ def test_mercado_pago():
     if not access_token:
         return jsonify({'success': False, 'message': 'Access Token do Mercado Pago não configurado'}), 400
     
+    from src.services.mercado_pago import MercadoPagoAPI
     try:
         mp_api = MercadoPagoAPI(access_token)
         payment_methods = mp_api.get_payment_methods()
@@ -80,49 +94,183 @@ def sync_services():
     if not api_key:
         return jsonify({'error': 'Chave API do BaratoSocial não configurada'}), 400
     
+    from src.services.barato_social import BaratoSocialAPI
     try:
         api = BaratoSocialAPI(api_key)
         services_data = api.services()
         if not services_data or isinstance(services_data, dict):
              return jsonify({'error': 'Erro ao obter serviços da API', 'response': services_data}), 500
         
-        updated_count, new_count = 0, 0
-        for service_data in services_data:
-            existing_service = Service.query.filter_by(service_id=service_data['service']).first()
-            if existing_service:
-                existing_service.name = service_data['name']
-                existing_service.type = service_data['type']
-                existing_service.rate = float(service_data['rate'])
-                existing_service.min = int(service_data['min'])
-                existing_service.max = int(service_data['max'])
-                existing_service.category = service_data.get('category', '')
-                updated_count += 1
-            else:
-                new_service = Service(service_id=service_data['service'], name=service_data['name'], type=service_data['type'], rate=float(service_data['rate']), min=int(service_data['min']), max=int(service_data['max']), category=service_data.get('category', ''))
-                db.session.add(new_service)
-                new_count += 1
-        
+        counts = sync_catalog(services_data)
+        if counts['added'] or counts['changed'] or counts['removed']:
+            bump_catalog_version()
         db.session.commit()
-        return jsonify({'message': 'Serviços sincronizados com sucesso', 'new_services': new_count, 'updated_services': updated_count})
+        invalidate_catalog()
+        return jsonify({
+            'message': 'Serviços sincronizados com sucesso',
+            'new_services': counts['added'],
+            'updated_services': counts['changed'],
+            **counts
+        })
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': f'Erro ao sincronizar serviços: {str(e)}'}), 500
 
 # --- ROTAS DE DASHBOARD E ESTATÍSTICAS ---
+def _sum_rollups(*filters):
+    """Soma as métricas da dimensão 'global' de daily_rollup, todas as fatias (nunca varre payment/order)."""
+    row = db.session.query(
+        func.coalesce(func.sum(DailyRollup.orders_count), 0),
+        func.coalesce(func.sum(DailyRollup.orders_amount), 0),
+        func.coalesce(func.sum(DailyRollup.payments_count), 0),
+        func.coalesce(func.sum(DailyRollup.revenue), 0),
+        func.coalesce(func.sum(DailyRollup.new_users), 0)
+    ).filter(DailyRollup.dimension == 'global', *filters).one()
+    return dict(zip(('orders_count', 'orders_amount', 'payments_count', 'revenue', 'new_users'), row))
+
 @admin_bp.route('/dashboard-stats', methods=['GET'])
 @admin_required
 def get_dashboard_stats():
-    total_users = User.query.count()
-    total_orders = db.session.query(func.count(Service.id)).scalar() or 0
-    total_revenue = db.session.query(func.sum(Payment.amount)).filter(Payment.status == 'approved').scalar() or 0
-    current_month = datetime.now().replace(day=1, hour=0, minute=0, second=0)
-    monthly_revenue = db.session.query(func.sum(Payment.amount)).filter(Payment.status == 'approved', Payment.created_at >= current_month).scalar() or 0
+    # Totais mantidos em daily_rollup (rode `flask rebuild-rollups` uma vez após o deploy)
+    totals = _sum_rollups()
+    current_month = datetime.utcnow().date().replace(day=1)
+    monthly = _sum_rollups(DailyRollup.day >= current_month)
     
     return jsonify({
-        'total_users': total_users,
-        'total_orders': total_orders, # Note: Isso conta serviços, não pedidos. Ajustar se tiver tabela Order.
-        'total_revenue': float(total_revenue),
-        'monthly_revenue': float(monthly_revenue),
+        'total_users': int(totals['new_users']),
+        'total_orders': int(totals['orders_count']),
+        'total_revenue': float(totals['revenue']),
+        'monthly_revenue': float(monthly['revenue']),
+        'monthly_orders': int(monthly['orders_count']),
     })
 
+@admin_bp.route('/stats/timeseries', methods=['GET'])
+@admin_required
+def get_stats_timeseries():
+    """
+    Faturamento e pedidos por dia, a partir de daily_rollup.
+    Parâmetros: days (padrão 30, máx. 366), dimension (global, user, service,
+    category) e key (id do usuário/serviço ou nome da categoria).
+    """
+    days = min(max(request.args.get('days', 30, type=int), 1), 366)
+    dimension = request.args.get('dimension', 'global')
+    if dimension not in ('global', 'user', 'service', 'category'):
+        return jsonify({'error': 'Dimensão inválida'}), 400
+    key = '' if dimension == 'global' else request.args.get('key', '')
+    
+    end = datetime.utcnow().date()
+    start = end - timedelta(days=days - 1)
+    # Os totais de cada dia são divididos em fatias (ver src/services/rollups.py)
+    rows = totals_by_day(dimension, key, start)
+    
+    series = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        row = rows.get(day) or {}
+        series.append({
+            'day': day.isoformat(),
+            'orders': int(row.get('orders_count') or 0),
+            'orders_amount': float(row.get('orders_amount') or 0.0),
+            'payments': int(row.get('payments_count') or 0),
+            'revenue': float(row.get('revenue') or 0.0),
+            'new_users': int(row.get('new_users') or 0),
+        })
+    return jsonify({'dimension': dimension, 'key': key, 'series': series})
+
 # Mantenha as outras rotas de admin que você precisa aqui...
 # (get_all_payments, approve_payment, etc.)
+
+# --- PERFIL DAS CONSULTAS SQL (por worker; ver src/profiler.py) ---
+@admin_bp.route('/query-profile', methods=['GET'])
+@admin_required
+def get_query_profile():
+    limit = min(request.args.get('limit', 20, type=int) or 20, 200)
+    return jsonify(profiler.report(limit))
+
+@admin_bp.route('/query-profile', methods=['DELETE'])
+@admin_required
+def reset_query_profile():
+    profiler.reset()
+    return jsonify({'message': 'Perfil de consultas zerado neste worker'})
+
+# --- REGRAS DE PREÇO (ver src/services/pricing.py) ---
+def _read_pricing_rule(rule, data):
+    """Valida e aplica os campos de `data` na regra; retorna uma mensagem de erro ou None."""
+    scope = data.get('scope', rule.scope)
+    if scope not in SCOPES:
+        return f'Escopo inválido. Use um de: {", ".join(SCOPES)}'
+    key = str(data.get('key', rule.key) or '').strip()
+    if scope == 'global':
+        key = ''
+    elif scope == 'service' and not key.isdigit():
+        return 'Para o escopo service, key deve ser o service_id do fornecedor'
+    elif not key:
+        return 'Informe a categoria em key'
+    try:
+        min_quantity = int(data.get('min_quantity', rule.min_quantity or 0))
+        margin = float(data.get('margin', rule.margin))
+    except (TypeError, ValueError):
+        return 'Campos margin e min_quantity devem ser numéricos'
+    if min_quantity < 0 or margin <= -100:
+        return 'min_quantity deve ser >= 0 e margin maior que -100'
+
+    with db.session.no_autoflush:
+        duplicate = PricingRule.query.filter(
+            PricingRule.scope == scope, PricingRule.key == key, PricingRule.min_quantity == min_quantity,
+            PricingRule.id != rule.id if rule.id is not None else True
+        ).first()
+    if duplicate:
+        return 'Já existe uma regra para este escopo, chave e quantidade mínima'
+
+    rule.scope, rule.key, rule.min_quantity, rule.margin = scope, key, min_quantity, margin
+    if 'is_active' in data:
+        rule.is_active = bool(data['is_active'])
+    return None
+
+def _commit_and_reprice():
+    """Grava a mudança de regras e a nova tabela de preços na mesma transação."""
+    stats = reprice_all()
+    db.session.commit()
+    invalidate_catalog()
+    return stats
+
+@admin_bp.route('/pricing-rules', methods=['GET'])
+@admin_required
+def list_pricing_rules():
+    rules = PricingRule.query.order_by(PricingRule.scope, PricingRule.key, PricingRule.min_quantity).all()
+    return jsonify({'base_margin': float(get_config('profit_margin') or 0),
+                    'rules': [rule.to_dict() for rule in rules]})
+
+@admin_bp.route('/pricing-rules', methods=['POST'])
+@admin_required
+def create_pricing_rule():
+    rule = PricingRule()
+    error = _read_pricing_rule(rule, request.json or {})
+    if error:
+        return jsonify({'error': error}), 400
+    db.session.add(rule)
+    stats = _commit_and_reprice()
+    return jsonify({'rule': rule.to_dict(), 'reprice': stats}), 201
+
+@admin_bp.route('/pricing-rules/<int:rule_id>', methods=['PUT'])
+@admin_required
+def update_pricing_rule(rule_id):
+    rule = PricingRule.query.get_or_404(rule_id)
+    error = _read_pricing_rule(rule, request.json or {})
+    if error:
+        return jsonify({'error': error}), 400
+    stats = _commit_and_reprice()
+    return jsonify({'rule': rule.to_dict(), 'reprice': stats})
+
+@admin_bp.route('/pricing-rules/<int:rule_id>', methods=['DELETE'])
+@admin_required
+def delete_pricing_rule(rule_id):
+    db.session.delete(PricingRule.query.get_or_404(rule_id))
+    stats = _commit_and_reprice()
+    return jsonify({'message': 'Regra removida', 'reprice': stats})
+
+@admin_bp.route('/reprice', methods=['POST'])
+@admin_required
+def reprice_services():
+    """Recalcula a tabela de preços (ex.: depois de mudar PROFIT_MARGIN no ambiente)."""
+    return jsonify(_commit_and_reprice())
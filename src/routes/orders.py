@@ -1,41 +1,58 @@
 # Arquivo: src/routes/orders.py (Versão Final Corrigida)
 
+import base64
+import csv
+import io
+import os
+from datetime import datetime
+
 from flask import Blueprint, jsonify, request, session
-from src.models.user import User, Order, Service, db
-from src.routes.user import login_required
+from sqlalchemy import tuple_
+from src.models.user import Order, OrderOutbox, db
+from src.routes.user import get_current_user, idempotent, login_required, rate_limit
 
-# Importa nossa nova função de configuração e a classe da API
+# Importa nossa nova função de configuração e a reserva atômica de saldo
 from src.config import get_config
-from src.services.barato_social import BaratoSocialAPI
+from src.encoding import api_response
+from src.services.balance import from_cents, hold, hold_many, order_reference, to_cents
+from src.services.catalog import get_catalog
+from src.services.pricing import unit_rate
+from src.services.rollups import record_order
 
 orders_bp = Blueprint('orders', __name__)
 
+BULK_ORDER_MAX_LINES = int(os.environ.get('BULK_ORDER_MAX_LINES', '1000'))
+
+ORDERS_PAGE_SIZE = 50
+ORDERS_MAX_PAGE_SIZE = 200
+
 @orders_bp.route('/orders', methods=['POST'])
 @login_required
+@rate_limit('orders', '30/minute')
+@idempotent('orders')
 def create_order():
     """Criar novo pedido"""
     data = request.json
-    user = User.query.get(session['user_id'])
+    user = get_current_user()
     
     required_fields = ['service_id', 'link', 'quantity']
     if not all(field in data for field in required_fields):
         return jsonify({'error': 'Campos service_id, link e quantity são obrigatórios'}), 400
     
-    service = Service.query.filter_by(service_id=data['service_id'], is_active=True).first()
+    # Serviço e preço final vêm do snapshot do catálogo (sem consulta ao banco)
+    try:
+        service = get_catalog().by_service_id.get(int(data['service_id']))
+    except (TypeError, ValueError):
+        service = None
     if not service:
         return jsonify({'error': 'Serviço não encontrado ou inativo'}), 404
     
     quantity = int(data['quantity'])
-    if not (service.min <= quantity <= service.max):
-        return jsonify({'error': f'Quantidade deve estar entre {service.min} e {service.max}'}), 400
+    if not (service['min'] <= quantity <= service['max']):
+        return jsonify({'error': f'Quantidade deve estar entre {service["min"]} e {service["max"]}'}), 400
     
-    # USA A NOVA FUNÇÃO get_config
-    profit_margin = float(get_config('profit_margin') or 0)
-    final_rate = service.get_final_price(profit_margin)
-    total_charge = (final_rate * quantity) / 1000
-    
-    if user.balance < total_charge:
-        return jsonify({'error': 'Saldo insuficiente'}), 400
+    # Preço pré-calculado da faixa de quantidade (tabela service_price, via snapshot)
+    charge_cents = to_cents((unit_rate(service, quantity) * quantity) / 1000)
     
     # USA A NOVA FUNÇÃO get_config
     api_key = get_config('barato_api_key')
@@ -43,44 +60,190 @@ def create_order():
         return jsonify({'error': 'API BaratoSocial não configurada'}), 500
     
     try:
-        api = BaratoSocialAPI(api_key)
-        order_data = {'service': service.service_id, 'link': data['link'], 'quantity': quantity}
-        if data.get('comments'):
-            order_data['comments'] = data['comments']
-        
-        api_response = api.order(order_data)
-        
-        if 'error' in api_response:
-            return jsonify({'error': api_response['error']}), 500
-        
-        user.balance -= total_charge
-        
         new_order = Order(
             user_id=user.id,
-            service_id=service.service_id,
-            service_name=service.name,
+            service_id=service['service_id'],
+            service_name=service['name'],
             link=data['link'],
             quantity=quantity,
-            charge=total_charge,
-            barato_order_id=api_response.get('order'),
-            status='Pending'
+            charge=from_cents(charge_cents),
+            status='Queued'
         )
-        
         db.session.add(new_order)
+        db.session.flush()
+        
+        # Reserva o valor com um UPDATE condicional (sem corrida entre requisições)
+        if not hold(user.id, charge_cents, order_reference(new_order.id)):
+            db.session.rollback()
+            return jsonify({'error': 'Saldo insuficiente'}), 400
+        record_order(user.id, service['service_id'], service['category'], new_order.charge)
+        # O envio ao fornecedor é feito pelo `flask order-worker`
+        db.session.add(OrderOutbox(order=new_order, comments=data.get('comments') or None))
         db.session.commit()
         
-        return jsonify({'message': 'Pedido criado com sucesso', 'order': new_order.to_dict()}), 201
+        return jsonify({'message': 'Pedido recebido e na fila de envio', 'order': new_order.to_dict()}), 202
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': f'Erro ao criar pedido: {str(e)}'}), 500
 
+def _read_bulk_lines():
+    """Lê as linhas do lote: array JSON (ou {'orders': [...]}) ou upload CSV no campo 'file'."""
+    upload = request.files.get('file')
+    if upload:
+        text = upload.read().decode('utf-8-sig')
+        return list(csv.DictReader(io.StringIO(text)))
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('orders')
+    return data if isinstance(data, list) else None
+
+def _record_bulk_rollups(user_id, lines):
+    """Soma os totais diários agrupando as linhas por serviço (um UPSERT por serviço, não por linha)."""
+    grouped = {}
+    for service, charge in lines:
+        key = (service['service_id'], service['category'])
+        count, amount = grouped.get(key, (0, 0.0))
+        grouped[key] = (count + 1, amount + charge)
+    for (service_id, category), (count, amount) in grouped.items():
+        record_order(user_id, service_id, category, amount, count=count)
+
+@orders_bp.route('/orders/bulk', methods=['POST'])
+@login_required
+@rate_limit('orders_bulk', '5/minute')
+@idempotent('orders_bulk')
+def create_bulk_orders():
+    """
+    Cria vários pedidos de uma vez. Todas as linhas são validadas contra o
+    mesmo catálogo e o total é reservado em uma transação, junto com as linhas
+    da fila de envio. Pedidos recusados pelo fornecedor são estornados pelo worker.
+    """
+    lines = _read_bulk_lines()
+    if not lines:
+        return jsonify({'error': 'Envie uma lista de pedidos (JSON) ou um arquivo CSV'}), 400
+    if len(lines) > BULK_ORDER_MAX_LINES:
+        return jsonify({'error': f'Máximo de {BULK_ORDER_MAX_LINES} pedidos por lote'}), 400
+    
+    api_key = get_config('barato_api_key')
+    if not api_key:
+        return jsonify({'error': 'API BaratoSocial não configurada'}), 500
+    
+    # Todas as linhas são validadas contra o mesmo snapshot do catálogo
+    services = get_catalog().by_service_id
+    
+    errors, valid = [], []
+    for index, line in enumerate(lines, start=1):
+        try:
+            service_id = int(line.get('service_id'))
+            quantity = int(line.get('quantity'))
+            link = (line.get('link') or '').strip()
+        except (TypeError, ValueError, AttributeError):
+            errors.append({'line': index, 'error': 'Campos service_id, link e quantity são obrigatórios'})
+            continue
+        service = services.get(service_id)
+        if not link:
+            errors.append({'line': index, 'error': 'Campos service_id, link e quantity são obrigatórios'})
+        elif not service:
+            errors.append({'line': index, 'error': 'Serviço não encontrado ou inativo'})
+        elif not (service['min'] <= quantity <= service['max']):
+            errors.append({'line': index, 'error': f'Quantidade deve estar entre {service["min"]} e {service["max"]}'})
+        else:
+            charge = from_cents(to_cents((unit_rate(service, quantity) * quantity) / 1000))
+            valid.append((index, service, link, quantity, charge, line.get('comments') or None))
+    
+    if errors:
+        return jsonify({'error': 'Lote contém linhas inválidas; nenhum pedido foi criado', 'lines': errors}), 400
+    
+    user_id = session['user_id']
+    total_cents = sum(to_cents(item[4]) for item in valid)
+    try:
+        orders = []
+        for index, service, link, quantity, charge, comments in valid:
+            orders.append(Order(user_id=user_id, service_id=service['service_id'], service_name=service['name'],
+                                link=link, quantity=quantity, charge=charge, status='Queued'))
+        db.session.add_all(orders)
+        db.session.flush()
+        
+        # Um único UPDATE condicional reserva o total; cada linha tem sua reserva
+        holds = [(to_cents(order.charge), order_reference(order.id)) for order in orders]
+        if not hold_many(user_id, holds):
+            db.session.rollback()
+            return jsonify({'error': 'Saldo insuficiente', 'total_charge': from_cents(total_cents)}), 400
+        _record_bulk_rollups(user_id, [(item[1], item[4]) for item in valid])
+        # O envio ao fornecedor é feito pelo `flask order-worker`, na mesma
+        # transação das reservas: nada fica preso se o request cair no meio.
+        db.session.add_all([OrderOutbox(order=order, comments=item[5]) for order, item in zip(orders, valid)])
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Erro ao criar pedidos: {str(e)}'}), 500
+    
+    return jsonify({
+        'message': 'Pedidos recebidos e na fila de envio',
+        'results': [{'line': item[0], 'order_id': order.id, 'status': order.status}
+                    for order, item in zip(orders, valid)],
+        'total_charge': from_cents(total_cents)
+    }), 202
+
+def _encode_cursor(timestamp, order_id):
+    raw = f'{timestamp.isoformat()}|{order_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def _decode_cursor(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    timestamp, order_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+    return datetime.fromisoformat(timestamp), int(order_id)
+
 @orders_bp.route('/orders', methods=['GET'])
 @login_required
 def get_orders():
-    """Listar pedidos do usuário"""
-    user = User.query.get(session['user_id'])
-    orders = Order.query.filter_by(user_id=user.id).order_by(Order.created_at.desc()).all()
-    return jsonify({'orders': [order.to_dict() for order in orders]})
+    """
+    Listar pedidos do usuário, paginados por cursor (keyset em created_at, id).
+    Filtros opcionais: status, service_id.
+    Com updated_since (ISO 8601), retorna só os pedidos alterados desde então,
+    em ordem crescente de updated_at; o next_cursor devolvido serve para a
+    próxima consulta incremental.
+    """
+    try:
+        limit = min(max(int(request.args.get('limit', ORDERS_PAGE_SIZE)), 1), ORDERS_MAX_PAGE_SIZE)
+        cursor = _decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        updated_since = request.args.get('updated_since')
+        updated_since = datetime.fromisoformat(updated_since.replace('Z', '')) if updated_since else None
+        service_id = request.args.get('service_id', type=int)
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Parâmetros de paginação inválidos'}), 400
+
+    query = Order.query.filter(Order.user_id == session['user_id'])
+    if request.args.get('status'):
+        query = query.filter(Order.status == request.args['status'])
+    if service_id is not None:
+        query = query.filter(Order.service_id == service_id)
+
+    if updated_since is not None:
+        # Modo incremental: só o que mudou, do mais antigo para o mais novo
+        query = query.filter(Order.updated_at > updated_since)
+        if cursor:
+            query = query.filter(tuple_(Order.updated_at, Order.id) > cursor)
+        orders = query.order_by(Order.updated_at.asc(), Order.id.asc()).limit(limit).all()
+        if orders:
+            next_cursor = _encode_cursor(orders[-1].updated_at, orders[-1].id)
+        else:
+            next_cursor = request.args.get('cursor')
+        return api_response({
+            'orders': [order.to_dict() for order in orders],
+            'next_cursor': next_cursor,
+            'has_more': len(orders) == limit
+        })
+
+    if cursor:
+        query = query.filter(tuple_(Order.created_at, Order.id) < cursor)
+    orders = query.order_by(Order.created_at.desc(), Order.id.desc()).limit(limit).all()
+    next_cursor = _encode_cursor(orders[-1].created_at, orders[-1].id) if len(orders) == limit else None
+    return api_response({
+        'orders': [order.to_dict() for order in orders],
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None
+    })
 
 # ... (Mantenha as outras rotas como get_order, update_order_status, etc.,
 # mas certifique-se de que qualquer chamada à API BaratoSocial use a mesma lógica:
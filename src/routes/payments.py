@@ -1,10 +1,12 @@
 # Arquivo: src/routes/payments.py (Versão com a chamada de função CORRIGIDA)
 
-from flask import Blueprint, jsonify, request, session
-from src.models.user import User, Payment, db
-from src.routes.user import login_required
+import json
+
+from flask import Blueprint, current_app, g, jsonify, request
+from src.models.user import Payment, PaymentEvent, db
+from src.routes.user import get_current_user, idempotent, login_required, rate_limit
 from src.config import get_config
-from src.services.mercado_pago import MercadoPagoAPI
+from src.services.payment_events import verify_signature, wake_consumer
 
 payments_bp = Blueprint('payments', __name__)
 
@@ -12,13 +14,16 @@ def get_mp_api_instance():
     access_token = get_config('mp_access_token')
     if not access_token:
         return None
+    from src.services.mercado_pago import MercadoPagoAPI
     return MercadoPagoAPI(access_token)
 
 @payments_bp.route('/create-payment', methods=['POST'])
 @login_required
+@rate_limit('payments', '10/minute')
+@idempotent('create_payment')
 def create_payment():
     data = request.json
-    user = User.query.get(session['user_id'])
+    user = get_current_user()
     
     amount = data.get('amount')
     if not isinstance(amount, (int, float)) or amount <= 0:
@@ -48,16 +53,26 @@ def create_payment():
             amount=amount,
             description=f'Recarga de saldo para {user.username}',
             payer_info=payer_info, # <-- AQUI ESTÁ A CORREÇÃO
-            external_reference=str(payment.id)
+            external_reference=str(payment.id),
+            # Mesma chave do cliente (por usuário): uma repetição não cria outro PIX no gateway
+            idempotency_key=g.get('idempotency_key')
         )
         # ====================================================================
 
+        # Falhas do gateway respondem 502 (não 4xx): a chave de idempotência guarda o
+        # resultado e uma repetição não cria outro Payment com outra external_reference.
         if 'error' in mp_payment_data:
-            db.session.delete(payment)
-            db.session.commit()
             error_message = mp_payment_data.get('message', 'Erro desconhecido do gateway de pagamento.')
             print(f"Erro do Mercado Pago ao criar pagamento: {error_message}")
-            return jsonify({'error': error_message}), 400
+            from src.services.mercado_pago import TRANSPORT_ERROR
+            if mp_payment_data.get(TRANSPORT_ERROR):
+                # O PIX pode ter sido criado: a linha fica 'pending' para a conciliação
+                # (flask reconcile-payments) casá-la pelo external_reference.
+                return jsonify({'error': 'Não foi possível confirmar o pagamento com o gateway; '
+                                         'confira suas recargas antes de tentar de novo.'}), 502
+            db.session.delete(payment)
+            db.session.commit()
+            return jsonify({'error': error_message}), 502
 
         payment.payment_id = str(mp_payment_data['id'])
         db.session.commit()
@@ -82,4 +97,34 @@ def create_payment():
         print(f"Erro inesperado ao processar pagamento: {e}")
         return jsonify({'error': f'Erro inesperado no servidor: {str(e)}'}), 500
 
+@payments_bp.route('/webhook', methods=['POST'])
+def payment_webhook():
+    """
+    Recebe notificações do Mercado Pago. Só valida a assinatura, grava o evento
+    e responde 200; o crédito do saldo é feito pelo consumidor em segundo plano.
+    """
+    data = request.get_json(silent=True) or {}
+    topic = request.args.get('type') or request.args.get('topic') or data.get('type')
+    data_id = request.args.get('data.id') or request.args.get('id') or (data.get('data') or {}).get('id')
+
+    secret = get_config('mp_webhook_secret')
+    if not secret:
+        print("Webhook do Mercado Pago recebido, mas 'mp_webhook_secret' não está configurado.")
+        return jsonify({'error': 'Webhook não configurado'}), 503
+
+    if not verify_signature(secret, request.headers.get('x-signature'),
+                            request.headers.get('x-request-id'), data_id):
+        return jsonify({'error': 'Assinatura inválida'}), 401
+
+    # Só nos interessam notificações de pagamento; as demais são confirmadas e ignoradas.
+    if topic != 'payment' or not data_id:
+        return jsonify({'status': 'ignored'}), 200
+
+    event = PaymentEvent(mp_payment_id=str(data_id), topic=topic, payload=json.dumps(data))
+    db.session.add(event)
+    db.session.commit()
+
+    wake_consumer(current_app._get_current_object())
+    return jsonify({'status': 'received'}), 200
+
 # Mantenha as outras rotas como estão...
@@ -1,72 +1,106 @@
 # Arquivo: src/routes/services.py (Versão Final Corrigida)
 
-from flask import Blueprint, jsonify
+from flask import Blueprint, abort, jsonify, request
 from src.models.user import Service, db
-from src.routes.user import login_required, admin_required
+from src.routes.user import login_required, admin_required, rate_limit
 
 # Importa nossa nova função de configuração e a classe da API
 from src.config import get_config
-from src.services.barato_social import BaratoSocialAPI
+from src.encoding import api_response, snapshot_response
+from src.services.catalog import bump_catalog_version, get_catalog, invalidate_catalog
+from src.services.catalog_sync import sync_catalog
+from src.services.search import SORTS
 
 services_bp = Blueprint('services', __name__)
 
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+
+def _snapshot_response(catalog, key, data, body, etag):
+    """
+    Resposta com o corpo já serializado do snapshot (JSON ou MessagePack,
+    comprimido conforme o Accept-Encoding); devolve 304 se o ETag bater.
+    """
+    response = snapshot_response(catalog.encoded, key, data, body, etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
 @services_bp.route('/services', methods=['GET'])
 @login_required
+@rate_limit('services', '120/minute')
 def get_services():
     """
-    Lista os serviços disponíveis do banco de dados.
+    Lista os serviços disponíveis a partir do snapshot do catálogo.
     Se o banco estiver vazio, tenta sincronizar com a API primeiro.
     """
-    # USA A NOVA FUNÇÃO get_config para a margem de lucro
-    profit_margin = float(get_config('profit_margin') or 0)
-    
-    services = Service.query.filter_by(is_active=True).all()
-    
+    catalog = get_catalog()
+
     # Se não há serviços no nosso banco, tenta uma sincronização automática
-    if not services:
+    if not catalog.active:
         # USA A NOVA FUNÇÃO get_config para a chave da API
         api_key = get_config('barato_api_key')
         if api_key:
+            from src.services.barato_social import BaratoSocialAPI
             try:
                 api = BaratoSocialAPI(api_key)
                 services_data = api.services()
                 if services_data and isinstance(services_data, list):
-                    for service_data in services_data:
-                        # Evita adicionar serviços duplicados
-                        exists = Service.query.filter_by(service_id=service_data['service']).first()
-                        if not exists:
-                            new_service = Service(
-                                service_id=service_data['service'],
-                                name=service_data['name'],
-                                type=service_data['type'],
-                                rate=float(service_data['rate']),
-                                min=int(service_data['min']),
-                                max=int(service_data['max']),
-                                category=service_data.get('category', ''),
-                                description=service_data.get('description', '')
-                            )
-                            db.session.add(new_service)
+                    sync_catalog(services_data)
+                    bump_catalog_version()
                     db.session.commit()
-                    # Recarrega os serviços do banco após a sincronização
-                    services = Service.query.filter_by(is_active=True).all()
+                    # Reconstrói o snapshot após a sincronização
+                    invalidate_catalog()
+                    catalog = get_catalog()
             except Exception as e:
+                db.session.rollback()
                 print(f"Falha na sincronização automática de serviços: {e}")
                 return jsonify({"error": "Não foi possível carregar os serviços do fornecedor."}), 500
 
-    # Retorna a lista de serviços com o preço final calculado
-    return jsonify([service.to_dict(profit_margin) for service in services])
+    # Retorna a lista de serviços com o preço final calculado (pré-serializada)
+    return _snapshot_response(catalog, 'services', catalog.active, catalog.services_json, catalog.services_etag)
 
 @services_bp.route('/services/categories', methods=['GET'])
 @login_required
 def get_categories():
     """Lista todas as categorias de serviços distintas."""
-    categories = db.session.query(Service.category).filter(
-        Service.is_active == True,
-        Service.category != None,
-        Service.category != ''
-    ).distinct().order_by(Service.category).all()
-    
-    return jsonify([cat[0] for cat in categories])
+    catalog = get_catalog()
+    return _snapshot_response(catalog, 'categories', catalog.categories,
+                              catalog.categories_json, catalog.categories_etag)
+
+@services_bp.route('/services/search', methods=['GET'])
+@login_required
+@rate_limit('search', '300/minute')
+def search_services():
+    """
+    Busca no catálogo (índice em memória do snapshot), sem baixar a lista inteira.
+    Parâmetros: q (prefixo, sem diferenciar acentos), category, type,
+    min_price/max_price (preço final por 1000), quantity, min_quantity/max_quantity,
+    sort (relevance, price, -price, name), page e limit.
+    Retorna os resultados da página, o total e a contagem por categoria.
+    """
+    args = request.args
+    try:
+        page = max(int(args.get('page', 1)), 1)
+        limit = min(max(int(args.get('limit', SEARCH_PAGE_SIZE)), 1), SEARCH_MAX_PAGE_SIZE)
+        filters = {
+            'min_price': float(args['min_price']) if args.get('min_price') else None,
+            'max_price': float(args['max_price']) if args.get('max_price') else None,
+            'quantity': int(args['quantity']) if args.get('quantity') else None,
+            'min_quantity': int(args['min_quantity']) if args.get('min_quantity') else None,
+            'max_quantity': int(args['max_quantity']) if args.get('max_quantity') else None,
+        }
+    except ValueError:
+        return jsonify({'error': 'Parâmetros de busca inválidos'}), 400
+
+    sort = args.get('sort') or None
+    if sort is not None and sort not in SORTS:
+        return jsonify({'error': f'Ordenação inválida. Use uma de: {", ".join(SORTS)}'}), 400
+
+    result = get_catalog().search_index.search(
+        query=args.get('q', ''), category=args.get('category'), service_type=args.get('type'),
+        sort=sort, page=page, limit=limit, **filters
+    )
+    return api_response(result)
 
 # A rota de sincronização já estava no admin.py, que é o lugar mais correto para ela.
 # Se você quiser mantê-la aqui também, lembre-se de usar o get_config.
@@ -76,9 +110,11 @@ def get_categories():
 @login_required
 def get_service_details(service_id):
     """Obtém detalhes de um serviço específico."""
-    service = Service.query.get_or_404(service_id)
-    profit_margin = float(get_config('profit_margin') or 0)
-    return jsonify(service.to_dict(profit_margin))
+    catalog = get_catalog()
+    detail = catalog.detail(service_id)
+    if detail is None:
+        abort(404)
+    return _snapshot_response(catalog, service_id, catalog.by_id[service_id], *detail)
 
 @services_bp.route('/services/<int:service_id>/toggle', methods=['POST'])
 @admin_required
@@ -86,10 +122,12 @@ def toggle_service_status(service_id):
     """Ativa ou desativa um serviço para os clientes."""
     service = Service.query.get_or_404(service_id)
     service.is_active = not service.is_active
+    service.deactivated_by_sync = False  # decisão do admin: a sincronização não desfaz
+    bump_catalog_version()
     db.session.commit()
-    
-    profit_margin = float(get_config('profit_margin') or 0)
+    invalidate_catalog()
+
     return jsonify({
         'message': f'Serviço {"ativado" if service.is_active else "desativado"} com sucesso.',
-        'service': service.to_dict(profit_margin)
+        'service': get_catalog().by_id[service.id]
     })
@@ -1,14 +1,81 @@
-from flask import Blueprint, jsonify, request, session
+import json
+import os
+import threading
+import time
+from decimal import InvalidOperation
+
+from flask import Blueprint, current_app, g, jsonify, make_response, request, session
+from src import metrics
 from src.models.user import User, Payment, db
+from src.config import bump_version, read_version
+from src.encoding import api_response
+from src.services import idempotency
+from src.services.balance import adjust_balance, to_cents
+from src.services.passwords import PasswordHashBusy
+from src.services.rate_limit import parse_rule, retry_after_header, take
+from src.services.rollups import record_new_user
 from functools import wraps
 
 user_bp = Blueprint('user', __name__)
 
+# Cache por worker dos dados de papel (existe? é admin?) de cada usuário.
+# Rebaixar um admin vale em no máximo PRINCIPAL_CACHE_TTL segundos; mudanças
+# feitas por update_user/delete_user são avisadas aos outros workers pelo
+# contador _users_version, checado a cada PRINCIPAL_VERSION_CHECK segundos.
+PRINCIPAL_CACHE_TTL = float(os.environ.get('PRINCIPAL_CACHE_TTL', '30'))
+PRINCIPAL_VERSION_CHECK = float(os.environ.get('PRINCIPAL_VERSION_CHECK', '5'))
+USERS_VERSION_KEY = '_users_version'
+
+_principals_lock = threading.Lock()
+_principals = {}  # user_id -> (existe, is_admin, expira_em)
+_principals_state = {'version': None, 'checked_at': 0.0}
+
+def _check_users_version(now):
+    if now - _principals_state['checked_at'] < PRINCIPAL_VERSION_CHECK:
+        return
+    version = read_version(USERS_VERSION_KEY)
+    with _principals_lock:
+        if version != _principals_state['version']:
+            _principals.clear()
+            _principals_state['version'] = version
+        _principals_state['checked_at'] = now
+
+def get_principal(user_id):
+    """Retorna (existe, is_admin) do usuário, do cache quando possível."""
+    now = time.monotonic()
+    _check_users_version(now)
+    cached = _principals.get(user_id)
+    if cached and cached[2] > now:
+        return cached[0], cached[1]
+
+    user = get_current_user() if session.get('user_id') == user_id else db.session.get(User, user_id)
+    entry = (user is not None, bool(user and user.is_admin), now + PRINCIPAL_CACHE_TTL)
+    with _principals_lock:
+        _principals[user_id] = entry
+    return entry[0], entry[1]
+
+def invalidate_principal(user_id):
+    """Descarta o cache do usuário neste worker e avisa os demais (commit a cargo de quem chamou)."""
+    bump_version(USERS_VERSION_KEY)
+    with _principals_lock:
+        _principals.pop(user_id, None)
+
+def get_current_user():
+    """Usuário logado, carregado no máximo uma vez por requisição."""
+    if 'current_user' not in g:
+        user_id = session.get('user_id')
+        g.current_user = db.session.get(User, user_id) if user_id is not None else None
+    return g.current_user
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if 'user_id' not in session:
             return jsonify({'error': 'Login necessário'}), 401
+        exists, _ = get_principal(session['user_id'])
+        if not exists:
+            session.pop('user_id', None)
+            return jsonify({'error': 'Login necessário'}), 401
         return f(*args, **kwargs)
     return decorated_function
 
@@ -17,13 +84,110 @@ def admin_required(f):
     def decorated_function(*args, **kwargs):
         if 'user_id' not in session:
             return jsonify({'error': 'Login necessário'}), 401
-        user = User.query.get(session['user_id'])
-        if not user or not user.is_admin:
+        exists, is_admin = get_principal(session['user_id'])
+        if not exists or not is_admin:
             return jsonify({'error': 'Acesso negado'}), 403
         return f(*args, **kwargs)
     return decorated_function
 
+def rate_limit(name, spec, by='user', burst=None):
+    """
+    Limita a rota com um balde de tokens (ver src/services/rate_limit.py).
+    by='user': por usuário logado (sem login, pelo IP); by='ip': por IP.
+    Rotas com o mesmo `name` dividem o balde. Use abaixo de login_required/admin_required.
+    """
+    rule = parse_rule(name, spec, burst)
+
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            user_id = session.get('user_id') if by == 'user' else None
+            identity = f'user:{user_id}' if user_id is not None else f'ip:{request.remote_addr}'
+            allowed, retry_after = take(rule, identity)
+            if not allowed:
+                metrics.inc('rate_limited_total', (('rule', rule.name),))
+                seconds = retry_after_header(retry_after)
+                response = jsonify({'error': 'Muitas requisições. Tente novamente em instantes.',
+                                    'retry_after': int(seconds)})
+                response.headers['Retry-After'] = seconds
+                return response, 429
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+def _request_fingerprint():
+    files = [(field, upload.filename, upload.read()) for field, upload in request.files.items(multi=True)]
+    for upload in request.files.values():
+        upload.seek(0)
+    body = request.get_data(cache=True) if not files else repr(sorted(request.form.items(multi=True))).encode()
+    return idempotency.fingerprint(request.method, request.path, body, files)
+
+def idempotent(name):
+    """
+    Aceita o cabeçalho Idempotency-Key na rota (ver src/services/idempotency.py).
+    A chave vale por usuário e por `name`; repetições recebem a resposta guardada
+    (com Idempotent-Replayed: true) e a rota pode repassar g.idempotency_key
+    para o gateway. Sem o cabeçalho, nada muda. Use abaixo de rate_limit.
+    A rota só pode responder 4xx antes de gravar qualquer efeito: 4xx libera
+    a chave; 2xx, 5xx e exceções ficam guardados até o TTL.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            client_key = request.headers.get('Idempotency-Key')
+            if client_key is None:
+                return f(*args, **kwargs)
+            client_key = client_key.strip()
+            if not client_key or len(client_key) > idempotency.KEY_MAX_LENGTH:
+                return jsonify({'error': f'Idempotency-Key deve ter de 1 a {idempotency.KEY_MAX_LENGTH} caracteres'}), 400
+
+            scope = f"user-{session.get('user_id')}"
+            key = f'{name}:{scope}:{client_key}'
+            fingerprint = _request_fingerprint()
+            state, stored = idempotency.begin(key, fingerprint)
+            metrics.inc('idempotency_requests_total', (('route', name), ('result', state)))
+            if state == idempotency.REPLAY:
+                status_code, content_type, body = stored
+                response = current_app.response_class(body, status=status_code, content_type=content_type)
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+            if state == idempotency.MISMATCH:
+                return jsonify({'error': 'Idempotency-Key já usada em outra requisição'}), 422
+            if state == idempotency.IN_PROGRESS:
+                response = jsonify({'error': 'Requisição com esta Idempotency-Key ainda em andamento'})
+                response.headers['Retry-After'] = '1'
+                return response, 409
+            if state == idempotency.INTERRUPTED:
+                return jsonify({'error': 'A requisição original com esta Idempotency-Key foi interrompida e o '
+                                         'resultado é desconhecido. Confira seus pedidos e pagamentos antes de '
+                                         'repetir com uma nova chave.'}), 409
+
+            g.idempotency_key = f'{scope}:{client_key}'
+            try:
+                response = make_response(f(*args, **kwargs))
+            except Exception:
+                # A rota pode ter gravado algo antes de falhar: a chave guarda o 500.
+                idempotency.finish(key, fingerprint, 500, 'application/json',
+                                   json.dumps({'error': 'Erro interno ao processar a requisição'}).encode())
+                raise
+            if 400 <= response.status_code < 500:
+                # 4xx = recusada antes de gravar qualquer coisa: a chave fica livre.
+                idempotency.abandon(key)
+            else:
+                idempotency.finish(key, fingerprint, response.status_code, response.content_type,
+                                   response.get_data())
+            return response
+        return decorated_function
+    return decorator
+
+@user_bp.errorhandler(PasswordHashBusy)
+def password_hash_busy(error):
+    response = jsonify({'error': 'Servidor ocupado, tente novamente em instantes'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 @user_bp.route('/register', methods=['POST'])
+@rate_limit('register', '10/hour', by='ip')
 def register():
     data = request.json
     
@@ -47,11 +211,13 @@ def register():
         user.is_admin = True
     
     db.session.add(user)
+    record_new_user()
     db.session.commit()
     
     return jsonify({'message': 'Usuário criado com sucesso', 'user': user.to_dict()}), 201
 
 @user_bp.route('/login', methods=['POST'])
+@rate_limit('login', '10/minute', by='ip')
 def login():
     data = request.json
     
@@ -61,6 +227,10 @@ def login():
     user = User.query.filter_by(username=data['username']).first()
     
     if user and user.check_password(data['password']):
+        # Migração transparente do custo do hash para a política atual
+        if user.password_needs_rehash():
+            user.set_password(data['password'])
+            db.session.commit()
         session['user_id'] = user.id
         return jsonify({'message': 'Login realizado com sucesso', 'user': user.to_dict()}), 200
     else:
@@ -75,13 +245,13 @@ def logout():
 @user_bp.route('/profile', methods=['GET'])
 @login_required
 def get_profile():
-    user = User.query.get(session['user_id'])
+    user = get_current_user()
     return jsonify(user.to_dict())
 
 @user_bp.route('/profile', methods=['PUT'])
 @login_required
 def update_profile():
-    user = User.query.get(session['user_id'])
+    user = get_current_user()
     data = request.json
     
     if data.get('email'):
@@ -94,17 +264,20 @@ def update_profile():
     if data.get('password'):
         user.set_password(data['password'])
     
+    invalidate_principal(user.id)
     db.session.commit()
     return jsonify({'message': 'Perfil atualizado com sucesso', 'user': user.to_dict()})
 
 @user_bp.route('/balance', methods=['GET'])
 @login_required
 def get_balance():
-    user = User.query.get(session['user_id'])
+    user = get_current_user()
     return jsonify({'balance': user.balance})
 
 @user_bp.route('/add-balance', methods=['POST'])
 @login_required
+@rate_limit('payments', '10/minute')
+@idempotent('add_balance')
 def add_balance():
     data = request.json
     amount = data.get('amount')
@@ -112,7 +285,7 @@ def add_balance():
     if not amount or amount <= 0:
         return jsonify({'error': 'Valor inválido'}), 400
     
-    user = User.query.get(session['user_id'])
+    user = get_current_user()
     
     # Criar registro de pagamento
     payment = Payment(
@@ -132,16 +305,16 @@ def add_balance():
 @user_bp.route('/payments', methods=['GET'])
 @login_required
 def get_payments():
-    user = User.query.get(session['user_id'])
+    user = get_current_user()
     payments = Payment.query.filter_by(user_id=user.id).order_by(Payment.created_at.desc()).all()
-    return jsonify([payment.to_dict() for payment in payments])
+    return api_response([payment.to_dict() for payment in payments])
 
 # Rotas administrativas
 @user_bp.route('/users', methods=['GET'])
 @admin_required
 def get_users():
     users = User.query.all()
-    return jsonify([user.to_dict() for user in users])
+    return api_response([user.to_dict() for user in users])
 
 @user_bp.route('/users/<int:user_id>', methods=['GET'])
 @admin_required
@@ -155,15 +328,27 @@ def update_user(user_id):
     user = User.query.get_or_404(user_id)
     data = request.json
     
+    if 'balance' in data:
+        try:
+            new_cents = to_cents(data['balance'])
+        except (InvalidOperation, KeyError, TypeError, ValueError):
+            return jsonify({'error': 'Saldo inválido'}), 400
     if 'username' in data:
         user.username = data['username']
     if 'email' in data:
         user.email = data['email']
     if 'balance' in data:
-        user.balance = float(data['balance'])
+        # Compare-and-set: se um pedido ou pagamento mudou o saldo entre a leitura e o
+        # UPDATE, tenta mais uma vez com o saldo novo; se perder de novo, recusa.
+        reference = f"admin:{session['user_id']}"
+        if not (adjust_balance(user.id, new_cents, reference=reference)
+                or adjust_balance(user.id, new_cents, reference=reference)):
+            db.session.rollback()
+            return jsonify({'error': 'O saldo do usuário mudou durante o ajuste; tente novamente'}), 409
     if 'is_admin' in data:
         user.is_admin = bool(data['is_admin'])
     
+    invalidate_principal(user.id)
     db.session.commit()
     return jsonify(user.to_dict())
 
@@ -171,6 +356,8 @@ def update_user(user_id):
 @admin_required
 def delete_user(user_id):
     user = User.query.get_or_404(user_id)
+    record_new_user(sign=-1, day=user.created_at.date() if user.created_at else None)
     db.session.delete(user)
+    invalidate_principal(user_id)
     db.session.commit()
     return '', 204
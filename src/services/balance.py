@@ -0,0 +1,188 @@
+# Arquivo: src/services/balance.py
+# Saldo em centavos inteiros com razão (ledger) somente de inserção.
+# Toda alteração é um único UPDATE atômico em User.balance_cents, seguro entre
+# workers, acompanhado de uma linha em ledger_entry. Débitos são condicionais
+# (WHERE balance_cents >= valor), sem SELECT prévio nem lock de linha.
+# Pedidos usam reservas: hold (debita) -> capture (confirma) ou release (devolve).
+# Nenhuma função aqui faz commit: quem chama decide a transação.
+
+from datetime import datetime, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+from sqlalchemy import func, insert
+
+from src.models.user import BalanceHold, LedgerEntry, Payment, User, db
+from src.services.rollups import record_payment_approved
+
+
+def to_cents(amount):
+    """Converte um valor em reais (float/str/Decimal) para centavos inteiros."""
+    return int((Decimal(str(amount)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def from_cents(cents):
+    return cents / 100.0
+
+
+def _apply(user_id, delta_cents, kind, reference):
+    """Soma delta_cents ao saldo em um único UPDATE e registra no razão. Retorna True se aplicou."""
+    updated = User.query.filter(User.id == user_id).update({
+        User.balance_cents: User.balance_cents + delta_cents,
+        User.balance: (User.balance_cents + delta_cents) / 100.0,
+    }, synchronize_session=False)
+    if not updated:
+        return False
+    db.session.add(LedgerEntry(user_id=user_id, amount_cents=delta_cents, kind=kind, reference=reference))
+    return True
+
+
+def credit(user_id, cents, reference, kind='credit'):
+    return _apply(user_id, cents, kind, reference)
+
+
+def adjust_balance(user_id, new_cents, reference='admin'):
+    """Define o saldo (ajuste manual do admin), registrando a diferença no razão."""
+    current = db.session.query(User.balance_cents).filter_by(id=user_id).scalar()
+    if current is None:
+        return False
+    updated = User.query.filter(User.id == user_id, User.balance_cents == current).update({
+        User.balance_cents: new_cents,
+        User.balance: new_cents / 100.0,
+    }, synchronize_session=False)
+    if updated and new_cents != current:
+        db.session.add(LedgerEntry(user_id=user_id, amount_cents=new_cents - current,
+                                   kind='adjustment', reference=reference))
+    return bool(updated)
+
+
+# --- Reservas para pedidos em andamento no fornecedor ---
+
+def hold_many(user_id, items):
+    """
+    Reserva vários valores de uma vez: items = [(centavos, referência), ...].
+    Um único UPDATE condicional debita o total; se o saldo não cobrir, nada é
+    reservado e retorna False.
+    """
+    total = sum(cents for cents, _ in items)
+    updated = User.query.filter(User.id == user_id, User.balance_cents >= total).update({
+        User.balance_cents: User.balance_cents - total,
+        User.balance: (User.balance_cents - total) / 100.0,
+    }, synchronize_session=False)
+    if not updated:
+        return False
+
+    now = datetime.utcnow()
+    db.session.execute(insert(BalanceHold), [
+        {'user_id': user_id, 'amount_cents': cents, 'reference': reference, 'status': 'held', 'created_at': now}
+        for cents, reference in items
+    ])
+    db.session.execute(insert(LedgerEntry), [
+        {'user_id': user_id, 'amount_cents': -cents, 'kind': 'hold', 'reference': reference, 'created_at': now}
+        for cents, reference in items
+    ])
+    return True
+
+
+def hold(user_id, cents, reference):
+    return hold_many(user_id, [(cents, reference)])
+
+
+def capture_many(references):
+    """Confirma as reservas (o fornecedor aceitou os pedidos); o saldo já foi debitado no hold."""
+    if not references:
+        return 0
+    return BalanceHold.query.filter(
+        BalanceHold.reference.in_(references),
+        BalanceHold.status == 'held'
+    ).update({BalanceHold.status: 'captured', BalanceHold.settled_at: datetime.utcnow()},
+             synchronize_session=False)
+
+
+def capture(reference):
+    return bool(capture_many([reference]))
+
+
+def release(reference):
+    """
+    Devolve ao saldo uma reserva ainda não confirmada (o fornecedor recusou o pedido).
+    A transição condicional de status torna a chamada idempotente.
+    """
+    entry = db.session.query(BalanceHold.id, BalanceHold.user_id, BalanceHold.amount_cents).filter_by(
+        reference=reference).first()
+    if entry is None:
+        return False
+    released = BalanceHold.query.filter(
+        BalanceHold.id == entry.id,
+        BalanceHold.status == 'held'
+    ).update({BalanceHold.status: 'released', BalanceHold.settled_at: datetime.utcnow()},
+             synchronize_session=False)
+    if not released:
+        return False
+    return _apply(entry.user_id, entry.amount_cents, 'release', reference)
+
+
+def order_reference(order_id):
+    return f'order:{order_id}'
+
+
+# --- Pagamentos ---
+
+def credit_approved_payment(payment):
+    """
+    Marca o pagamento como aprovado e credita o saldo do usuário, uma única vez.
+    O UPDATE condicional garante que duas notificações para o mesmo pagamento
+    (ou dois workers processando ao mesmo tempo) não creditem em dobro.
+    Retorna True se este chamador fez o crédito.
+    """
+    updated = Payment.query.filter(
+        Payment.id == payment.id,
+        Payment.status != 'approved'
+    ).update({Payment.status: 'approved'}, synchronize_session=False)
+    if not updated:
+        return False
+
+    credit(payment.user_id, to_cents(payment.amount), f'payment:{payment.id}')
+    record_payment_approved(payment.user_id, payment.amount)
+    return True
+
+
+def mark_payment_status(payment, status):
+    """Atualiza o status de um pagamento ainda pendente (ex.: rejected, cancelled)."""
+    return bool(mark_payments_status([payment.id], status))
+
+
+def mark_payments_status(payment_ids, status):
+    """Versão em lote de mark_payment_status: um UPDATE condicional. Retorna quantos mudaram."""
+    if not payment_ids:
+        return 0
+    return Payment.query.filter(
+        Payment.id.in_(payment_ids),
+        Payment.status == 'pending'
+    ).update({Payment.status: status}, synchronize_session=False)
+
+
+# --- Conciliação ---
+
+def reconcile(stale_hold_hours=24):
+    """
+    Compara o saldo de cada usuário com a soma do seu razão e lista reservas
+    presas há mais de `stale_hold_hours` (ex.: pedidos em 'Error').
+    """
+    ledger_sum = func.coalesce(func.sum(LedgerEntry.amount_cents), 0)
+    mismatches = db.session.query(User.id, User.balance_cents, ledger_sum).outerjoin(
+        LedgerEntry, LedgerEntry.user_id == User.id
+    ).group_by(User.id, User.balance_cents).having(User.balance_cents != ledger_sum).all()
+
+    cutoff = datetime.utcnow() - timedelta(hours=stale_hold_hours)
+    stale_holds = BalanceHold.query.filter(BalanceHold.status == 'held', BalanceHold.created_at < cutoff).all()
+    return {
+        'mismatches': [
+            {'user_id': user_id, 'balance_cents': balance_cents, 'ledger_cents': int(ledger_cents)}
+            for user_id, balance_cents, ledger_cents in mismatches
+        ],
+        'stale_holds': [
+            {'reference': entry.reference, 'user_id': entry.user_id, 'amount_cents': entry.amount_cents,
+             'created_at': entry.created_at.isoformat()}
+            for entry in stale_holds
+        ],
+    }
@@ -1,50 +1,117 @@
 # Arquivo: src/services/barato_social.py (Versão Final que Imita o Exemplo PHP)
 
+import os
+import random
+import time
+
 import requests
-from urllib.parse import urlencode
+
+from src import metrics
+from src.services import http_client
+
+# Desabilitar avisos de segurança que não são úteis em produção (uma vez por processo,
+# já que usamos verify=False como no exemplo em PHP).
+requests.packages.urllib3.disable_warnings(requests.packages.urllib3.exceptions.InsecureRequestWarning)
+
+# Timeouts separados: conectar deve ser rápido; a leitura pode demorar mais no 'add'.
+CONNECT_TIMEOUT = float(os.environ.get('BARATO_CONNECT_TIMEOUT', '5'))
+READ_TIMEOUT = float(os.environ.get('BARATO_READ_TIMEOUT', '30'))
+
+# URL da API (sobrescreva para apontar para um stub em testes de carga).
+API_URL = os.environ.get('BARATO_API_URL', 'https://baratosocial.com/api/v2')
+
+# Tamanho do pool de conexões keep-alive por worker (modo síncrono; ver http_client).
+POOL_MAXSIZE = int(os.environ.get('BARATO_POOL_MAXSIZE', '16'))
+
+# Limite de IDs por chamada na consulta de status em lote (orders=1,2,3).
+MAX_STATUS_IDS = 100
+
+# Só repetimos ações que não têm efeito colateral no fornecedor.
+# 'add' NUNCA é repetido: poderia criar um pedido duplicado.
+IDEMPOTENT_ACTIONS = {'services', 'balance', 'status'}
+MAX_RETRIES = int(os.environ.get('BARATO_MAX_RETRIES', '2'))
+RETRY_BACKOFF = 0.3  # segundos; cresce exponencialmente com jitter
+
+# Marca nas respostas de erro em que não sabemos se o fornecedor processou a ação
+# (conexão caiu, timeout, HTTP 5xx, resposta ilegível): num 'add', o pedido pode existir.
+TRANSPORT_ERROR = 'transport_error'
+
+
+def get_session():
+    """Sessão HTTP compartilhada deste worker para o fornecedor."""
+    return http_client.get_session('barato', POOL_MAXSIZE)
+
+
+def pool_stats():
+    return http_client.pool_stats('barato')
+
 
 class BaratoSocialAPI:
     def __init__(self, api_key):
         if not api_key:
             raise ValueError("API Key do BaratoSocial é obrigatória.")
-        self.api_url = 'https://baratosocial.com/api/v2'
+        self.api_url = API_URL
         self.api_key = api_key
         self.headers = {
             'User-Agent': 'Mozilla/4.0 (compatible; MSIE 5.01; Windows NT 5.0 )'
         }
 
+    def _post(self, post_data):
+        # ====================================================================
+        # MUDANÇA CRÍTICA FINAL:
+        # Enviamos como dados de formulário (data=...) e, crucialmente,
+        # desabilitamos a verificação do certificado SSL (verify=False),
+        # imitando o comportamento exato do código de exemplo em PHP.
+        # ====================================================================
+        return get_session().post(
+            self.api_url,
+            data=post_data,
+            headers=self.headers,
+            timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+            verify=False # Isto é o equivalente a CURLOPT_SSL_VERIFYPEER = 0
+        )
+
     def _make_request(self, post_data):
         post_data['key'] = self.api_key
-        
+        action = post_data.get('action', '')
+        retries = MAX_RETRIES if action in IDEMPOTENT_ACTIONS else 0
+
+        started = time.perf_counter()
+        error = None
+        attempt = 0
         try:
-            # ====================================================================
-            # MUDANÇA CRÍTICA FINAL:
-            # Enviamos como dados de formulário (data=...) e, crucialmente,
-            # desabilitamos a verificação do certificado SSL (verify=False),
-            # imitando o comportamento exato do código de exemplo em PHP.
-            # ====================================================================
-            response = requests.post(
-                self.api_url, 
-                data=post_data, 
-                headers=self.headers, 
-                timeout=30, 
-                verify=False # Isto é o equivalente a CURLOPT_SSL_VERIFYPEER = 0
-            )
-
-            # Desabilitar avisos de segurança que não são úteis em produção
-            requests.packages.urllib3.disable_warnings(requests.packages.urllib3.exceptions.InsecureRequestWarning)
-
-            response_json = response.json()
-            if not response.ok:
-                print(f"Erro da API BaratoSocial: {response.status_code} - {response.text}")
-            return response_json
-
-        except requests.exceptions.RequestException as e:
-            print(f"Erro de conexão com a API BaratoSocial: {e}")
-            return {'error': 'Erro de conexão com o fornecedor de serviços.'}
-        except ValueError:
-            print(f"Resposta inválida (não-JSON) da API BaratoSocial: {response.text}")
-            return {'error': 'O fornecedor de serviços retornou uma resposta vazia ou inválida.'}
+            while True:
+                try:
+                    response = self._post(post_data)
+                    if response.status_code >= 500 and attempt < retries:
+                        raise requests.exceptions.HTTPError(f"HTTP {response.status_code}")
+
+                    response_json = response.json()
+                    if not response.ok:
+                        error = 'http'
+                        print(f"Erro da API BaratoSocial: {response.status_code} - {response.text}")
+                        if response.status_code >= 500:
+                            body = response_json if isinstance(response_json, dict) else {}
+                            return {'error': f'HTTP {response.status_code}', **body, TRANSPORT_ERROR: True}
+                    elif isinstance(response_json, dict) and 'error' in response_json:
+                        error = 'api'
+                    return response_json
+
+                except requests.exceptions.RequestException as e:
+                    if attempt < retries:
+                        attempt += 1
+                        time.sleep(random.uniform(0, RETRY_BACKOFF * (2 ** attempt)))
+                        continue
+                    error = 'connection'
+                    print(f"Erro de conexão com a API BaratoSocial: {e}")
+                    return {'error': 'Erro de conexão com o fornecedor de serviços.', TRANSPORT_ERROR: True}
+                except ValueError:
+                    error = 'invalid'
+                    print(f"Resposta inválida (não-JSON) da API BaratoSocial: {response.text}")
+                    return {'error': 'O fornecedor de serviços retornou uma resposta vazia ou inválida.',
+                            TRANSPORT_ERROR: True}
+        finally:
+            metrics.observe_upstream('barato_social', action, time.perf_counter() - started, error)
 
     # O resto das funções não precisa mudar
     def services(self):
@@ -54,7 +121,22 @@ class BaratoSocialAPI:
     def balance(self):
         post_data = {'action': 'balance'}
         return self._make_request(post_data)
-    
+
     def order(self, data):
         post_data = {'action': 'add', **data}
         return self._make_request(post_data)
+
+    def status(self, order_id):
+        post_data = {'action': 'status', 'order': order_id}
+        return self._make_request(post_data)
+
+    def multi_status(self, order_ids):
+        """
+        Consulta o status de até MAX_STATUS_IDS pedidos em uma única chamada.
+        Retorna um dict {'<id>': {'status': ..., 'start_count': ..., ...}};
+        IDs desconhecidos vêm com {'error': ...}.
+        """
+        if len(order_ids) > MAX_STATUS_IDS:
+            raise ValueError(f"No máximo {MAX_STATUS_IDS} pedidos por consulta de status.")
+        post_data = {'action': 'status', 'orders': ','.join(str(order_id) for order_id in order_ids)}
+        return self._make_request(post_data)
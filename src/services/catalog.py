@@ -0,0 +1,135 @@
+# Arquivo: src/services/catalog.py
+# Snapshot do catálogo por worker.
+# O catálogo só muda na sincronização, ao ativar/desativar um serviço ou quando
+# os preços são recalculados (regras de preço, profit_margin). Em vez de
+# consultar e serializar todos os serviços a cada requisição, cada worker guarda
+# o JSON pronto (com ETag), índices em memória e o índice de busca,
+# reconstruídos apenas quando a versão do catálogo muda.
+# Os preços vêm prontos da tabela service_price (ver src/services/pricing.py).
+
+import hashlib
+import os
+import threading
+import time
+
+from flask import current_app
+
+from src.config import bump_version, read_version
+from src.models.user import Service
+from src.services.pricing import load_prices, load_rules
+from src.services.search import ServiceSearchIndex
+
+CATALOG_VERSION_KEY = '_catalog_version'
+# Tempo (em segundos) entre checagens do contador de versão no banco.
+CATALOG_CACHE_TTL = float(os.environ.get('CATALOG_CACHE_TTL', '5'))
+
+
+def _etag(body):
+    return hashlib.sha1(body).hexdigest()
+
+
+class CatalogSnapshot:
+    """Catálogo pré-serializado; imutável depois de construído."""
+
+    def __init__(self, services, prices, version):
+        self.version = version
+
+        # Índices em memória: por id interno (detalhes) e por id do fornecedor (pedidos).
+        self.by_id = {}
+        for service in services:
+            entry = service.to_dict()
+            tiers = prices[service.service_id]
+            entry['final_rate'] = tiers[0][1]
+            entry['price_tiers'] = [{'min_quantity': max(quantity, service.min), 'final_rate': final_rate}
+                                    for quantity, final_rate in tiers]
+            self.by_id[service.id] = entry
+        self.by_service_id = {entry['service_id']: entry for entry in self.by_id.values() if entry['is_active']}
+
+        self.active = [entry for entry in self.by_id.values() if entry['is_active']]
+        self.categories = sorted({entry['category'] for entry in self.active if entry['category']})
+
+        self.services_json = current_app.json.dumps(self.active).encode()
+        self.services_etag = _etag(self.services_json)
+        self.categories_json = current_app.json.dumps(self.categories).encode()
+        self.categories_etag = _etag(self.categories_json)
+
+        self._detail_cache = {}
+        self._search_index = None
+        # Variantes codificadas (MessagePack, gzip, brotli), ver src/encoding.py.
+        self.encoded = {}
+
+    @property
+    def search_index(self):
+        """Índice de busca dos serviços ativos (construído na primeira busca)."""
+        if self._search_index is None:
+            self._search_index = ServiceSearchIndex(self.active)
+        return self._search_index
+
+    def detail(self, service_pk):
+        """JSON e ETag de um serviço (serializado na primeira vez que for pedido)."""
+        cached = self._detail_cache.get(service_pk)
+        if cached is None:
+            entry = self.by_id.get(service_pk)
+            if entry is None:
+                return None
+            body = current_app.json.dumps(entry).encode()
+            cached = self._detail_cache[service_pk] = (body, _etag(body))
+        return cached
+
+
+_lock = threading.Lock()
+_state = {'snapshot': None, 'checked_at': 0.0}
+
+
+def bump_catalog_version():
+    """Sinaliza a todos os workers que o catálogo mudou (commit a cargo de quem chamou)."""
+    bump_version(CATALOG_VERSION_KEY)
+
+
+def invalidate_catalog():
+    """Descarta o snapshot deste worker; a próxima leitura reconstrói do banco."""
+    with _lock:
+        _state['snapshot'] = None
+        _state['checked_at'] = 0.0
+
+
+def _load_prices(services):
+    """
+    Preços da tabela service_price. Serviços ainda sem preço (tabela nunca
+    calculada, serviço criado fora da sincronização) são precificados em
+    memória com as mesmas regras, até o próximo reprice_all().
+    """
+    prices = load_prices()
+    missing = [service for service in services if service.service_id not in prices]
+    if missing:
+        compiled = load_rules()
+        for service in missing:
+            prices[service.service_id] = [
+                (quantity, final_rate) for quantity, _, final_rate
+                in compiled.tiers(service.service_id, service.rate, service.category, service.min, service.max)
+            ]
+    return prices
+
+
+def get_catalog():
+    """
+    Retorna o snapshot atual deste worker, reconstruindo-o se a versão do
+    catálogo mudou.
+    """
+    now = time.monotonic()
+    snapshot = _state['snapshot']
+    if snapshot is not None and now - _state['checked_at'] < CATALOG_CACHE_TTL:
+        return snapshot
+
+    version = read_version(CATALOG_VERSION_KEY)
+    if snapshot is not None and snapshot.version == version:
+        with _lock:
+            _state['checked_at'] = now
+        return snapshot
+
+    services = Service.query.order_by(Service.id).all()
+    snapshot = CatalogSnapshot(services, _load_prices(services), version)
+    with _lock:
+        _state['snapshot'] = snapshot
+        _state['checked_at'] = now
+    return snapshot
@@ -0,0 +1,111 @@
+# Arquivo: src/services/catalog_sync.py
+# Sincronização do catálogo do BaratoSocial com a tabela Service.
+# Carrega os serviços existentes em UMA query, compara cada registro do
+# fornecedor por "impressão digital" e grava em lote só o que mudou.
+# Se algo mudou, a tabela de preços é recalculada na mesma transação.
+# Serviços que sumiram do fornecedor são desativados com a marca
+# deactivated_by_sync e reativados quando voltam; os desativados por um admin
+# (toggle) continuam desativados. Um registro inválido mas com ID reconhecível
+# não desativa o serviço existente: ele só deixa de ser atualizado nesta rodada.
+
+from datetime import datetime
+
+from sqlalchemy import insert, update
+
+from src.models.user import Service, db
+from src.services.pricing import reprice_all
+
+# Campos copiados do fornecedor; a descrição só entra quando o fornecedor a envia.
+SYNC_FIELDS = ('name', 'type', 'rate', 'min', 'max', 'category')
+
+
+def _normalize(service_data):
+    """Converte um registro da API para os tipos da tabela Service."""
+    record = {
+        'service_id': int(service_data['service']),
+        'name': service_data['name'],
+        'type': service_data['type'],
+        'rate': float(service_data['rate']),
+        'min': int(service_data['min']),
+        'max': int(service_data['max']),
+        'category': service_data.get('category', '') or '',
+    }
+    if service_data.get('description'):
+        record['description'] = service_data['description']
+    return record
+
+
+def _fingerprint(values, fields):
+    return tuple(values[field] for field in fields)
+
+
+def sync_catalog(services_data, deactivate_missing=True):
+    """
+    Aplica a lista de serviços do fornecedor ao banco.
+    Retorna as contagens {'added', 'changed', 'unchanged', 'removed', 'reactivated', 'invalid'};
+    reativações também contam em 'changed'.
+    Não faz commit: quem chama decide a transação.
+    """
+    existing = {
+        row.service_id: row
+        for row in db.session.query(Service.id, Service.service_id, Service.is_active, Service.deactivated_by_sync,
+                                    Service.description, *(getattr(Service, field) for field in SYNC_FIELDS))
+    }
+
+    now = datetime.utcnow()
+    inserts, updates, seen, invalid_ids = [], [], set(), set()
+    counts = {'added': 0, 'changed': 0, 'unchanged': 0, 'removed': 0, 'reactivated': 0, 'invalid': 0}
+
+    for service_data in services_data:
+        try:
+            record = _normalize(service_data)
+        except (KeyError, TypeError, ValueError):
+            counts['invalid'] += 1
+            # Ainda existe no fornecedor: não desativa o serviço que já temos.
+            try:
+                invalid_ids.add(int(service_data['service']))
+            except (KeyError, TypeError, ValueError):
+                pass
+            continue
+        if record['service_id'] in seen:
+            continue
+        seen.add(record['service_id'])
+
+        current = existing.get(record['service_id'])
+        if current is None:
+            inserts.append({**record, 'is_active': True, 'deactivated_by_sync': False, 'updated_at': now})
+            continue
+
+        fields = SYNC_FIELDS + (('description',) if 'description' in record else ())
+        reactivate = not current.is_active and current.deactivated_by_sync
+        if reactivate:
+            counts['reactivated'] += 1
+            updates.append({**record, 'id': current.id, 'is_active': True, 'deactivated_by_sync': False,
+                            'updated_at': now})
+        elif _fingerprint(record, fields) == _fingerprint(current._mapping, fields):
+            counts['unchanged'] += 1
+        else:
+            updates.append({**record, 'id': current.id, 'updated_at': now})
+
+    removed_ids = []
+    if deactivate_missing:
+        removed_ids = [row.id for service_id, row in existing.items()
+                       if service_id not in seen and service_id not in invalid_ids and row.is_active]
+
+    if inserts:
+        db.session.execute(insert(Service), inserts)
+    if updates:
+        db.session.execute(update(Service), updates)
+    if removed_ids:
+        db.session.execute(
+            update(Service).where(Service.id.in_(removed_ids))
+            .values(is_active=False, deactivated_by_sync=True, updated_at=now),
+            execution_options={'synchronize_session': False}
+        )
+
+    counts['added'] = len(inserts)
+    counts['changed'] = len(updates)
+    counts['removed'] = len(removed_ids)
+    if inserts or updates:
+        reprice_all()
+    return counts
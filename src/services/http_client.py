@@ -0,0 +1,79 @@
+# Arquivo: src/services/http_client.py
+# Sessões HTTP compartilhadas por worker (fornecedor e Mercado Pago).
+# Cada cliente tem seu pool de conexões keep-alive com limite de tamanho.
+# No modo assíncrono (gevent) o pool é maior e bloqueante: centenas de
+# chamadas podem estar em andamento, mas nunca mais conexões abertas que o
+# limite; as excedentes esperam (cooperativamente) uma conexão livre.
+
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.async_mode import is_async
+
+ASYNC_POOL_MAXSIZE = int(os.environ.get('HTTP_ASYNC_POOL_MAXSIZE', '100'))
+
+_lock = threading.Lock()
+_sessions = {}
+_sessions_pid = None
+
+
+def pool_maxsize(default):
+    """Tamanho do pool: `default` no modo síncrono, HTTP_ASYNC_POOL_MAXSIZE no assíncrono."""
+    return ASYNC_POOL_MAXSIZE if is_async() else default
+
+
+def get_session(name, maxsize):
+    """
+    Retorna a sessão HTTP `name` deste worker.
+    As sessões são recriadas após um fork (gunicorn) para não dividir sockets entre processos.
+    """
+    global _sessions_pid
+    pid = os.getpid()
+    session = _sessions.get(name)
+    if session is not None and _sessions_pid == pid:
+        return session
+    with _lock:
+        if _sessions_pid != pid:
+            _sessions.clear()
+            _sessions_pid = pid
+        session = _sessions.get(name)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize(maxsize),
+                                  pool_block=is_async(), max_retries=0)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _sessions[name] = session
+    return session
+
+
+def session_names():
+    """Nomes das sessões já criadas neste worker."""
+    return list(_sessions) if _sessions_pid == os.getpid() else []
+
+
+def pool_stats(name):
+    """
+    Contadores do pool `name` deste worker: 'hits' são requisições que reaproveitaram
+    uma conexão aberta, 'misses' são conexões novas (TCP + TLS).
+    """
+    session = _sessions.get(name)
+    if session is None or _sessions_pid != os.getpid():
+        return {'requests': 0, 'hits': 0, 'misses': 0}
+    total_requests, new_connections = 0, 0
+    for adapter in set(session.adapters.values()):
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            total_requests += pool.num_requests
+            new_connections += pool.num_connections
+    return {
+        'requests': total_requests,
+        'hits': max(total_requests - new_connections, 0),
+        'misses': new_connections,
+    }
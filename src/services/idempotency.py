@@ -0,0 +1,264 @@
+# Arquivo: src/services/idempotency.py
+# Chaves de idempotência (cabeçalho Idempotency-Key) para rotas que criam coisas
+# (pedidos, pagamentos). A primeira requisição com uma chave a reserva, roda e,
+# se der certo (2xx), tem a resposta guardada por IDEMPOTENCY_TTL segundos;
+# repetições com a mesma chave recebem essa resposta sem rodar a rota de novo
+# (sem pedido duplicado, sem segunda chamada ao fornecedor ou ao Mercado Pago).
+# Erros 4xx (validação, saldo insuficiente) são recusados antes de gravar
+# qualquer coisa: a chave é liberada e o cliente pode repetir. Erros 5xx e
+# exceções podem ter acontecido depois de efeitos já gravados, então a chave
+# guarda o 500 até o TTL e uma repetição nunca cria um segundo pedido.
+#
+# Backends (IDEMPOTENCY_BACKEND), como no limitador de requisições:
+# - database (padrão): tabela idempotency_key (`flask db-upgrade`); vale para
+#   todos os workers e instâncias.
+# - memory: dict por worker; só protege repetições que caem no mesmo worker.
+# - redis: script Lua atômico em REDIS_URL; requer o pacote `redis`.
+# Se o backend falhar, a requisição roda sem proteção (e o Mercado Pago ainda
+# recebe a chave no X-Idempotency-Key).
+
+import hashlib
+import os
+import random
+import threading
+import time
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+
+from src.models.user import IdempotencyKey, db
+
+IDEMPOTENCY_BACKEND = os.environ.get('IDEMPOTENCY_BACKEND', 'database').lower()
+IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', '86400'))
+# Uma reserva (requisição em andamento) vale pelo TTL inteiro. Passado este
+# tempo sem resposta guardada, a requisição original morreu no meio (worker
+# morto pelo timeout do gunicorn, deploy): o resultado é desconhecido e a chave
+# NÃO volta a valer; repetições recebem 'interrupted'. Deve ser maior que a rota
+# mais lenta: o timeout do worker (30 s) e o do Mercado Pago (10 s) em create_payment.
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.environ.get('IDEMPOTENCY_LOCK_TIMEOUT', '300'))
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+
+KEY_MAX_LENGTH = 255
+MEMORY_MAX_KEYS = 100_000
+
+# Resultados de begin()
+NEW = 'new'              # chave reservada: rode a rota e chame finish() ou abandon()
+REPLAY = 'replay'        # já concluída: devolva a resposta guardada
+IN_PROGRESS = 'in_progress'  # outra requisição com a mesma chave ainda está rodando
+INTERRUPTED = 'interrupted'  # a requisição original morreu sem resposta: resultado desconhecido
+MISMATCH = 'mismatch'    # mesma chave com outro corpo/rota
+
+
+def fingerprint(method, path, body, files=()):
+    """
+    sha256 do que identifica a requisição. Uploads entram pelo conteúdo (nome
+    do campo, nome e bytes do arquivo), não pelo corpo multipart, cujo
+    separador muda a cada envio.
+    """
+    digest = hashlib.sha256(f'{method} {path}\n'.encode())
+    digest.update(body)
+    for field, filename, content in files:
+        digest.update(f'\n{field}:{filename}:'.encode())
+        digest.update(content)
+    return digest.hexdigest()
+
+
+class MemoryBackend:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = {}  # chave -> [fingerprint, status, content_type, body, expira_em]
+
+    def begin(self, key, fingerprint):
+        now = time.time()
+        with self._lock:
+            entry = self._keys.get(key)
+            if entry is None or entry[4] < now:
+                self._keys[key] = [fingerprint, None, None, None, now + IDEMPOTENCY_TTL]
+                if len(self._keys) > MEMORY_MAX_KEYS:
+                    self._prune(now)
+                return NEW, None
+        return _state(entry[0], fingerprint, entry[1], entry[2], entry[3], entry[4] - IDEMPOTENCY_TTL)
+
+    def finish(self, key, fingerprint, status_code, content_type, body):
+        with self._lock:
+            self._keys[key] = [fingerprint, status_code, content_type, body, time.time() + IDEMPOTENCY_TTL]
+
+    def abandon(self, key):
+        with self._lock:
+            entry = self._keys.get(key)
+            if entry is not None and entry[1] is None:
+                del self._keys[key]
+
+    def _prune(self, now):
+        for key in [key for key, entry in self._keys.items() if entry[4] < now]:
+            del self._keys[key]
+
+    def reset(self):
+        with self._lock:
+            self._keys.clear()
+
+
+class DatabaseBackend:
+    def begin(self, key, fingerprint):
+        table = IdempotencyKey.__table__
+        now = time.time()
+        with db.engine.begin() as conn:
+            # Chave vencida (passou do TTL) vale como nova.
+            conn.execute(table.delete().where(table.c.key == key, table.c.expires_at < now))
+            if self._insert(conn, {'key': key, 'fingerprint': fingerprint, 'expires_at': now + IDEMPOTENCY_TTL}):
+                if random.random() < 0.001:
+                    conn.execute(table.delete().where(table.c.expires_at < now))
+                return NEW, None
+            row = conn.execute(select(table.c.fingerprint, table.c.status_code, table.c.content_type, table.c.body,
+                                      table.c.expires_at).where(table.c.key == key)).first()
+        if row is None:  # apagada entre o INSERT e o SELECT: a outra requisição terminou com 4xx
+            return self.begin(key, fingerprint)
+        # Enquanto reservada, expires_at = início + TTL.
+        return _state(row.fingerprint, fingerprint, row.status_code, row.content_type, row.body,
+                      row.expires_at - IDEMPOTENCY_TTL)
+
+    def finish(self, key, fingerprint, status_code, content_type, body):
+        table = IdempotencyKey.__table__
+        with db.engine.begin() as conn:
+            conn.execute(table.update().where(table.c.key == key, table.c.fingerprint == fingerprint)
+                         .values(status_code=status_code, content_type=content_type, body=body,
+                                 expires_at=time.time() + IDEMPOTENCY_TTL))
+
+    def abandon(self, key):
+        table = IdempotencyKey.__table__
+        with db.engine.begin() as conn:
+            conn.execute(table.delete().where(table.c.key == key, table.c.status_code.is_(None)))
+
+    @staticmethod
+    def _insert(conn, values):
+        table = IdempotencyKey.__table__
+        dialect = conn.dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            insert = pg_insert if dialect == 'postgresql' else sqlite_insert
+            return conn.execute(insert(table).values(**values).on_conflict_do_nothing()).rowcount == 1
+        # Outros bancos: INSERT simples; se outra requisição reservou antes, a chave primária recusa.
+        with conn.begin_nested():
+            try:
+                conn.execute(table.insert().values(**values))
+            except IntegrityError:
+                return False
+        return True
+
+    def reset(self):
+        with db.engine.begin() as conn:
+            conn.execute(IdempotencyKey.__table__.delete())
+
+
+# KEYS[1] = chave; ARGV = fingerprint, TTL (ms), agora (segundos). Reserva a chave ou devolve o que está guardado.
+_REDIS_BEGIN = """
+if redis.call('HSETNX', KEYS[1], 'fp', ARGV[1]) == 1 then
+  redis.call('HSET', KEYS[1], 'started', ARGV[3])
+  redis.call('PEXPIRE', KEYS[1], ARGV[2])
+  return false
+end
+return redis.call('HMGET', KEYS[1], 'fp', 'status', 'ctype', 'body', 'started')
+"""
+
+
+class RedisBackend:
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("IDEMPOTENCY_BACKEND=redis requer o pacote 'redis'")
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self._begin = self._client.register_script(_REDIS_BEGIN)
+
+    def begin(self, key, fingerprint):
+        stored = self._begin(keys=[f'idempotency:{key}'], args=[fingerprint, IDEMPOTENCY_TTL * 1000, time.time()])
+        if not stored:
+            return NEW, None
+        stored_fingerprint, status_code, content_type, body, started_at = stored
+        return _state(stored_fingerprint.decode(), fingerprint, int(status_code) if status_code else None,
+                      content_type.decode() if content_type else None, body, float(started_at or 0))
+
+    def finish(self, key, fingerprint, status_code, content_type, body):
+        name = f'idempotency:{key}'
+        pipeline = self._client.pipeline()
+        pipeline.hset(name, mapping={'fp': fingerprint, 'status': status_code,
+                                     'ctype': content_type or '', 'body': body})
+        pipeline.expire(name, IDEMPOTENCY_TTL)
+        pipeline.execute()
+
+    def abandon(self, key):
+        name = f'idempotency:{key}'
+        if not self._client.hexists(name, 'status'):
+            self._client.delete(name)
+
+    def reset(self):
+        for key in self._client.scan_iter('idempotency:*'):
+            self._client.delete(key)
+
+
+def _state(stored_fingerprint, fingerprint, status_code, content_type, body, started_at):
+    if stored_fingerprint != fingerprint:
+        return MISMATCH, None
+    if status_code is None:
+        return (INTERRUPTED if time.time() - started_at > IDEMPOTENCY_LOCK_TIMEOUT else IN_PROGRESS), None
+    return REPLAY, (status_code, content_type, body)
+
+
+_backend_lock = threading.Lock()
+_backend = {'instance': None, 'pid': None, 'error_logged_at': 0.0}
+
+
+def get_backend():
+    """Backend configurado, criado uma vez por processo (o Redis não sobrevive a um fork)."""
+    pid = os.getpid()
+    if _backend['instance'] is None or _backend['pid'] != pid:
+        with _backend_lock:
+            if _backend['instance'] is None or _backend['pid'] != pid:
+                if IDEMPOTENCY_BACKEND == 'memory':
+                    instance = MemoryBackend()
+                elif IDEMPOTENCY_BACKEND == 'redis':
+                    instance = RedisBackend(REDIS_URL)
+                else:
+                    instance = DatabaseBackend()
+                _backend['instance'], _backend['pid'] = instance, pid
+    return _backend['instance']
+
+
+def _log_failure(e):
+    # No máximo uma linha de log por minuto enquanto o backend estiver fora.
+    if time.monotonic() - _backend['error_logged_at'] > 60:
+        _backend['error_logged_at'] = time.monotonic()
+        print(f"Armazenamento de chaves de idempotência indisponível ({IDEMPOTENCY_BACKEND}): {e}")
+
+
+def begin(key, fingerprint):
+    """
+    Reserva `key` para esta requisição. Retorna (estado, resposta guardada),
+    com a resposta (status, content_type, corpo) só no estado REPLAY.
+    Falhas do backend liberam a requisição (estado NEW).
+    """
+    try:
+        return get_backend().begin(key, fingerprint)
+    except Exception as e:
+        _log_failure(e)
+        return NEW, None
+
+
+def finish(key, fingerprint, status_code, content_type, body):
+    """Guarda a resposta de uma requisição concluída com sucesso."""
+    try:
+        get_backend().finish(key, fingerprint, status_code, content_type, body)
+    except Exception as e:
+        _log_failure(e)
+
+
+def abandon(key):
+    """
+    Libera a reserva de uma requisição recusada sem efeitos (4xx), para o
+    cliente poder repetir. Nunca use depois de algo ter sido gravado.
+    """
+    try:
+        get_backend().abandon(key)
+    except Exception as e:
+        _log_failure(e)
@@ -1,22 +1,34 @@
 # Arquivo: src/services/mercado_pago.py (Versão com Idempotency-Key)
 
+import os
+import time
 import requests
 import uuid # <-- IMPORTA A BIBLIOTECA PARA GERAR IDs ÚNICOS
 from datetime import datetime, timedelta
 
+from src import metrics
+from src.services import http_client
+
+API_URL = os.environ.get('MP_API_URL', 'https://api.mercadopago.com')
+# Conexões keep-alive por worker (modo síncrono; ver http_client).
+POOL_MAXSIZE = int(os.environ.get('MP_POOL_MAXSIZE', '8'))
+# Marca nas respostas de erro em que não sabemos se o gateway processou a chamada
+# (conexão caiu, timeout, HTTP 5xx, resposta ilegível): num POST, o PIX pode existir.
+TRANSPORT_ERROR = 'transport_error'
+
 class MercadoPagoAPI:
     def __init__(self, access_token, public_key=None):
         if not access_token:
             raise ValueError("Access Token do Mercado Pago é obrigatório.")
         self.access_token = access_token
         self.public_key = public_key
-        self.base_url = 'https://api.mercadopago.com'
+        self.base_url = API_URL
         self.base_headers = {
             'Authorization': f'Bearer {self.access_token}',
             'Content-Type': 'application/json'
         }
 
-    def _make_request(self, method, endpoint, json_data=None, idempotency_key=None ):
+    def _make_request(self, method, endpoint, json_data=None, idempotency_key=None, params=None):
         """Função auxiliar para fazer requisições e tratar erros de forma centralizada."""
         url = f"{self.base_url}{endpoint}"
         
@@ -25,26 +37,41 @@ class MercadoPagoAPI:
         if idempotency_key:
             headers['X-Idempotency-Key'] = idempotency_key
 
+        session = http_client.get_session('mercado_pago', POOL_MAXSIZE)
+        started = time.perf_counter()
+        error = None
         try:
             if method.upper() == 'POST':
-                response = requests.post(url, headers=headers, json=json_data, timeout=10)
+                response = session.post(url, headers=headers, json=json_data, timeout=10)
             else: # GET
-                response = requests.get(url, headers=headers, timeout=10)
+                response = session.get(url, headers=headers, params=params, timeout=10)
 
             response_json = response.json()
             if not response.ok:
+                error = 'http'
                 print(f"Erro da API Mercado Pago: {response.status_code} - {response.text}")
+                if response.status_code >= 500:
+                    body = response_json if isinstance(response_json, dict) else {}
+                    return {'error': f'HTTP {response.status_code}', **body, TRANSPORT_ERROR: True}
             return response_json
 
         except requests.exceptions.RequestException as e:
+            error = 'connection'
             print(f"Erro de conexão com a API Mercado Pago: {e}")
-            return {'error': 'Erro de conexão com o gateway de pagamento.'}
+            return {'error': 'Erro de conexão com o gateway de pagamento.', TRANSPORT_ERROR: True}
         except ValueError:
+            error = 'invalid'
             print(f"Resposta inválida (não-JSON) da API Mercado Pago: {response.text}")
-            return {'error': 'Resposta inválida do gateway de pagamento.'}
+            return {'error': 'Resposta inválida do gateway de pagamento.', TRANSPORT_ERROR: True}
+        finally:
+            metrics.observe_upstream('mercado_pago', metrics.path_action(method, endpoint),
+                                     time.perf_counter() - started, error)
 
-    def create_payment(self, amount, description, payer_info, external_reference=None):
-        """Criar pagamento via PIX."""
+    def create_payment(self, amount, description, payer_info, external_reference=None, idempotency_key=None):
+        """
+        Criar pagamento via PIX. `idempotency_key` (ex.: a Idempotency-Key do
+        cliente) vai no X-Idempotency-Key; sem ela, cada chamada gera uma nova.
+        """
         expiration_date = datetime.utcnow() + timedelta(minutes=30)
         payment_data = {
             "transaction_amount": float(amount),
@@ -56,8 +83,8 @@ class MercadoPagoAPI:
         if external_reference:
             payment_data["external_reference"] = str(external_reference)
         
-        # Gera uma chave de idempotência única para esta transação
-        idempotency_key = str(uuid.uuid4())
+        # Sem chave do cliente, gera uma única para esta transação
+        idempotency_key = idempotency_key or str(uuid.uuid4())
         
         return self._make_request('POST', '/v1/payments', json_data=payment_data, idempotency_key=idempotency_key)
 
@@ -65,6 +92,24 @@ class MercadoPagoAPI:
     def get_payment(self, payment_id):
         return self._make_request('GET', f'/v1/payments/{payment_id}')
 
+    def search_payments(self, begin_date, end_date, external_reference=None, offset=0, limit=100):
+        """
+        Uma página da busca de pagamentos criados entre begin_date e end_date
+        (datetimes UTC). Resposta: {'paging': {'total', 'offset', 'limit'}, 'results': [...]}.
+        """
+        params = {
+            'range': 'date_created',
+            'begin_date': begin_date.isoformat(timespec='milliseconds') + 'Z',
+            'end_date': end_date.isoformat(timespec='milliseconds') + 'Z',
+            'sort': 'date_created',
+            'criteria': 'asc',
+            'offset': offset,
+            'limit': limit,
+        }
+        if external_reference:
+            params['external_reference'] = str(external_reference)
+        return self._make_request('GET', '/v1/payments/search', params=params)
+
     def create_preference(self, items, back_urls=None, external_reference=None):
         preference_data = {"items": items, "payment_methods": {"installments": 1}, "auto_return": "approved"}
         if back_urls:
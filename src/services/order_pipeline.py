@@ -0,0 +1,149 @@
+# Arquivo: src/services/order_pipeline.py
+# Envio assíncrono de pedidos ao BaratoSocial.
+# O endpoint só reserva o valor e grava o pedido como 'Queued' + uma linha em
+# order_outbox; este módulo (rodando no `flask order-worker`) drena a fila,
+# enviando vários pedidos em paralelo ao fornecedor.
+
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from src.config import get_config
+from src.models.user import OrderOutbox, db
+from src.services.balance import capture, order_reference, release
+from src.services.rollups import record_order_refund
+
+ORDER_WORKER_CONCURRENCY = int(os.environ.get('ORDER_WORKER_CONCURRENCY', '8'))
+ORDER_WORKER_BATCH_SIZE = int(os.environ.get('ORDER_WORKER_BATCH_SIZE', '50'))
+# Tempo mínimo que um worker segura um lote reservado. O lease real cobre o pior
+# caso do lote: ceil(lote / concorrência) rodadas de envio, cada uma com os
+# timeouts de conexão + leitura do fornecedor (ver batch_lease_seconds).
+ORDER_LEASE_SECONDS = int(os.environ.get('ORDER_LEASE_SECONDS', '120'))
+# Folga para a gravação do resultado depois do último envio.
+ORDER_LEASE_MARGIN_SECONDS = 60
+
+
+def build_order_payload(order, comments=None):
+    """Monta os dados da ação 'add' do BaratoSocial para um pedido."""
+    payload = {'service': order.service_id, 'link': order.link, 'quantity': order.quantity}
+    if comments:
+        payload['comments'] = comments
+    return payload
+
+
+def submit_orders(api, payloads, max_workers=ORDER_WORKER_CONCURRENCY):
+    """
+    Envia vários pedidos ao fornecedor em paralelo (pool limitado de threads).
+    Retorna as respostas na mesma ordem dos payloads; falhas viram {'error': ...}
+    (com TRANSPORT_ERROR quando não se sabe se o fornecedor recebeu o pedido).
+    As threads só fazem HTTP: nenhuma delas toca a sessão do banco.
+    """
+    from src.services.barato_social import TRANSPORT_ERROR
+
+    def _submit(payload):
+        try:
+            return api.order(dict(payload))
+        except Exception as e:
+            return {'error': f'Erro ao enviar pedido: {str(e)}', TRANSPORT_ERROR: True}
+
+    if not payloads:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(payloads))) as executor:
+        return list(executor.map(_submit, payloads))
+
+
+def batch_lease_seconds(batch_size, concurrency):
+    """Lease que cobre o envio de um lote inteiro mesmo com todos os pedidos batendo no timeout."""
+    from src.services.barato_social import CONNECT_TIMEOUT, READ_TIMEOUT
+    rounds = math.ceil(batch_size / max(1, min(concurrency, batch_size)))
+    worst_case = rounds * (CONNECT_TIMEOUT + READ_TIMEOUT) + ORDER_LEASE_MARGIN_SECONDS
+    return max(ORDER_LEASE_SECONDS, math.ceil(worst_case))
+
+
+def _claim_batch(batch_size, lease_seconds):
+    """
+    Reserva até `batch_size` linhas livres da fila para este processo.
+    O UPDATE condicional impede que dois workers peguem a mesma linha.
+    """
+    now = datetime.utcnow()
+    lease = now + timedelta(seconds=lease_seconds)
+    candidate_ids = [row.id for row in db.session.query(OrderOutbox.id)
+                     .filter(OrderOutbox.locked_until.is_(None))
+                     .order_by(OrderOutbox.id).limit(batch_size)]
+
+    claimed = []
+    for outbox_id in candidate_ids:
+        updated = OrderOutbox.query.filter(
+            OrderOutbox.id == outbox_id,
+            OrderOutbox.locked_until.is_(None)
+        ).update({OrderOutbox.locked_until: lease, OrderOutbox.attempts: OrderOutbox.attempts + 1},
+                 synchronize_session=False)
+        if updated:
+            claimed.append(outbox_id)
+    db.session.commit()
+    return claimed
+
+
+def recover_stale_claims():
+    """
+    Linhas cuja reserva expirou pertenciam a um worker que morreu no meio do envio.
+    Não sabemos se o fornecedor recebeu o pedido, então NÃO reenviamos nem
+    estornamos: o pedido vai para 'Error' e a reserva continua 'held' até a
+    conferência manual (aparece em `flask reconcile-ledger`).
+    """
+    stale = OrderOutbox.query.filter(OrderOutbox.locked_until < datetime.utcnow()).all()
+    for entry in stale:
+        print(f"Pedido {entry.order_id} ficou sem confirmação do worker; marcado para conferência.")
+        entry.order.status = 'Error'
+        db.session.delete(entry)
+    if stale:
+        db.session.commit()
+    return len(stale)
+
+
+def process_queued_orders(batch_size=ORDER_WORKER_BATCH_SIZE, concurrency=ORDER_WORKER_CONCURRENCY):
+    """
+    Envia um lote de pedidos da fila ao fornecedor. Retorna quantos foram processados.
+    Sucesso: grava barato_order_id, status 'Pending' e confirma a reserva.
+    Recusa do fornecedor: status 'Failed' e a reserva volta ao saldo.
+    Resultado desconhecido (timeout, conexão, 5xx, resposta sem o ID do pedido):
+    o fornecedor pode ter aceitado, então o pedido vai para 'Error' e a reserva
+    continua 'held' até a conferência, como em recover_stale_claims.
+    """
+    api_key = get_config('barato_api_key')
+    if not api_key:
+        print("Pedidos na fila, mas a API BaratoSocial não está configurada.")
+        return 0
+
+    claimed_ids = _claim_batch(batch_size, batch_lease_seconds(batch_size, concurrency))
+    if not claimed_ids:
+        return 0
+
+    entries = OrderOutbox.query.filter(OrderOutbox.id.in_(claimed_ids)).order_by(OrderOutbox.id).all()
+    payloads = [build_order_payload(entry.order, entry.comments) for entry in entries]
+    from src.services.barato_social import TRANSPORT_ERROR, BaratoSocialAPI
+    responses = submit_orders(BaratoSocialAPI(api_key), payloads, concurrency)
+
+    for entry, api_response in zip(entries, responses):
+        order = entry.order
+        # DELETE condicional: se recover_stale_claims já removeu a linha (e marcou o
+        # pedido 'Error'), o resultado do fornecedor ainda vale e corrige o pedido;
+        # capture/release só agem sobre reservas ainda 'held'.
+        if not OrderOutbox.query.filter(OrderOutbox.id == entry.id).delete(synchronize_session=False):
+            print(f"Pedido {order.id} foi recuperado por outro worker durante o envio; gravando o resultado.")
+        if api_response.get('order') and 'error' not in api_response:
+            order.barato_order_id = api_response.get('order')
+            order.status = 'Pending'
+            capture(order_reference(order.id))
+        elif 'error' in api_response and not api_response.get(TRANSPORT_ERROR):
+            print(f"Pedido {order.id} recusado pelo fornecedor: {api_response.get('error')}")
+            order.status = 'Failed'
+            if release(order_reference(order.id)):
+                record_order_refund(order)
+        else:
+            print(f"Pedido {order.id} sem confirmação do fornecedor ({api_response.get('error')}); "
+                  f"marcado para conferência.")
+            order.status = 'Error'
+    db.session.commit()
+    return len(entries)
@@ -0,0 +1,100 @@
+# Arquivo: src/services/order_status.py
+# Atualização periódica do status dos pedidos abertos.
+# Usa a consulta em lote do BaratoSocial (até 100 pedidos por chamada) e só
+# grava as linhas que realmente mudaram, em um UPDATE em lote.
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from src.config import get_config
+from src.models.user import Order, db
+from src.services.barato_social import BaratoSocialAPI, MAX_STATUS_IDS
+
+# Status em que o pedido não muda mais no fornecedor (ou nunca chegou lá).
+FINAL_STATUSES = {'Completed', 'Partial', 'Canceled', 'Refunded', 'Failed', 'Error'}
+# Pedidos ainda no nosso lado (fila/envio) não têm barato_order_id para consultar.
+LOCAL_STATUSES = {'Queued'}
+
+STATUS_REFRESH_CONCURRENCY = int(os.environ.get('STATUS_REFRESH_CONCURRENCY', '4'))
+# Pedidos muito recentes quase nunca mudaram ainda; pulamos para economizar chamadas.
+STATUS_REFRESH_MIN_AGE = int(os.environ.get('STATUS_REFRESH_MIN_AGE_SECONDS', '120'))
+
+
+def _parse_int(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _fetch_statuses(api, chunks, concurrency):
+    def _query(chunk):
+        try:
+            response = api.multi_status([barato_id for _, barato_id, _, _ in chunk])
+        except Exception as e:
+            response = {'error': str(e)}
+        return chunk, response
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(chunks)))) as executor:
+        return list(executor.map(_query, chunks))
+
+
+def refresh_open_orders(concurrency=STATUS_REFRESH_CONCURRENCY, min_age_seconds=STATUS_REFRESH_MIN_AGE):
+    """
+    Percorre todos os pedidos não finalizados (do mais antigo para o mais novo,
+    paginando por id) e atualiza status/start_count dos que mudaram.
+    Retorna um resumo com pedidos consultados, chamadas feitas e linhas alteradas.
+    """
+    summary = {'checked': 0, 'calls': 0, 'changed': 0, 'errors': 0}
+    api_key = get_config('barato_api_key')
+    if not api_key:
+        print("Atualização de status ignorada: API BaratoSocial não configurada.")
+        return summary
+    api = BaratoSocialAPI(api_key)
+
+    cutoff = datetime.utcnow() - timedelta(seconds=min_age_seconds)
+    page_size = MAX_STATUS_IDS * max(1, concurrency)
+    last_id = 0
+    while True:
+        rows = db.session.query(Order.id, Order.barato_order_id, Order.status, Order.start_count).filter(
+            Order.id > last_id,
+            Order.barato_order_id.isnot(None),
+            Order.status.notin_(FINAL_STATUSES | LOCAL_STATUSES),
+            Order.created_at <= cutoff
+        ).order_by(Order.id).limit(page_size).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        chunks = [rows[i:i + MAX_STATUS_IDS] for i in range(0, len(rows), MAX_STATUS_IDS)]
+        now = datetime.utcnow()
+        changes = []
+        for chunk, response in _fetch_statuses(api, chunks, concurrency):
+            summary['calls'] += 1
+            summary['checked'] += len(chunk)
+            if not isinstance(response, dict) or 'error' in response:
+                summary['errors'] += len(chunk)
+                continue
+            for order_id, barato_id, status, start_count in chunk:
+                info = response.get(str(barato_id))
+                if not isinstance(info, dict) or 'error' in info or not info.get('status'):
+                    summary['errors'] += 1
+                    continue
+                new_start_count = _parse_int(info.get('start_count'))
+                if new_start_count is None:
+                    new_start_count = start_count
+                if info['status'] != status or new_start_count != start_count:
+                    changes.append({'id': order_id, 'status': info['status'],
+                                    'start_count': new_start_count, 'updated_at': now})
+
+        if changes:
+            db.session.execute(update(Order), changes)
+            summary['changed'] += len(changes)
+        db.session.commit()
+
+        if len(rows) < page_size:
+            break
+    return summary
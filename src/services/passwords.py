@@ -0,0 +1,82 @@
+# Arquivo: src/services/passwords.py
+# Política de hash de senhas.
+# O custo do hash é configurável (PASSWORD_HASH_METHOD, no formato do Werkzeug,
+# ex.: 'scrypt:32768:8:1' ou 'pbkdf2:sha256:600000'); hashes antigos são
+# refeitos no login. O cálculo roda em um pool limitado de threads (scrypt e
+# pbkdf2 liberam o GIL), para que uma avalanche de logins não ocupe todas as
+# threads do worker (no modo assíncrono, threads reais fora do loop do gevent).
+
+import os
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from src.async_mode import native_thread_pool
+
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+# Hashes calculados ao mesmo tempo por worker (por padrão, um por núcleo).
+PASSWORD_HASH_CONCURRENCY = int(os.environ.get('PASSWORD_HASH_CONCURRENCY', str(os.cpu_count() or 1)))
+# Requisições que podem aguardar na fila antes de recusarmos com 503.
+PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', str(PASSWORD_HASH_CONCURRENCY * 4)))
+PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', '10'))
+
+
+class PasswordHashBusy(Exception):
+    """O pool de hash está saturado; o cliente deve tentar de novo mais tarde."""
+
+
+_lock = threading.Lock()
+_executor = None
+_executor_pid = None
+_slots = threading.BoundedSemaphore(PASSWORD_HASH_CONCURRENCY + PASSWORD_HASH_QUEUE)
+_method_prefixes = {}
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = native_thread_pool(PASSWORD_HASH_CONCURRENCY, thread_name_prefix='password-hash')
+                _executor_pid = pid
+    return _executor
+
+
+def _run(func, *args):
+    if not _slots.acquire(blocking=False):
+        raise PasswordHashBusy()
+    try:
+        future = _get_executor().submit(func, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    # A vaga só volta quando o hash termina: depois de um timeout ele continua
+    # rodando no pool e ainda ocupa uma thread.
+    future.add_done_callback(lambda _: _slots.release())
+    try:
+        return future.result(timeout=PASSWORD_HASH_TIMEOUT)
+    except FutureTimeoutError:
+        raise PasswordHashBusy()
+
+
+def _method_prefix(method):
+    """Prefixo que o Werkzeug grava no hash para um método (ex.: 'scrypt' -> 'scrypt:32768:8:1')."""
+    prefix = _method_prefixes.get(method)
+    if prefix is None:
+        prefix = _method_prefixes[method] = generate_password_hash('', method).split('$', 1)[0]
+    return prefix
+
+
+def hash_password(password, method=None):
+    return _run(generate_password_hash, password, method or PASSWORD_HASH_METHOD)
+
+
+def verify_password(password_hash, password):
+    return _run(check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash, method=None):
+    """True se o hash foi gerado com um custo diferente da política atual."""
+    return password_hash.split('$', 1)[0] != _method_prefix(method or PASSWORD_HASH_METHOD)
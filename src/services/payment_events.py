@@ -0,0 +1,174 @@
+# Arquivo: src/services/payment_events.py
+# Consumidor das notificações do Mercado Pago gravadas pelo webhook.
+# O webhook só grava o evento e responde 200; aqui os eventos são agrupados,
+# cada pagamento é consultado UMA vez no Mercado Pago e o saldo é creditado.
+# Se a consulta falhar (timeout, 5xx, 429), o evento continua 'received' e é
+# repetido com espera exponencial; só vira 'failed' depois de
+# PAYMENT_EVENTS_MAX_ATTEMPTS tentativas.
+
+import hashlib
+import hmac
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from src import metrics
+from src.config import get_config
+from src.models.user import Payment, PaymentEvent, db
+from src.services.balance import credit_approved_payment, mark_payment_status
+
+BATCH_SIZE = int(os.environ.get('PAYMENT_EVENTS_BATCH_SIZE', '100'))
+# Janela curta para juntar várias notificações antes de processar.
+BATCH_WINDOW = float(os.environ.get('PAYMENT_EVENTS_BATCH_WINDOW', '1'))
+# Intervalo de varredura quando ninguém acorda o consumidor (eventos de outros workers).
+POLL_INTERVAL = float(os.environ.get('PAYMENT_EVENTS_POLL_INTERVAL', '15'))
+# Repetição das consultas que falharam: RETRY_BASE segundos, dobrando a cada
+# tentativa, no máximo RETRY_MAX (8 tentativas ≈ 2h com os padrões).
+MAX_ATTEMPTS = int(os.environ.get('PAYMENT_EVENTS_MAX_ATTEMPTS', '8'))
+RETRY_BASE = int(os.environ.get('PAYMENT_EVENTS_RETRY_BASE_SECONDS', '30'))
+RETRY_MAX = int(os.environ.get('PAYMENT_EVENTS_RETRY_MAX_SECONDS', '3600'))
+# Desligue (0) quando rodar o consumidor separado: `flask process-payment-events`.
+INLINE_CONSUMER = os.environ.get('PAYMENT_EVENTS_INLINE', '1') == '1'
+
+FAILED_STATUSES = {'rejected', 'cancelled', 'refunded', 'charged_back'}
+
+
+def verify_signature(secret, signature_header, request_id, data_id):
+    """
+    Valida o cabeçalho x-signature ("ts=...,v1=...") do Mercado Pago.
+    O manifesto assinado é "id:<data.id>;request-id:<x-request-id>;ts:<ts>;".
+    """
+    if not secret or not signature_header:
+        return False
+    parts = {}
+    for item in signature_header.split(','):
+        key, _, value = item.strip().partition('=')
+        parts[key] = value
+    ts, received = parts.get('ts'), parts.get('v1')
+    if not ts or not received:
+        return False
+
+    manifest = ''
+    if data_id:
+        manifest += f'id:{str(data_id).lower()};'
+    if request_id:
+        manifest += f'request-id:{request_id};'
+    manifest += f'ts:{ts};'
+    expected = hmac.new(secret.encode(), manifest.encode(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, received)
+
+
+def process_pending_events(batch_size=BATCH_SIZE):
+    """
+    Processa um lote de eventos 'received'. Retorna quantos eventos foram consumidos.
+    Seguro para rodar em vários processos: o crédito é idempotente.
+    """
+    now = datetime.utcnow()
+    events = PaymentEvent.query.filter(
+        PaymentEvent.status == 'received',
+        (PaymentEvent.next_attempt_at.is_(None)) | (PaymentEvent.next_attempt_at <= now)
+    ).order_by(PaymentEvent.id).limit(batch_size).all()
+    if not events:
+        return 0
+
+    access_token = get_config('mp_access_token')
+    if not access_token:
+        print("Eventos de pagamento pendentes, mas o Mercado Pago não está configurado.")
+        return 0
+    from src.services.mercado_pago import MercadoPagoAPI
+    mp_api = MercadoPagoAPI(access_token)
+
+    mp_ids = {event.mp_payment_id for event in events}
+    payments = {p.payment_id: p for p in Payment.query.filter(Payment.payment_id.in_(mp_ids)).all()}
+
+    results = {}
+    for mp_id in mp_ids:
+        mp_data = mp_api.get_payment(mp_id)
+        if 'error' in mp_data or 'status' not in mp_data:
+            results[mp_id] = 'retry'
+            continue
+
+        payment = payments.get(mp_id)
+        if payment is None and mp_data.get('external_reference'):
+            # O webhook pode chegar antes de gravarmos payment.payment_id.
+            payment = Payment.query.get(int(mp_data['external_reference'])) \
+                if str(mp_data['external_reference']).isdigit() else None
+        if payment is None:
+            results[mp_id] = 'processed'
+            continue
+
+        if mp_data['status'] == 'approved':
+            credit_approved_payment(payment)
+        elif mp_data['status'] in FAILED_STATUSES:
+            mark_payment_status(payment, mp_data['status'])
+        results[mp_id] = 'processed'
+
+    for event in events:
+        result = results.get(event.mp_payment_id, 'retry')
+        if result == 'retry':
+            _schedule_retry(event, now)
+        else:
+            event.status = result
+            event.processed_at = now
+    db.session.commit()
+    return len(events)
+
+
+def _schedule_retry(event, now):
+    """Falha ao consultar o gateway: tenta de novo mais tarde ou desiste depois de MAX_ATTEMPTS."""
+    event.attempts = (event.attempts or 0) + 1
+    if event.attempts >= MAX_ATTEMPTS:
+        print(f"Evento de pagamento {event.id} (MP {event.mp_payment_id}) falhou {event.attempts} vezes; desistindo.")
+        event.status = 'failed'
+        event.processed_at = now
+        metrics.inc('payment_events_failed_total')
+    else:
+        delay = min(RETRY_MAX, RETRY_BASE * 2 ** (event.attempts - 1))
+        event.next_attempt_at = now + timedelta(seconds=delay)
+        metrics.inc('payment_events_retried_total')
+
+
+def drain(batch_size=BATCH_SIZE):
+    """Processa lotes até esvaziar a fila."""
+    total = 0
+    while True:
+        processed = process_pending_events(batch_size)
+        total += processed
+        if processed < batch_size:
+            return total
+
+
+# --- Consumidor em segundo plano dentro do worker web ---
+_wakeup = threading.Event()
+_consumer_lock = threading.Lock()
+_consumer_thread = None
+_consumer_pid = None
+
+
+def _consumer_loop(app):
+    while True:
+        _wakeup.wait(POLL_INTERVAL)
+        _wakeup.clear()
+        # Espera um pouco para agrupar notificações que chegam juntas.
+        time.sleep(BATCH_WINDOW)
+        try:
+            with app.app_context():
+                drain()
+        except Exception as e:
+            print(f"Erro ao processar eventos de pagamento: {e}")
+
+
+def wake_consumer(app):
+    """Acorda (e inicia, se preciso) o consumidor deste worker."""
+    global _consumer_thread, _consumer_pid
+    if not INLINE_CONSUMER:
+        return
+    pid = os.getpid()
+    with _consumer_lock:
+        if _consumer_thread is None or _consumer_pid != pid or not _consumer_thread.is_alive():
+            _consumer_thread = threading.Thread(target=_consumer_loop, args=(app,), daemon=True,
+                                                name='payment-events')
+            _consumer_pid = pid
+            _consumer_thread.start()
+    _wakeup.set()
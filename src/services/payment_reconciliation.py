@@ -0,0 +1,180 @@
+# Arquivo: src/services/payment_reconciliation.py
+# Conciliação dos pagamentos presos em 'pending' (PIX expirado, webhook perdido,
+# recarga que nunca chegou ao gateway).
+#
+# Os pagamentos pendentes mais velhos que PAYMENT_RECONCILE_MIN_AGE_MINUTES são
+# lidos em lotes e agrupados em janelas de data de criação. Cada janela vira UMA
+# busca no Mercado Pago (/v1/payments/search por date_created, paginada; janela
+# de um pagamento só também filtra pelo external_reference), e os resultados são
+# casados com as linhas pelo external_reference (= Payment.id). Assim, mil
+# pendências custam algumas chamadas, não mil get_payment.
+#
+# Decisão por linha:
+# - aprovado no gateway: crédito normal (credit_approved_payment, idempotente);
+# - rejected/cancelled/refunded/charged_back: o mesmo status, em um UPDATE por status;
+# - ainda pendente no gateway, mas com o PIX vencido: 'expired';
+# - não existe no gateway: 'expired' (o PIX nunca foi gerado ou a recarga ficou só aqui).
+# Linhas de uma janela cuja busca falhou ficam como estão até a próxima rodada.
+# Com dry_run=True nada é gravado: o relatório diz o que seria feito.
+
+import os
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import tuple_
+
+from src.config import get_config
+from src.models.user import Payment, db
+from src.services.balance import credit_approved_payment, mark_payments_status
+from src.services.payment_events import FAILED_STATUSES
+
+PAYMENT_RECONCILE_MIN_AGE = int(os.environ.get('PAYMENT_RECONCILE_MIN_AGE_MINUTES', '60'))
+PAYMENT_RECONCILE_BATCH_SIZE = int(os.environ.get('PAYMENT_RECONCILE_BATCH_SIZE', '500'))
+# Um intervalo maior que este entre dois pagamentos do lote começa outra janela de
+# busca, para não varrer no gateway dias sem nenhum pagamento nosso pendente.
+PAYMENT_RECONCILE_WINDOW_GAP = int(os.environ.get('PAYMENT_RECONCILE_WINDOW_GAP_MINUTES', '60'))
+MP_SEARCH_PAGE_SIZE = int(os.environ.get('MP_SEARCH_PAGE_SIZE', '100'))
+# O date_created do gateway é um pouco posterior ao nosso created_at.
+WINDOW_SLACK = timedelta(minutes=10)
+
+
+def _windows(payments, gap):
+    """Agrupa os pagamentos, ordenados por created_at, em janelas sem intervalos maiores que `gap`."""
+    windows = []
+    for payment in sorted(payments, key=lambda p: p.created_at):
+        if windows and payment.created_at - windows[-1][-1].created_at <= gap:
+            windows[-1].append(payment)
+        else:
+            windows.append([payment])
+    return windows
+
+
+def _search(mp_api, window, report):
+    """Todos os pagamentos do gateway criados na janela (todas as páginas); None se a busca falhar."""
+    begin = window[0].created_at - WINDOW_SLACK
+    end = window[-1].created_at + WINDOW_SLACK
+    reference = window[0].id if len(window) == 1 else None
+    results = []
+    while True:
+        page = mp_api.search_payments(begin, end, reference, offset=len(results), limit=MP_SEARCH_PAGE_SIZE)
+        report['api_calls'] += 1
+        if 'error' in page or not isinstance(page.get('results'), list):
+            return None
+        results.extend(page['results'])
+        if not page['results'] or len(results) >= (page.get('paging') or {}).get('total', 0):
+            return results
+
+
+def _utc(value):
+    """Data ISO do gateway ("2026-10-18T10:30:00.000-04:00") em UTC sem fuso, como created_at; None se inválida."""
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return parsed.astimezone(timezone.utc).replace(tzinfo=None) if parsed.tzinfo else parsed
+
+
+def _match(window, results):
+    """Payment.id -> pagamento do gateway (um aprovado, se houver; senão o mais recente)."""
+    ids = {payment.id for payment in window}
+    by_mp_id = {payment.payment_id: payment.id for payment in window if payment.payment_id}
+    matched = {}
+    for result in results:  # em ordem de date_created
+        reference = str(result.get('external_reference') or '')
+        payment_id = int(reference) if reference.isdigit() and int(reference) in ids else \
+            by_mp_id.get(str(result.get('id')))
+        if payment_id is None:
+            continue
+        if matched.get(payment_id, {}).get('status') != 'approved':
+            matched[payment_id] = result
+    return matched
+
+
+def _decide(mp_payment, now):
+    """Novo status local da linha pendente, ou None para deixá-la como está."""
+    if mp_payment is None:
+        return 'expired'
+    status = mp_payment.get('status')
+    if status == 'approved' or status in FAILED_STATUSES:
+        return status
+    expires_at = _utc(mp_payment.get('date_of_expiration')) if mp_payment.get('date_of_expiration') else None
+    # PIX criados por create_payment sempre têm vencimento; sem ele, a linha já passou da idade mínima.
+    if expires_at is None or expires_at < now:
+        return 'expired'
+    return None
+
+
+def _reconcile_batch(mp_api, batch, dry_run, report, now):
+    decisions = {}  # novo status -> [Payment]
+    for window in _windows(batch, timedelta(minutes=PAYMENT_RECONCILE_WINDOW_GAP)):
+        results = _search(mp_api, window, report)
+        if results is None:
+            report['skipped'] += len(window)
+            continue
+        matched = _match(window, results)
+        for payment in window:
+            mp_payment = matched.get(payment.id)
+            if mp_payment is None and payment.payment_id:
+                # Tem ID no gateway mas não veio na busca (data muito diferente): confere direto.
+                mp_payment = mp_api.get_payment(payment.payment_id)
+                report['api_calls'] += 1
+                if 'error' in mp_payment or 'status' not in mp_payment:
+                    report['skipped'] += 1
+                    continue
+            status = _decide(mp_payment, now)
+            if status is None:
+                report['unchanged'] += 1
+                continue
+            decisions.setdefault(status, []).append(payment)
+            report['changes'].append({
+                'payment_id': payment.id, 'user_id': payment.user_id, 'amount': payment.amount,
+                'mp_payment_id': str(mp_payment['id']) if mp_payment and mp_payment.get('id') else None,
+                'status': status,
+            })
+
+    for status, payments in decisions.items():
+        if dry_run:
+            changed = len(payments)
+        elif status == 'approved':
+            changed = sum(1 for payment in payments if credit_approved_payment(payment))
+        else:
+            changed = mark_payments_status([payment.id for payment in payments], status)
+        report['updated'][status] = report['updated'].get(status, 0) + changed
+
+
+def reconcile_pending_payments(dry_run=False, min_age_minutes=PAYMENT_RECONCILE_MIN_AGE,
+                               batch_size=PAYMENT_RECONCILE_BATCH_SIZE):
+    """
+    Concilia todos os pagamentos pendentes com mais de `min_age_minutes`, um
+    lote (e um commit) por vez. Retorna o relatório: linhas conferidas,
+    chamadas ao gateway, atualizações por status e a lista de mudanças.
+    """
+    access_token = get_config('mp_access_token')
+    if not access_token:
+        raise RuntimeError('O Mercado Pago não está configurado (mp_access_token).')
+    from src.services.mercado_pago import MercadoPagoAPI
+    mp_api = MercadoPagoAPI(access_token)
+
+    now = datetime.utcnow()
+    cutoff = now - timedelta(minutes=min_age_minutes)
+    report = {'dry_run': dry_run, 'checked': 0, 'api_calls': 0, 'updated': {}, 'unchanged': 0,
+              'skipped': 0, 'changes': []}
+    last = None
+    while True:
+        # Lotes em ordem de criação: cada lote cobre um trecho contínuo do tempo (poucas
+        # janelas de busca) e, no dry-run, as linhas continuam pendentes e não podem voltar.
+        query = Payment.query.filter(Payment.status == 'pending', Payment.created_at < cutoff)
+        if last is not None:
+            query = query.filter(tuple_(Payment.created_at, Payment.id) > last)
+        batch = query.order_by(Payment.created_at, Payment.id).limit(batch_size).all()
+        if not batch:
+            break
+        last = (batch[-1].created_at, batch[-1].id)
+        report['checked'] += len(batch)
+        _reconcile_batch(mp_api, batch, dry_run, report, now)
+        if dry_run:
+            db.session.rollback()
+        else:
+            db.session.commit()
+        if len(batch) < batch_size:
+            break
+    return report
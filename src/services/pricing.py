@@ -0,0 +1,152 @@
+# Arquivo: src/services/pricing.py
+# Motor de preços: margens por categoria, por serviço e por faixa de quantidade.
+#
+# Regras (tabela pricing_rule) têm um escopo ('global', 'category', 'service')
+# e valem a partir de min_quantity unidades. Para uma quantidade, vale o escopo
+# mais específico que tenha alguma regra aplicável (serviço > categoria >
+# global) e, dentro dele, a regra de maior min_quantity <= quantidade. A
+# configuração profit_margin continua sendo a margem global base (a partir de 0).
+#
+# reprice_all() compila as regras em "escadas" de (min_quantity, margem) — uma
+# por categoria, mais uma por serviço com regra própria — e gera em uma única
+# passada a tabela service_price (uma linha por serviço e faixa), gravada em
+# lote. O snapshot do catálogo e os pedidos só leem esses preços prontos.
+# Reprecificar roda quando as regras ou o profit_margin mudam e quando a
+# sincronização altera o catálogo; `flask reprice` força uma passada.
+
+import time
+from bisect import bisect_right
+from datetime import datetime
+
+from sqlalchemy import select
+
+from src.config import get_config
+from src.models.user import PricingRule, Service, ServicePrice, db
+
+SCOPES = ('global', 'category', 'service')
+
+
+def _margin_at(ladder, quantity):
+    """Margem da escada ordenada [(min_quantity, margem)] para `quantity` (None se nenhuma vale)."""
+    index = bisect_right(ladder, (quantity, float('inf'))) - 1
+    return ladder[index][1] if index >= 0 else None
+
+
+class CompiledRules:
+    """Regras ativas agrupadas por escopo, com as escadas já mescladas em cache."""
+
+    def __init__(self, rules, base_margin):
+        layers = {scope: {} for scope in SCOPES}
+        layers['global'][''] = {0: base_margin}
+        for rule in rules:
+            key = str(int(rule.key)) if rule.scope == 'service' else (rule.key or '')
+            layers[rule.scope].setdefault(key, {})[rule.min_quantity] = rule.margin
+        self._global = sorted(layers['global'][''].items())
+        self._categories = {key: sorted(tiers.items()) for key, tiers in layers['category'].items()}
+        self._services = {int(key): sorted(tiers.items()) for key, tiers in layers['service'].items()}
+        self._ladders = {}
+        self._steps_cache = {}
+
+    def ladder(self, category, service_id):
+        """[(min_quantity, margem)] do serviço, sem faixas consecutivas de mesma margem."""
+        own = self._services.get(service_id)
+        cache_key = (category or '', service_id if own else None)
+        ladder = self._ladders.get(cache_key)
+        if ladder is None:
+            layers = [layer for layer in (own, self._categories.get(category or ''), self._global) if layer]
+            ladder = []
+            for threshold in sorted({quantity for layer in layers for quantity, _ in layer}):
+                margin = next(m for m in (_margin_at(layer, threshold) for layer in layers) if m is not None)
+                if not ladder or ladder[-1][1] != margin:
+                    ladder.append((threshold, margin))
+            self._ladders[cache_key] = ladder
+        return ladder
+
+    def tiers(self, service_id, rate, category, minimum, maximum):
+        """
+        [(min_quantity, margem, preço final por 1000)] do serviço. A primeira faixa
+        tem min_quantity 0 (vale desde o mínimo do serviço); faixas acima do
+        máximo do serviço são descartadas.
+        """
+        return [(quantity, margin, rate * factor)
+                for quantity, margin, factor in self._steps(category, service_id, minimum, maximum)]
+
+    def _steps(self, category, service_id, minimum, maximum):
+        # Milhares de serviços compartilham a mesma escada e os mesmos limites:
+        # as faixas (com o fator 1 + margem/100) saem do cache e só o rate varia.
+        own = service_id in self._services
+        cache_key = (category or '', service_id if own else None, minimum, maximum)
+        steps = self._steps_cache.get(cache_key)
+        if steps is None:
+            ladder = self.ladder(category, service_id)
+            start = max(bisect_right(ladder, (minimum, float('inf'))) - 1, 0)
+            selected = [(0, ladder[start][1])]
+            selected.extend(step for step in ladder[start + 1:] if step[0] <= maximum)
+            steps = self._steps_cache[cache_key] = [(quantity, margin, 1 + margin / 100)
+                                                    for quantity, margin in selected]
+        return steps
+
+
+def load_rules(base_margin=None):
+    if base_margin is None:
+        base_margin = float(get_config('profit_margin') or 0)
+    return CompiledRules(PricingRule.query.filter_by(is_active=True).all(), base_margin)
+
+
+def reprice_all(base_margin=None):
+    """
+    Recalcula a tabela service_price inteira em uma passada e sinaliza aos
+    workers que o catálogo mudou. Não faz commit: quem chama decide a transação.
+    """
+    from src.services.catalog import bump_catalog_version
+
+    started = time.perf_counter()
+    # Primeiro a versão: o UPDATE trava a linha do contador até o commit, então dois
+    # reprice_all concorrentes (PostgreSQL) rodam em fila, e o segundo lê regras e
+    # serviços já gravados pelo primeiro, em vez de os dois inserirem a mesma
+    # tabela e um cair em chave duplicada.
+    bump_catalog_version()
+    db.session.flush()
+    compiled = load_rules(base_margin)
+    services = db.session.execute(
+        select(Service.service_id, Service.rate, Service.category, Service.min, Service.max)
+    ).all()
+
+    now = datetime.utcnow()
+    rows = [
+        {'service_id': service_id, 'min_quantity': quantity, 'margin': margin,
+         'final_rate': rate * factor, 'priced_at': now}
+        for service_id, rate, category, minimum, maximum in services
+        for quantity, margin, factor in compiled._steps(category, service_id, minimum, maximum)
+    ]
+    computed = time.perf_counter()
+
+    table = ServicePrice.__table__
+    db.session.execute(table.delete())
+    if rows:
+        db.session.execute(table.insert(), rows)
+    return {
+        'services': len(services),
+        'prices': len(rows),
+        'compute_ms': round((computed - started) * 1000, 1),
+        'total_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def load_prices():
+    """service_id -> [(min_quantity, preço final por 1000)] em ordem de faixa (uma query)."""
+    prices = {}
+    for row in db.session.query(ServicePrice.service_id, ServicePrice.min_quantity, ServicePrice.final_rate) \
+            .order_by(ServicePrice.service_id, ServicePrice.min_quantity):
+        prices.setdefault(row.service_id, []).append((row.min_quantity, row.final_rate))
+    return prices
+
+
+def unit_rate(entry, quantity):
+    """Preço final por 1000 de um serviço do snapshot para `quantity` unidades."""
+    rate = entry['final_rate']
+    for tier in entry['price_tiers'][1:]:
+        if quantity < tier['min_quantity']:
+            break
+        rate = tier['final_rate']
+    return rate
@@ -0,0 +1,226 @@
+# Arquivo: src/services/rate_limit.py
+# Limitador de requisições por balde de tokens (token bucket).
+# Cada regra tem uma taxa ("10/minute"): o balde começa cheio com `burst`
+# tokens (padrão: o número da taxa), cada requisição gasta um e o balde é
+# reabastecido continuamente na taxa configurada. Sem token, a requisição é
+# recusada e o cliente recebe em quantos segundos haverá um token de novo.
+#
+# Backends (RATE_LIMIT_BACKEND):
+# - memory (padrão): dict por worker; com N workers o limite efetivo é até N vezes maior.
+# - database: tabela rate_limit_bucket (`flask db-upgrade`), um UPDATE condicional
+#   por requisição em transação própria; vale para todos os workers e instâncias.
+# - redis: script Lua atômico em REDIS_URL (Redis ou compatível); requer o pacote `redis`.
+# Se o backend falhar (banco fora do ar, Redis inacessível), a requisição passa:
+# o limitador não pode derrubar o site.
+
+import math
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from sqlalchemy import case, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+
+from src.models.user import RateLimitBucket, db
+
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', '1') == '1'
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory').lower()
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+# Um balde parado há mais de um dia está cheio (nenhum período passa de um dia),
+# então a linha pode ser apagada sem mudar o resultado.
+STALE_AFTER = PERIODS['day']
+MEMORY_MAX_KEYS = 100_000
+
+
+@dataclass(frozen=True)
+class Rule:
+    name: str
+    limit: int
+    period: int
+    burst: int
+
+    @property
+    def rate(self):
+        """Tokens por segundo."""
+        return self.limit / self.period
+
+
+def parse_rule(name, spec, burst=None):
+    """
+    "10/minute" -> Rule. A variável de ambiente RATE_LIMIT_<NOME> (ex.:
+    RATE_LIMIT_LOGIN=20/minute) substitui a taxa definida no código.
+    """
+    spec = os.environ.get(f'RATE_LIMIT_{name.upper()}', spec)
+    try:
+        limit, period = spec.split('/')
+        limit, period = int(limit), PERIODS[period.strip().rstrip('s')]
+    except (ValueError, KeyError):
+        raise ValueError(f"Taxa inválida para '{name}': {spec!r} (use N/second, N/minute, N/hour ou N/day)")
+    return Rule(name, limit, period, burst or limit)
+
+
+class MemoryBackend:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # chave -> (tokens, atualizado_em), do uso mais antigo para o mais recente
+        self._buckets = OrderedDict()
+
+    def take(self, key, rule, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (rule.burst, now))
+            tokens = min(rule.burst, tokens + (now - updated_at) * rule.rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            # Cheio, descarta o balde usado há mais tempo (O(1)): é o que mais
+            # provavelmente já se reabasteceu, e esquecer um balde cheio não muda nada.
+            if len(self._buckets) > MEMORY_MAX_KEYS:
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (cost - tokens) / rule.rate
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class DatabaseBackend:
+    def take(self, key, rule, cost=1):
+        table = RateLimitBucket.__table__
+        now = time.time()
+        elapsed = case((table.c.updated_at < now, now - table.c.updated_at), else_=0.0)
+        refilled = table.c.tokens + elapsed * rule.rate
+        available = case((refilled > rule.burst, float(rule.burst)), else_=refilled)
+
+        with db.engine.begin() as conn:
+            # Caminho comum: um UPDATE atômico que só passa se houver tokens.
+            taken = conn.execute(
+                table.update()
+                .where(table.c.key == key, available >= cost)
+                .values(tokens=available - cost,
+                        updated_at=case((table.c.updated_at < now, now), else_=table.c.updated_at))
+            ).rowcount
+            if taken:
+                return True, 0.0
+
+            # Primeira requisição com esta chave: cria o balde já descontado.
+            if cost <= rule.burst and self._insert(conn, key, rule.burst - cost, now):
+                if random.random() < 0.001:
+                    conn.execute(table.delete().where(table.c.updated_at < now - STALE_AFTER))
+                return True, 0.0
+
+            row = conn.execute(select(table.c.tokens, table.c.updated_at).where(table.c.key == key)).first()
+        tokens = min(rule.burst, row.tokens + max(now - row.updated_at, 0) * rule.rate) if row else 0.0
+        return False, (cost - tokens) / rule.rate
+
+    @staticmethod
+    def _insert(conn, key, tokens, now):
+        table = RateLimitBucket.__table__
+        values = {'key': key, 'tokens': tokens, 'updated_at': now}
+        dialect = conn.dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            insert = pg_insert if dialect == 'postgresql' else sqlite_insert
+            return conn.execute(insert(table).values(**values).on_conflict_do_nothing()).rowcount == 1
+        # Outros bancos: INSERT simples; se outra requisição criou antes, a chave primária recusa.
+        with conn.begin_nested():
+            try:
+                conn.execute(table.insert().values(**values))
+            except IntegrityError:
+                return False
+        return True
+
+    def reset(self):
+        with db.engine.begin() as conn:
+            conn.execute(RateLimitBucket.__table__.delete())
+
+
+# KEYS[1] = chave; ARGV = burst, tokens por segundo, custo, agora (segundos).
+_REDIS_SCRIPT = """
+local burst, rate, cost, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens, ts = tonumber(state[1]) or burst, tonumber(state[2]) or now
+if now > ts then
+  tokens = math.min(burst, tokens + (now - ts) * rate)
+  ts = now
+end
+local allowed = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(ts))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisBackend:
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requer o pacote 'redis'")
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self._script = self._client.register_script(_REDIS_SCRIPT)
+
+    def take(self, key, rule, cost=1):
+        allowed, tokens = self._script(keys=[f'ratelimit:{key}'],
+                                       args=[rule.burst, rule.rate, cost, time.time()])
+        if int(allowed):
+            return True, 0.0
+        return False, (cost - float(tokens)) / rule.rate
+
+    def reset(self):
+        for key in self._client.scan_iter('ratelimit:*'):
+            self._client.delete(key)
+
+
+_backend_lock = threading.Lock()
+_backend = {'instance': None, 'pid': None, 'error_logged_at': 0.0}
+
+
+def get_backend():
+    """Backend configurado, criado uma vez por processo (o Redis não sobrevive a um fork)."""
+    pid = os.getpid()
+    if _backend['instance'] is None or _backend['pid'] != pid:
+        with _backend_lock:
+            if _backend['instance'] is None or _backend['pid'] != pid:
+                if RATE_LIMIT_BACKEND == 'database':
+                    instance = DatabaseBackend()
+                elif RATE_LIMIT_BACKEND == 'redis':
+                    instance = RedisBackend(REDIS_URL)
+                else:
+                    instance = MemoryBackend()
+                _backend['instance'], _backend['pid'] = instance, pid
+    return _backend['instance']
+
+
+def take(rule, identity, cost=1):
+    """
+    Gasta `cost` tokens do balde da regra para `identity` ('user:12', 'ip:1.2.3.4').
+    Retorna (permitido, segundos até haver tokens). Falhas do backend liberam a requisição.
+    """
+    if not RATE_LIMIT_ENABLED:
+        return True, 0.0
+    try:
+        return get_backend().take(f'{rule.name}:{identity}', rule, cost)
+    except Exception as e:
+        # No máximo uma linha de log por minuto enquanto o backend estiver fora.
+        if time.monotonic() - _backend['error_logged_at'] > 60:
+            _backend['error_logged_at'] = time.monotonic()
+            print(f"Limitador de requisições indisponível ({RATE_LIMIT_BACKEND}), liberando: {e}")
+        return True, 0.0
+
+
+def retry_after_header(seconds):
+    """Valor do Retry-After: segundos inteiros, arredondados para cima, no mínimo 1."""
+    return str(max(1, math.ceil(seconds)))
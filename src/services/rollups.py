@@ -0,0 +1,156 @@
+# Arquivo: src/services/rollups.py
+# Totais diários (pedidos, faturamento, novos usuários) mantidos incrementalmente.
+# Cada evento soma seus valores com um único UPSERT, na mesma transação da
+# escrita que o originou; o dashboard lê só a tabela daily_rollup.
+# Cada total do dia (global, por usuário, serviço ou categoria) é dividido em
+# até ROLLUP_SHARDS linhas (key = '<chave>#<fatia sorteada>'): cada pedido,
+# pagamento ou cadastro trava uma delas, não uma linha única disputada por todas
+# as escritas do mesmo dia, serviço ou categoria. Quem lê soma as fatias
+# (totals_by_day).
+# `flask rebuild-rollups` reconstrói tudo a partir das tabelas de origem.
+
+import os
+import random
+from collections import defaultdict
+from datetime import date, datetime
+
+from sqlalchemy import func, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from src.models.user import DailyRollup, Order, Payment, Service, User, db
+
+METRICS = ('orders_count', 'orders_amount', 'payments_count', 'revenue', 'new_users')
+
+# Pedidos recusados pelo fornecedor foram estornados e não contam.
+EXCLUDED_ORDER_STATUSES = ('Failed',)
+
+ROLLUP_SHARDS = max(int(os.environ.get('ROLLUP_SHARDS', '16')), 1)
+
+
+def _shard_key(key, shard=None):
+    """Chave da fatia `shard` (sorteada se None) do total de `key`."""
+    return f'{key}#{random.randrange(ROLLUP_SHARDS) if shard is None else shard}'
+
+
+def _increment(day, dimension, key, **deltas):
+    """Soma `deltas` em uma fatia sorteada do total (day, dimension, key), criando-a se preciso."""
+    table = DailyRollup.__table__
+    key = _shard_key(key)
+    values = {'day': day, 'dimension': dimension, 'key': key, **{m: 0 for m in METRICS}, **deltas}
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        insert = pg_insert if dialect == 'postgresql' else sqlite_insert
+        stmt = insert(table).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['day', 'dimension', 'key'],
+            set_={metric: table.c[metric] + stmt.excluded[metric] for metric in deltas}
+        )
+        db.session.execute(stmt)
+        return
+
+    # Outros bancos: UPDATE e, se não havia linha, INSERT.
+    updated = db.session.execute(
+        table.update()
+        .where(table.c.day == day, table.c.dimension == dimension, table.c.key == key)
+        .values(**{metric: table.c[metric] + delta for metric, delta in deltas.items()})
+    ).rowcount
+    if not updated:
+        db.session.execute(table.insert().values(**values))
+
+
+def record_order(user_id, service_id, category, amount, sign=1, day=None, count=1):
+    """Conta `count` pedidos criados (sign=1) ou estornados (sign=-1) somando `amount`."""
+    day = day or datetime.utcnow().date()
+    deltas = {'orders_count': sign * count, 'orders_amount': sign * amount}
+    _increment(day, 'global', '', **deltas)
+    _increment(day, 'user', user_id, **deltas)
+    _increment(day, 'service', service_id, **deltas)
+    if category:
+        _increment(day, 'category', category, **deltas)
+
+
+def record_order_refund(order):
+    """Desconta um pedido estornado no dia em que ele foi criado."""
+    category = db.session.query(Service.category).filter_by(service_id=order.service_id).scalar()
+    day = order.created_at.date() if order.created_at else None
+    record_order(order.user_id, order.service_id, category, order.charge, sign=-1, day=day)
+
+
+def record_payment_approved(user_id, amount, day=None):
+    day = day or datetime.utcnow().date()
+    _increment(day, 'global', '', payments_count=1, revenue=amount)
+    _increment(day, 'user', user_id, payments_count=1, revenue=amount)
+
+
+def record_new_user(sign=1, day=None):
+    _increment(day or datetime.utcnow().date(), 'global', '', new_users=sign)
+
+
+def totals_by_day(dimension, key, start):
+    """Métricas de (dimension, key) por dia a partir de `start`, somando as fatias."""
+    query = db.session.query(
+        DailyRollup.day, *[func.sum(getattr(DailyRollup, metric)) for metric in METRICS]
+    ).filter(DailyRollup.dimension == dimension, DailyRollup.day >= start)
+    if dimension != 'global':
+        # A própria chave (linhas anteriores às fatias) e as fatias '<chave>#N'
+        query = query.filter(or_(DailyRollup.key == str(key),
+                                 DailyRollup.key.startswith(f'{key}#', autoescape=True)))
+    return {row[0]: dict(zip(METRICS, row[1:])) for row in query.group_by(DailyRollup.day)}
+
+
+def _as_date(value):
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+def rebuild_rollups():
+    """
+    Reconstrói daily_rollup do zero a partir de order, payment e user.
+    Roda em uma transação: o dashboard nunca vê a tabela pela metade.
+    Cada total vai inteiro para a fatia 0.
+    Retorna o número de linhas geradas.
+    """
+    rows = defaultdict(lambda: dict.fromkeys(METRICS, 0))
+
+    order_day = func.date(Order.created_at)
+    order_query = db.session.query(
+        order_day, Order.user_id, Order.service_id, Service.category,
+        func.count(Order.id), func.coalesce(func.sum(Order.charge), 0)
+    ).outerjoin(Service, Service.service_id == Order.service_id).filter(
+        Order.status.notin_(EXCLUDED_ORDER_STATUSES)
+    ).group_by(order_day, Order.user_id, Order.service_id, Service.category)
+    for day, user_id, service_id, category, count, amount in order_query:
+        day = _as_date(day)
+        keys = [('global', ''), ('user', user_id), ('service', service_id)]
+        if category:
+            keys.append(('category', category))
+        for dimension, key in keys:
+            rows[(day, dimension, key)]['orders_count'] += count
+            rows[(day, dimension, key)]['orders_amount'] += float(amount)
+
+    payment_day = func.date(Payment.updated_at)
+    payment_query = db.session.query(
+        payment_day, Payment.user_id, func.count(Payment.id), func.coalesce(func.sum(Payment.amount), 0)
+    ).filter(Payment.status == 'approved').group_by(payment_day, Payment.user_id)
+    for day, user_id, count, amount in payment_query:
+        day = _as_date(day)
+        for dimension, key in (('global', ''), ('user', user_id)):
+            rows[(day, dimension, key)]['payments_count'] += count
+            rows[(day, dimension, key)]['revenue'] += float(amount)
+
+    user_day = func.date(User.created_at)
+    for day, count in db.session.query(user_day, func.count(User.id)).group_by(user_day):
+        if day is not None:
+            rows[(_as_date(day), 'global', '')]['new_users'] += count
+
+    db.session.query(DailyRollup).delete(synchronize_session=False)
+    if rows:
+        db.session.execute(DailyRollup.__table__.insert(), [
+            {'day': day, 'dimension': dimension, 'key': _shard_key(key, 0), **metrics}
+            for (day, dimension, key), metrics in rows.items()
+        ])
+    db.session.commit()
+    return len(rows)
@@ -0,0 +1,166 @@
+# Arquivo: src/services/search.py
+# Busca de serviços sobre o snapshot do catálogo.
+# Índice invertido em memória (token -> posições) sobre nome, categoria e tipo,
+# com tokens normalizados sem acento e em minúsculas ("seguidores" encontra
+# "Seguidóres"). Cada termo da busca casa por prefixo ("segu" -> "seguidores",
+# "seguro"); os termos são combinados com E. Como o índice pertence ao
+# snapshot, ele é reconstruído junto com ele quando o catálogo muda
+# (sincronização, ativar/desativar serviço, margem de lucro).
+#
+# Toda filtragem é feita com operações de conjunto (em C): as faixas de preço
+# e de quantidade saem de fatias de listas ordenadas (bisect), e as posições
+# dos serviços seguem a ordem alfabética, então ordenar por nome é ordenar inteiros.
+
+import re
+import unicodedata
+from bisect import bisect_left, bisect_right
+from collections import Counter
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+
+SORTS = ('relevance', 'price', '-price', 'name')
+
+
+def normalize(text):
+    """Minúsculas e sem acentos."""
+    return unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode().lower()
+
+
+def tokenize(text):
+    return _TOKEN.findall(normalize(text))
+
+
+class _SortedField:
+    """Posições ordenadas por um campo numérico, para extrair faixas com bisect."""
+
+    def __init__(self, entries, field):
+        order = sorted(range(len(entries)), key=lambda position: entries[position][field])
+        self.values = [entries[position][field] for position in order]
+        self.positions = order
+
+    def between(self, low=None, high=None):
+        start = bisect_left(self.values, low) if low is not None else 0
+        end = bisect_right(self.values, high) if high is not None else len(self.values)
+        return set(self.positions[start:end])
+
+
+class ServiceSearchIndex:
+    """Índice imutável sobre a lista de serviços ativos de um snapshot."""
+
+    def __init__(self, entries):
+        normalized_names = [normalize(entry['name']) for entry in entries]
+        order = sorted(range(len(entries)), key=lambda i: (normalized_names[i], i))
+        # A posição de um serviço no índice é a sua posição na ordem alfabética.
+        self.entries = [entries[i] for i in order]
+        self._all = set(range(len(self.entries)))
+
+        self._name_postings = {}
+        self._postings = {}        # nome + categoria + tipo
+        self._by_category = {}
+        self._by_type = {}
+        for position, entry in enumerate(self.entries):
+            name_tokens = set(_TOKEN.findall(normalized_names[order[position]]))
+            category, service_type = normalize(entry['category']), normalize(entry['type'])
+            for token in name_tokens:
+                self._name_postings.setdefault(token, set()).add(position)
+            for token in name_tokens.union(_TOKEN.findall(category), _TOKEN.findall(service_type)):
+                self._postings.setdefault(token, set()).add(position)
+            self._by_category.setdefault(category, set()).add(position)
+            self._by_type.setdefault(service_type, set()).add(position)
+        self._tokens = sorted(self._postings)
+        self._category_names = {}
+        for entry in self.entries:
+            self._category_names.setdefault(normalize(entry['category']), entry['category'] or '')
+
+        self._price = _SortedField(self.entries, 'final_rate')
+        self._min = _SortedField(self.entries, 'min')
+        self._max = _SortedField(self.entries, 'max')
+        self._price_rank = [0] * len(self.entries)
+        for rank, position in enumerate(self._price.positions):
+            self._price_rank[position] = rank
+
+    def _expand(self, prefix):
+        """Tokens do índice que começam com `prefix`."""
+        start = bisect_left(self._tokens, prefix)
+        end = start
+        while end < len(self._tokens) and self._tokens[end].startswith(prefix):
+            end += 1
+        return self._tokens[start:end]
+
+    def _match(self, terms):
+        """(posições que casam com todos os termos, [(casam o termo inteiro no nome, casam no nome)])."""
+        matches = None
+        name_sets = []
+        for term in terms:
+            expanded = self._expand(term)
+            term_matches = set().union(*(self._postings[token] for token in expanded))
+            matches = term_matches if matches is None else matches & term_matches
+            if not matches:
+                return set(), []
+            name_sets.append((self._name_postings.get(term, set()),
+                              set().union(*(self._name_postings.get(token, ()) for token in expanded))))
+        return matches, name_sets
+
+    def search(self, query='', category=None, service_type=None, min_price=None, max_price=None,
+               quantity=None, min_quantity=None, max_quantity=None, sort=None, page=1, limit=20):
+        """
+        Filtra, conta as facetas de categoria e pagina.
+        - min_price/max_price: faixa do preço final (por 1000).
+        - quantity: só serviços que aceitam essa quantidade (min <= quantity <= max).
+        - min_quantity/max_quantity: faixa de quantidades desejada; basta o
+          serviço aceitar alguma quantidade dentro dela.
+        As facetas consideram todos os filtros menos o de categoria, para o
+        cliente mostrar quantos resultados cada categoria teria.
+        """
+        terms = tokenize(query)
+        name_sets = []
+        filters = []
+        if terms:
+            matches, name_sets = self._match(terms)
+            filters.append(matches)
+        if service_type:
+            filters.append(self._by_type.get(normalize(service_type), set()))
+        if min_price is not None or max_price is not None:
+            filters.append(self._price.between(min_price, max_price))
+        if quantity is not None:
+            min_quantity = quantity if min_quantity is None else max(min_quantity, quantity)
+            max_quantity = quantity if max_quantity is None else min(max_quantity, quantity)
+        if max_quantity is not None:
+            filters.append(self._min.between(high=max_quantity))
+        if min_quantity is not None:
+            filters.append(self._max.between(low=min_quantity))
+
+        filters.sort(key=len)
+        filtered = set(filters[0]).intersection(*filters[1:]) if filters else self._all
+
+        facets = sorted(
+            ((self._category_names[key], len(filtered & positions)) for key, positions in self._by_category.items()),
+            key=lambda item: (-item[1], item[0])
+        )
+        if category:
+            filtered = filtered & self._by_category.get(normalize(category), set())
+
+        sort = sort or ('relevance' if terms else 'name')
+        ordered = sorted(filtered)
+        if sort == 'relevance':
+            # Termo inteiro no nome vale 2, prefixo no nome vale 1, categoria/tipo vale 0
+            # (o termo inteiro também está entre os prefixos). Empates ficam em ordem alfabética.
+            scores = Counter()
+            for exact, in_name in name_sets:
+                scores.update(filtered & exact)
+                scores.update(filtered & in_name)
+            ordered.sort(key=scores.__getitem__, reverse=True)
+        elif sort == 'price':
+            ordered.sort(key=self._price_rank.__getitem__)
+        elif sort == '-price':
+            ordered.sort(key=self._price_rank.__getitem__, reverse=True)
+
+        start = (page - 1) * limit
+        return {
+            'results': [self.entries[position] for position in ordered[start:start + limit]],
+            'total': len(ordered),
+            'page': page,
+            'limit': limit,
+            'has_more': start + limit < len(ordered),
+            'facets': {'category': [{'value': name, 'count': count} for name, count in facets if count]},
+        }